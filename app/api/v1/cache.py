@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
 from typing import Dict, Any
+from app.core.compression import compressed_cache
 from app.services.cache_service import cache_service
+from app.services.prefetch_service import prefetch_service
 from app.services.user_service import UserService
 from app.core.auth import get_current_user
 
@@ -29,6 +31,7 @@ async def clear_cache(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Chỉ admin mới có quyền xóa cache")
     
     cache_service.clear()
+    compressed_cache.clear()
     return {
         "success": True,
         "message": "Đã xóa tất cả cache"
@@ -102,6 +105,33 @@ async def clear_chapter_cache(chapter_id: int, current_user: dict = Depends(get_
     }
 
 
+@router.get("/prefetch")
+async def get_prefetch_stats(current_user: dict = Depends(get_current_user)):
+    """Lấy thống kê prefetch chapter (admin only)"""
+    user_service = UserService()
+    if not user_service.is_admin(current_user['id']):
+        raise HTTPException(status_code=403, detail="Chỉ admin mới có quyền xem prefetch stats")
+    
+    return {
+        "success": True,
+        "data": prefetch_service.get_stats()
+    }
+
+
+@router.post("/prefetch")
+async def set_prefetch_enabled(enabled: bool, current_user: dict = Depends(get_current_user)):
+    """Bật/tắt prefetch chapter lúc runtime (admin only)"""
+    user_service = UserService()
+    if not user_service.is_admin(current_user['id']):
+        raise HTTPException(status_code=403, detail="Chỉ admin mới có quyền cấu hình prefetch")
+    
+    prefetch_service.set_enabled(enabled)
+    return {
+        "success": True,
+        "message": f"Đã {'bật' if enabled else 'tắt'} prefetch chapter"
+    }
+
+
 @router.get("/keys")
 async def list_cache_keys(current_user: dict = Depends(get_current_user)):
     """Liệt kê tất cả cache keys (admin only)"""
@@ -1,18 +1,40 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from email.utils import formatdate
+from urllib.parse import quote
 from typing import List, Optional
+import os
 from app.schemas.chapter import ChapterResponse, ChapterCreate, ChapterUpdate
 from app.schemas.reading import ReadingProgressCreate
 from app.services.chapter_service import ChapterService
+from app.services.bundle_service import BundleService
+from app.services.prefetch_service import prefetch_service
+from app.services.navigation_service import navigation_service
 from app.services.reading_service import ReadingService
 from app.services.user_service import UserService
 from app.core.auth import get_optional_user, get_current_user
+from app.core.config import settings
+from app.core.responses import cached_json, dumps_json, json_bytes_response
+from app.core.http_cache import (
+    conditional_response, compute_etag, etag_matches, get_etag, make_etag, parse_byte_range,
+    CHAPTER_CONTENT_CACHE_CONTROL, CHAPTER_LIST_CACHE_CONTROL, PRIVATE_CACHE_CONTROL
+)
+from app.services.cache_service import cache_service
+from app.services.chapter_index_service import chapter_index_service
 
 router = APIRouter()
 
+RAW_MEDIA_TYPES = {
+    "markdown": "text/markdown; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+}
+
 
 @router.get("")
 @router.get("/")
 def get_chapters(
+    request: Request,
+    response: Response,
     novel_id: int = Query(..., description="ID của novel"),
     page: Optional[int] = Query(None, ge=1, description="Trang hiện tại (bắt đầu từ 1)"),
     skip: Optional[int] = Query(None, ge=0, description="Số bản ghi bỏ qua"),
@@ -39,12 +61,64 @@ def get_chapters(
         # Mặc định page = 1
         result = service.get_chapters_by_novel(novel_id, 1, limit)
     
-    return result
+    not_modified = conditional_response(request, response, get_etag(result), CHAPTER_LIST_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    
+    return json_bytes_response(cached_json(result), response)
+
+
+@router.get("/bundle")
+def get_chapter_bundle(
+    novel_id: int = Query(..., description="ID của novel"),
+    from_number: float = Query(..., alias="from", description="chapter_number đầu tiên"),
+    to_number: float = Query(..., alias="to", description="chapter_number cuối cùng"),
+    format: str = Query("markdown", regex="^(markdown|html)$", description="Định dạng nội dung"),
+    type: str = Query("ndjson", regex="^(ndjson|zip)$", description="Định dạng bundle"),
+    compress: bool = Query(True, description="ZIP: dùng bản gzip render sẵn làm member nén"),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    Stream nhiều chapters liên tiếp trong một response (đọc offline)
+    
+    - **novel_id**: ID của novel
+    - **from**/**to**: khoảng chapter_number (bao gồm hai đầu)
+    - **format**: Định dạng nội dung (markdown/html)
+    - **type**: `ndjson` (mỗi dòng một chapter) hoặc `zip` (mỗi chapter một file + `toc.json`)
+    - Không tính lượt xem và không cập nhật reading progress
+    """
+    if to_number < from_number:
+        raise HTTPException(status_code=400, detail="Khoảng chapter không hợp lệ")
+    
+    chapters = navigation_service.get_range(novel_id, from_number, to_number)
+    if chapters is None:
+        raise HTTPException(status_code=500, detail="Không thể tải danh sách chapters")
+    if not chapters:
+        raise HTTPException(status_code=404, detail="Không có chapter nào trong khoảng này")
+    if len(chapters) > settings.bundle_max_chapters:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Bundle tối đa {settings.bundle_max_chapters} chapters, khoảng này có {len(chapters)}"
+        )
+    
+    bundle_service = BundleService(ChapterService())
+    headers = {"X-Bundle-Count": str(len(chapters))}
+    
+    if type == "zip":
+        filename = f"novel-{novel_id}-{from_number:g}-{to_number:g}.zip"
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return StreamingResponse(bundle_service.iter_zip(chapters, format, compress),
+                                 media_type="application/zip", headers=headers)
+    
+    return StreamingResponse(bundle_service.iter_ndjson(chapters, format),
+                             media_type="application/x-ndjson", headers=headers)
 
 
 @router.get("/{chapter_id}")
 def get_chapter_content(
     chapter_id: int,
+    request: Request,
+    response: Response,
     format: str = Query("markdown", regex="^(markdown|html)$", description="Định dạng nội dung"),
     current_user: Optional[dict] = Depends(get_optional_user),
 ):
@@ -54,6 +128,8 @@ def get_chapter_content(
     - **chapter_id**: ID của chapter
     - **format**: Định dạng nội dung (markdown/html)
     - Tự động cập nhật reading progress nếu user đã đăng nhập
+    - `chapter_info.prev_id`/`next_id`: ID chapter trước/sau (null nếu không có)
+    - Hỗ trợ `ETag`/`If-None-Match` (304, vẫn tính lượt xem và progress)
     """
     service = ChapterService()
     chapter = service.get_chapter(chapter_id)
@@ -79,16 +155,140 @@ def get_chapter_content(
         )
         reading_service.update_reading_progress(current_user['id'], progress_data)
     
-    return {
-        "content": content, 
+    # Warm cache cho các chapter tiếp theo (chạy nền)
+    prefetch_service.on_chapter_served(chapter, format)
+    
+    prev_id, next_id = navigation_service.get_neighbors(chapter['novel_id'], chapter['chapter_number'])
+    
+    # ETag từ hash nội dung (chapter index, hoặc ETag lưu trong cache entry của content) + metadata
+    location = chapter_index_service.get(chapter_id)
+    content_etag = location.content_hash if location is not None and location.content_hash else None
+    etag = make_etag(
+        content_etag or cache_service.get_etag(content, compute_etag), format,
+        chapter.get('updated_at'), chapter['title'], chapter['chapter_number'], prev_id, next_id
+    )
+    cache_control = PRIVATE_CACHE_CONTROL if current_user else CHAPTER_CONTENT_CACHE_CONTROL
+    not_modified = conditional_response(request, response, etag, cache_control)
+    if not_modified is not None:
+        return not_modified
+    
+    # Nội dung (phần lớn nhất của response) được serialize một lần và lưu cùng cache entry
+    chapter_info = dumps_json({
         "format": format,
         "chapter_info": {
             "id": chapter['id'],
             "title": chapter['title'],
             "chapter_number": chapter['chapter_number'],
-            "novel_id": chapter['novel_id']
+            "novel_id": chapter['novel_id'],
+            "prev_id": prev_id,
+            "next_id": next_id
         }
+    })
+    return json_bytes_response(b'{"content":' + cached_json(content) + b',' + chapter_info[1:], response)
+
+
+@router.get("/{chapter_id}/raw")
+def get_chapter_raw(
+    chapter_id: int,
+    request: Request,
+    format: str = Query("markdown", regex="^(markdown|html)$", description="Định dạng nội dung"),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    Trả thẳng file nội dung chapter đã render sẵn (không bọc JSON)
+    
+    - **chapter_id**: ID của chapter
+    - **format**: Định dạng nội dung (markdown/html)
+    - Metadata chapter nằm trong headers `X-Chapter-*` (title được URL-encode),
+      chapter trước/sau trong `X-Chapter-Prev-Id`/`X-Chapter-Next-Id`
+    - Hỗ trợ `ETag`/`If-None-Match`, `Last-Modified`, `Range` và bản gzip
+      nén sẵn khi client gửi `Accept-Encoding: gzip`
+    """
+    service = ChapterService()
+    chapter = service.get_chapter(chapter_id)
+    
+    if not chapter:
+        raise HTTPException(status_code=404, detail="Chapter không tồn tại")
+    
+    # Bản gzip chỉ dùng cho request toàn bộ file, Range luôn tính trên bản gốc
+    range_header = request.headers.get("range")
+    compressed = range_header is None and "gzip" in request.headers.get("accept-encoding", "")
+    
+    variant = service.get_chapter_variant(chapter_id, format, compressed)
+    if variant is None and compressed:
+        compressed = False
+        variant = service.get_chapter_variant(chapter_id, format)
+    
+    if variant is None:
+        raise HTTPException(status_code=404, detail="Nội dung chapter không tồn tại")
+    
+    headers = {
+        "X-Chapter-Id": str(chapter['id']),
+        "X-Chapter-Title": quote(chapter.get('title') or ''),
+        "X-Chapter-Number": str(chapter['chapter_number']),
+        "X-Novel-Id": str(chapter['novel_id']),
+        "X-Content-Format": format,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": PRIVATE_CACHE_CONTROL if current_user else CHAPTER_CONTENT_CACHE_CONTROL,
     }
+    prev_id, next_id = navigation_service.get_neighbors(chapter['novel_id'], chapter['chapter_number'])
+    if prev_id is not None:
+        headers["X-Chapter-Prev-Id"] = str(prev_id)
+    if next_id is not None:
+        headers["X-Chapter-Next-Id"] = str(next_id)
+    if compressed:
+        headers["Content-Encoding"] = "gzip"
+    
+    if 'path' in variant:
+        # Backend files: FileResponse gửi file theo chunk (hoặc sendfile) và tự xử lý Range
+        response = FileResponse(variant['path'], headers=headers, media_type=RAW_MEDIA_TYPES[format],
+                                stat_result=os.stat(variant['path']))
+    else:
+        # Backend packed: nội dung đã được đọc bằng một lần pread
+        headers["ETag"] = f'"{variant["mtime"]:.6f}-{len(variant["data"])}-{int(compressed)}"'
+        headers["Last-Modified"] = formatdate(variant['mtime'], usegmt=True)
+        headers["Accept-Ranges"] = "bytes"
+        response = Response(content=variant['data'], headers=headers, media_type=RAW_MEDIA_TYPES[format])
+    
+    if etag_matches(request, response.headers["etag"]):
+        return Response(status_code=304, headers={
+            "ETag": response.headers["etag"],
+            "Last-Modified": response.headers["last-modified"],
+            "Cache-Control": headers["Cache-Control"],
+            "Vary": "Accept-Encoding",
+        })
+    
+    # Backend packed: cắt Range trên bytes đã đọc (FileResponse tự xử lý cho backend files);
+    # If-Range khác ETag hiện tại (file đã đổi) thì trả cả file
+    if 'data' in variant and range_header is not None and request.headers.get("if-range", headers["ETag"]) == headers["ETag"]:
+        data = variant['data']
+        try:
+            byte_range = parse_byte_range(range_header, len(data))
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{len(data)}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            response = Response(content=data[start:end + 1], status_code=206, headers=headers,
+                                media_type=RAW_MEDIA_TYPES[format])
+    
+    # Chỉ tính lượt xem/progress cho request đầu tiên, không cho các request Range tiếp theo
+    if range_header is None:
+        service.increment_views(chapter_id)
+        
+        if current_user:
+            reading_service = ReadingService()
+            progress_data = ReadingProgressCreate(
+                novel_id=chapter['novel_id'],
+                chapter_id=chapter_id,
+                chapter_number=chapter['chapter_number']
+            )
+            reading_service.update_reading_progress(current_user['id'], progress_data)
+        
+        # Nội dung raw được đọc từ file, chỉ cần warm metadata của các chapter tiếp theo
+        prefetch_service.on_chapter_served(chapter, format, warm_content=False)
+    
+    return response
 
 
 # Admin endpoints
@@ -1,11 +1,19 @@
-from fastapi import APIRouter, HTTPException, Query, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, Query, Depends, UploadFile, File, Request, Response
 from typing import List
 from app.schemas.novel import NovelResponse, NovelCreate, NovelUpdate
 from app.services.novel_service import NovelService
 from app.services.chapter_service import ChapterService
 from app.services.epub_service import EpubService
+from app.services.storage_key_service import storage_key_service
+from app.services.navigation_service import navigation_service
+from app.services.search_service import search_service
+from app.services.content_search_service import content_search_service
 from app.services.user_service import UserService
 from app.core.auth import get_current_user
+from app.core.responses import cached_json, json_bytes_response
+from app.core.http_cache import (
+    conditional_response, get_etag, NOVEL_DETAIL_CACHE_CONTROL, NOVEL_LIST_CACHE_CONTROL
+)
 import tempfile
 import os
 
@@ -15,11 +23,15 @@ router = APIRouter()
 @router.get("")
 @router.get("/")
 def get_novels(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1, description="Trang hiện tại (bắt đầu từ 1)"),
     limit: int = Query(20, ge=1, le=100, description="Số bản ghi trả về"),
     search: str = Query(None, description="Từ khóa tìm kiếm"),
     status: str = Query(None, description="Trạng thái novel (ongoing, completed)"),
     author: str = Query(None, description="Tác giả"),
+    sort: str = Query("created", regex="^(created|updated|views|rating)$", description="Sắp xếp giảm dần theo"),
+    snapshot: int = Query(None, description="Version catalog của trang trước (phân trang ổn định)"),
 ):
     """
     Lấy danh sách novels với pagination
@@ -29,24 +41,79 @@ def get_novels(
     - **search**: Từ khóa tìm kiếm trong title và description
     - **status**: Lọc theo trạng thái (ongoing, completed)
     - **author**: Lọc theo tác giả
+    - **sort**: created (mặc định), updated, views, rating (giảm dần)
+    - **snapshot**: Truyền lại `snapshot` của response trang trước để các trang sau cùng một snapshot
+    - Hỗ trợ `ETag`/`If-None-Match` (304)
     """
     service = NovelService()
     
     if search:
         result = service.search_novels(search, page, limit)
     else:
-        result = service.get_novels(page, limit, status, author)
+        result = service.get_novels(page, limit, status, author, sort, snapshot)
     
-    return result
+    not_modified = conditional_response(request, response, get_etag(result), NOVEL_LIST_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    
+    # JSON đã serialize được lưu cùng cache entry, cache hit không phải encode lại
+    return json_bytes_response(cached_json(result), response)
+
+
+@router.get("/facets")
+def get_novel_facets(
+    request: Request,
+    response: Response,
+    status: str = Query(None, description="Trạng thái đang lọc"),
+    author: str = Query(None, description="Tác giả đang lọc"),
+    snapshot: int = Query(None, description="Version catalog đang dùng"),
+):
+    """
+    Số novels theo từng trạng thái và tác giả (cho bộ lọc của trang danh sách)
+    
+    - Mỗi facet được đếm với filter của facet còn lại (chọn status vẫn thấy số lượng các status khác)
+    - Tối đa 50 tác giả có nhiều novels nhất
+    """
+    facets = NovelService().get_facets(status, author, snapshot)
+    if facets is None:
+        raise HTTPException(status_code=503, detail="Catalog chưa sẵn sàng")
+    
+    not_modified = conditional_response(request, response, get_etag(facets), NOVEL_LIST_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    
+    return facets
+
+
+@router.get("/suggest")
+def suggest_novels(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100, description="Chuỗi người dùng đang gõ"),
+    limit: int = Query(10, ge=1, le=20, description="Số gợi ý tối đa"),
+):
+    """
+    Gợi ý novels cho ô tìm kiếm (autocomplete)
+    
+    - **q**: Chuỗi đang gõ (không phân biệt dấu, chấp nhận gõ sai/thiếu chữ)
+    - **limit**: Số gợi ý tối đa (tối đa 20)
+    - Khớp đầu title/author hoặc đầu một từ trong đó xếp trước, sau đó là các novel gần giống
+    """
+    suggestions = search_service.suggest(q, limit)
+    if suggestions is None:
+        raise HTTPException(status_code=503, detail="Search index chưa sẵn sàng")
+    
+    response.headers["Cache-Control"] = NOVEL_LIST_CACHE_CONTROL
+    return {"query": q, "items": suggestions}
 
 
 @router.get("/{novel_id}", response_model=NovelResponse)
-def get_novel(novel_id: int):
+def get_novel(novel_id: int, request: Request, response: Response):
     """
     Lấy thông tin novel theo ID
     
     - **novel_id**: ID của novel
     - Tự động tăng số lượt xem khi truy cập
+    - Hỗ trợ `ETag`/`If-None-Match` (304, vẫn tính lượt xem)
     """
     service = NovelService()
     novel = service.get_novel(novel_id)
@@ -57,7 +124,73 @@ def get_novel(novel_id: int):
     # Tăng số lượt xem
     service.increment_views(novel_id)
     
-    return novel
+    not_modified = conditional_response(request, response, get_etag(novel), NOVEL_DETAIL_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    
+    # Validate theo NovelResponse một lần cho mỗi cache entry thay vì mỗi request
+    return json_bytes_response(cached_json(novel, NovelResponse), response)
+
+
+@router.get("/{novel_id}/toc")
+def get_novel_toc(novel_id: int):
+    """
+    Lấy mục lục của novel (toàn bộ chapters, không phân trang)
+    
+    - **novel_id**: ID của novel
+    - Mỗi item gồm `id`, `chapter_number`, `title`, sắp xếp theo chapter_number
+    """
+    service = NovelService()
+    novel = service.get_novel(novel_id)
+    
+    if not novel:
+        raise HTTPException(status_code=404, detail="Novel không tồn tại")
+    
+    items = navigation_service.get_toc(novel_id)
+    if items is None:
+        raise HTTPException(status_code=500, detail="Không thể tải mục lục novel")
+    
+    return {
+        "novel_id": novel_id,
+        "total": len(items),
+        "items": items
+    }
+
+
+@router.get("/{novel_id}/search")
+def search_novel_content(
+    novel_id: int,
+    q: str = Query(..., min_length=1, max_length=200, description="Từ khóa tìm trong nội dung chapters"),
+    page: int = Query(1, ge=1, description="Số trang"),
+    limit: int = Query(20, ge=1, le=50, description="Số kết quả mỗi trang"),
+):
+    """
+    Tìm kiếm trong nội dung các chapters của novel
+    
+    - **q**: Từ khóa (không phân biệt dấu), chapter phải chứa tất cả các từ
+    - Kết quả xếp theo độ liên quan, mỗi item có `snippet` với từ khớp bọc trong `<mark>`
+    - Dùng index build sẵn lúc sync/upload, không đọc file chapter khi tìm kiếm
+    """
+    service = NovelService()
+    novel = service.get_novel(novel_id)
+    
+    if not novel:
+        raise HTTPException(status_code=404, detail="Novel không tồn tại")
+    
+    novel_dir = storage_key_service.resolve_dir_name(novel_id, novel.get('title'))
+    result = content_search_service.search(novel_dir, q, page, limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Nội dung novel chưa được index")
+    
+    # Số chương và tiêu đề lấy từ navigation index (memory)
+    navigation = navigation_service.get_navigation(novel_id)
+    chapters = dict(zip(navigation.ids, zip(navigation.numbers, navigation.titles))) if navigation else {}
+    for item in result['items']:
+        chapter_number, title = chapters.get(item['chapter_id'], (None, None))
+        item['chapter_number'] = chapter_number
+        item['title'] = title
+    
+    return {"novel_id": novel_id, "query": q, **result}
 
 
 # Admin endpoints
@@ -186,6 +319,9 @@ async def upload_epub_and_create_novel(
             os.unlink(temp_file_path)
             raise HTTPException(status_code=400, detail="Không thể tạo novel trong database")
         
+        # Chuyển thư mục chapters sang storage key (novel ID)
+        storage_key_service.adopt_directory(epub_data['storage_dir'], novel['id'])
+        
         # Tạo chapters
         created_chapters = []
         for chapter_info in epub_data['chapters']:
@@ -197,10 +333,13 @@ async def upload_epub_and_create_novel(
                 'word_count': chapter_info['word_count']
             }
             
-            chapter = chapter_service.create_chapter(chapter_data)
+            chapter = chapter_service.create_chapter(chapter_data, index_content=False)
             if chapter:
                 created_chapters.append(chapter)
         
+        # Index nội dung cho full-text search (một lần cho cả EPUB)
+        chapter_service.index_chapters_content(created_chapters)
+        
         # Xóa file tạm
         os.unlink(temp_file_path)
         
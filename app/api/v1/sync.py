@@ -1,78 +1,95 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, BackgroundTasks
 from app.services.sync_service import sync_service
 from app.services.scheduler_service import scheduler_service
+from app.services.sync_coordinator_service import sync_coordinator_service
+from app.services.sync_manifest_service import sync_manifest_service
 from datetime import datetime
 
 router = APIRouter()
 
 @router.post("/novels")
-async def sync_novels(background_tasks: BackgroundTasks):
-    """Trigger sync job cho novels"""
+async def sync_novels(background_tasks: BackgroundTasks, force: bool = False):
+    """Trigger sync job cho novels (force=true: sync lại cả novels không thay đổi)"""
     try:
         print(f"🔄 Manual sync triggered at {datetime.now()}")
-        result = sync_service.sync_all_novels()
+        # Gộp với sync đang chờ, không chạy chồng lên sync khác
+        job = sync_coordinator_service.request_full_sync(force, source='api')
+        result = await asyncio.to_thread(job.wait)
+        if result is None:
+            raise HTTPException(status_code=500, detail=f"Sync job failed: {job.error}")
         
         return {
             "success": result['success'],
             "message": "Sync job completed",
             "data": result
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Sync job failed: {str(e)}")
 
 @router.post("/novels/background")
-async def sync_novels_background(background_tasks: BackgroundTasks):
+async def sync_novels_background(background_tasks: BackgroundTasks, force: bool = False):
     """Trigger sync job trong background"""
     try:
         print(f"🔄 Background sync triggered at {datetime.now()}")
         
-        # Add sync job to background tasks
-        background_tasks.add_task(sync_service.sync_all_novels)
+        # Xếp vào hàng đợi của sync coordinator (gộp nếu đã có job đang chờ)
+        job = sync_coordinator_service.request_full_sync(force, source='api_background')
         
         return {
             "success": True,
             "message": "Sync job started in background",
+            "job_id": job.id,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start sync job: {str(e)}")
 
 @router.get("/novels/status")
-async def get_sync_status():
-    """Lấy trạng thái sync job"""
+async def get_sync_status(details: bool = False):
+    """Lấy trạng thái sync (từ inventory của sync manifest, không quét storage)"""
     try:
-        # Scan novels directory để xem có bao nhiêu novels
-        novels = sync_service.scan_novels_directory()
-        
         return {
-            "novels_in_storage": len(novels),
+            **sync_manifest_service.get_inventory(details),
             "last_check": datetime.now().isoformat(),
             "storage_path": str(sync_service.storage_path)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get sync status: {str(e)}")
 
+@router.get("/jobs/status")
+async def get_sync_job_status():
+    """Trạng thái sync job: job đang chạy (tiến độ), job đang chờ và job gần nhất"""
+    try:
+        return {
+            "success": True,
+            "data": sync_coordinator_service.get_status()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get sync job status: {str(e)}")
+
 @router.post("/novels/{novel_title}/chapters")
 async def sync_novel_chapters(novel_title: str, background_tasks: BackgroundTasks):
     """Sync chỉ chapters cho một novel cụ thể"""
     try:
         print(f"🔄 Manual chapter sync triggered for novel: {novel_title}")
         
-        # Tìm novel trong storage
-        novels = sync_service.scan_novels_directory()
-        target_novel = None
-        
-        for novel in novels:
-            if novel.get('title') == novel_title:
-                target_novel = novel
-                break
+        # Tìm thư mục novel theo title (inventory, fallback thư mục theo title / storage key),
+        # chỉ đọc book_info.json của novel đó
+        dir_name = await asyncio.to_thread(sync_service.find_novel_dir, novel_title)
+        target_novel = (await asyncio.to_thread(sync_service.read_novel_dir, dir_name, True))[1] if dir_name else None
         
         if not target_novel:
             raise HTTPException(status_code=404, detail=f"Novel '{novel_title}' not found in storage")
         
         # Sync chỉ chapters
-        chapters = target_novel.get('chapters', [])
-        result = sync_service.sync_chapters_only(novel_title, chapters)
+        chapters = target_novel['chapters']
+        result = await asyncio.to_thread(
+            sync_coordinator_service.run_exclusive,
+            sync_service.sync_chapters_only, novel_title, chapters, target_novel.get('_storage_path')
+        )
         
         if result:
             return {
@@ -0,0 +1,248 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.core.http_cache import encoded_etag
+
+try:
+    import brotli
+except ImportError:  # brotli là optional, chỉ dùng gzip
+    brotli = None
+
+
+# Chỉ nén các loại nội dung dạng text
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+)
+
+# Bản nén của response có ETag được cache lại để request sau không phải nén lại
+COMPRESSED_CACHE_TTL = 3600
+
+
+class CompressedCache:
+    """
+    LRU các bản nén theo (encoding, path, query string, ETag), giới hạn theo tổng bytes
+
+    ETag chỉ duy nhất trong phạm vi một URL (vd `mtime-len` của hai chapter có
+    thể trùng nhau), nên key luôn gồm cả path và query string.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str, bytes, str], Tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, bytes, str]) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if time.monotonic() > expires_at:
+                del self._entries[key]
+                self._bytes -= len(data)
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def set(self, key: Tuple[str, str, bytes, str], data: bytes, ttl: int = COMPRESSED_CACHE_TTL) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = (data, time.monotonic() + ttl)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+compressed_cache = CompressedCache(settings.compression_cache_mb * 1024 * 1024)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Encoding tốt nhất client chấp nhận: br (nếu có thư viện brotli) rồi gzip"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.compression_brotli_quality)
+            self.compress = self._compressor.process
+            self.finish = self._compressor.finish
+            self.flush = self._compressor.flush
+        else:
+            self._compressor = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+            self.compress = self._compressor.compress
+            self.finish = self._compressor.flush
+
+    def flush(self) -> bytes:
+        """Đẩy dữ liệu đã nén của chunk hiện tại ra (gzip)"""
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    Nén response (gzip, hoặc brotli nếu đã cài) cho client gửi Accept-Encoding
+
+    - Bỏ qua response nhỏ hơn COMPRESSION_MIN_SIZE, response đã có Content-Encoding
+      (vd: bản gzip render sẵn của /chapters/{id}/raw), Range (206) và nội dung không
+      phải text
+    - Response một message có ETag: bản nén được cache theo (encoding, path, query,
+      ETag) trong LRU giới hạn COMPRESSION_CACHE_MB, request sau trả thẳng bytes đã nén
+    - Response streaming (bundle NDJSON): nén từng chunk
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self.app, encoding, Headers(scope=scope).get("if-none-match", ""))
+        await responder(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, if_none_match: str):
+        self.app = app
+        self.encoding = encoding
+        self.if_none_match = if_none_match
+        self.scope: Optional[Scope] = None
+        self.send = None
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        # None: chưa quyết định, False: gửi nguyên, True: đang nén
+        self.active: Optional[bool] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.scope = scope
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    def _eligible(self, headers: Headers) -> bool:
+        if self.start_message["status"] not in (200, 201, 203):
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _set_encoded_headers(self, headers: MutableHeaders, length: Optional[int]) -> None:
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "etag" in headers:
+            headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+        if length is None:
+            if "content-length" in headers:
+                del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(length)
+
+    def _not_modified(self, message: Message) -> Message:
+        """304 cho bản nén: trả lại đúng ETag (có hậu tố encoding) mà client đã gửi"""
+        headers = MutableHeaders(raw=list(message["headers"]))
+        etag = headers.get("etag")
+        if etag and encoded_etag(etag, self.encoding) in self.if_none_match:
+            headers["ETag"] = encoded_etag(etag, self.encoding)
+            headers.add_vary_header("Accept-Encoding")
+            message["headers"] = headers.raw
+        return message
+
+    async def send_wrapper(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            if message["status"] == 304:
+                self.active = False
+                await self.send(self._not_modified(message))
+                return
+            # Chờ body đầu tiên để biết kích thước
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.active is None:
+            headers = Headers(raw=self.start_message["headers"])
+            if not self._eligible(headers) or (not more_body and len(body) < settings.compression_min_size):
+                self.active = False
+            else:
+                self.active = True
+                if not more_body:
+                    await self._send_single(headers, body)
+                    return
+                self.compressor = _Compressor(self.encoding)
+                mutable = MutableHeaders(raw=list(self.start_message["headers"]))
+                self._set_encoded_headers(mutable, None)
+                self.start_message["headers"] = mutable.raw
+
+            if not self.active:
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+
+            await self.send(self.start_message)
+
+        if not self.active:
+            await self.send(message)
+            return
+
+        # Streaming: nén và flush từng chunk để client nhận dữ liệu ngay
+        data = self.compressor.compress(body) if body else b""
+        data += self.compressor.flush() if more_body else self.compressor.finish()
+        if data or not more_body:
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _send_single(self, headers: Headers, body: bytes) -> None:
+        etag = headers.get("etag")
+        cache_key = None
+        if etag and not etag.startswith("W/"):
+            cache_key = (self.encoding, self.scope["path"], self.scope.get("query_string", b""), etag)
+
+        compressed = compressed_cache.get(cache_key) if cache_key else None
+        if compressed is None:
+            compressor = _Compressor(self.encoding)
+            compressed = compressor.compress(body) + compressor.finish()
+            if cache_key:
+                compressed_cache.set(cache_key, compressed)
+
+        mutable = MutableHeaders(raw=list(self.start_message["headers"]))
+        self._set_encoded_headers(mutable, len(compressed))
+        self.start_message["headers"] = mutable.raw
+        await self.send(self.start_message)
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": False})
@@ -23,6 +23,55 @@ class Settings(BaseSettings):
     
     # File Storage
     storage_path: str = "./storage"
+    # "files": mỗi chapter một file, "packed": một file data + index cho mỗi novel
+    storage_backend: str = "files"
+    packed_store_compression: bool = True
+    # Backend files: lưu nội dung chapter do server ghi theo hash (hard link), render một lần cho nội dung trùng
+    # (file do sync đưa vào không được link, chỉ dùng chung bản render theo hash)
+    content_dedup: bool = True
+    
+    # Prefetch chapter tiếp theo vào cache sau khi một chapter được đọc
+    prefetch_enabled: bool = True
+    prefetch_depth: int = 3
+    prefetch_workers: int = 2
+    # Tổng dung lượng content prefetch chưa được đọc giữ trong cache
+    prefetch_memory_budget_mb: int = 64
+    # Bỏ qua prefetch khi RSS của process vượt ngưỡng (0 = không kiểm tra)
+    prefetch_max_rss_mb: int = 0
+    
+    # Load lại navigation index (prev/next, mục lục) của novel sau bấy nhiêu giây (0 = không hết hạn)
+    navigation_ttl_seconds: int = 600
+    
+    # Số chapters tối đa trong một request GET /chapters/bundle
+    bundle_max_chapters: int = 200
+    
+    # Tìm kiếm novel: "index" (inverted index BM25 in-process) hoặc "database" (ilike)
+    search_backend: str = "index"
+    # Build lại index định kỳ để lấy các thay đổi không qua NovelService (lượt xem, sync...)
+    search_index_refresh_seconds: int = 600
+    # Danh sách novels (filter/sort/facets): "snapshot" (catalog trong memory) hoặc "database"
+    catalog_backend: str = "snapshot"
+    # Build lại catalog snapshot định kỳ để lấy lượt xem, rating... mới
+    catalog_refresh_seconds: int = 300
+    # Index nội dung chapters (GET /novels/{id}/search) lúc sync/EPUB ingest/sửa chapter
+    content_search_enabled: bool = True
+    
+    # Số novels sync vào database cùng lúc (giới hạn số request đồng thời tới Supabase)
+    sync_concurrency: int = 4
+    # Sync từng novel ngay khi storage thay đổi (chạy cùng scheduler)
+    sync_watch_enabled: bool = True
+    # "auto" (watchfiles/inotify nếu có, ngược lại polling) hoặc "polling"
+    sync_watch_backend: str = "auto"
+    sync_watch_debounce_seconds: float = 5.0
+    sync_watch_poll_seconds: int = 30
+    
+    # Nén response (gzip, brotli nếu đã cài package brotli)
+    compression_enabled: bool = True
+    compression_min_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 5
+    # Tổng dung lượng các bản nén (response có ETag) giữ trong memory
+    compression_cache_mb: int = 32
     
     # Google OAuth Configuration
     google_client_id: str = ""
@@ -0,0 +1,117 @@
+import hashlib
+import json
+from typing import Any, Optional, Tuple
+from fastapi import Request, Response
+from app.services.cache_service import cache_service
+
+
+# Cache-Control theo nhóm route
+# Danh sách: CDN/browser dùng lại trong thời gian ngắn, sau đó revalidate bằng ETag
+NOVEL_LIST_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=300"
+CHAPTER_LIST_CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=600"
+# Chi tiết novel/nội dung chapter luôn revalidate để server vẫn đếm lượt xem (304 gần như không tốn băng thông)
+NOVEL_DETAIL_CACHE_CONTROL = "public, no-cache"
+CHAPTER_CONTENT_CACHE_CONTROL = "public, no-cache"
+# Request đã đăng nhập (cập nhật reading progress): không cho CDN dùng chung
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def compute_etag(value: Any) -> str:
+    """Strong ETag từ hash nội dung JSON của response"""
+    data = json.dumps(value, sort_keys=True, default=str, ensure_ascii=False).encode('utf-8')
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag từ các thành phần đã biết (vd: hash nội dung + updated_at), không cần hash response"""
+    data = ':'.join('' if part is None else str(part) for part in parts).encode('utf-8')
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def get_etag(value: Any) -> str:
+    """ETag của response, dùng lại ETag đã lưu trong cache entry nếu value lấy từ cache"""
+    return cache_service.get_etag(value, compute_etag)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag cho bản nén (phải khác bản gốc theo RFC 7232), vd: `"abc"` → `"abc-gzip"`"""
+    if etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+
+def strip_encoded_etag(etag: str) -> str:
+    """Bỏ hậu tố encoding do CompressionMiddleware thêm vào để so với ETag bản gốc"""
+    for encoding in ("gzip", "br"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match có chứa ETag hiện tại không (so sánh weak theo RFC 7232)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+
+    current = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if strip_encoded_etag(candidate) == current:
+            return True
+    return False
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Range một đoạn (`bytes=a-b`, `bytes=a-`, `bytes=-n`) → (start, end), end tính cả
+
+    Returns:
+        None nếu header không dùng được (sai cú pháp, nhiều đoạn): trả cả file (RFC 7233)
+
+    Raises:
+        ValueError: range không thỏa được với file `size` bytes (416)
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash or not (first.isdigit() or last.isdigit()):
+        return None
+    if not first:
+        # Suffix range: n byte cuối
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(0, size - length), size - 1
+    if last and not last.isdigit():
+        return None
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def conditional_response(request: Request, response: Response, etag: str,
+                         cache_control: str) -> Optional[Response]:
+    """
+    Gắn ETag/Cache-Control vào response của endpoint
+
+    Returns:
+        Response 304 nếu client đã có bản hiện tại (endpoint trả về response này
+        thay cho body), None nếu cần trả body như bình thường
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
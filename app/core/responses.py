@@ -0,0 +1,65 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional, Type
+from uuid import UUID
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from app.services.cache_service import cache_service
+
+try:
+    import orjson
+except ImportError:  # orjson là optional, fallback về json chuẩn
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode='json')
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(value: Any) -> bytes:
+    """Serialize JSON bằng orjson nếu đã cài, cùng định dạng với JSONResponse (compact, UTF-8)"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """Response class mặc định của app: JSONResponse serialize bằng dumps_json"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+def cached_json(value: Any, model: Optional[Type[BaseModel]] = None) -> bytes:
+    """
+    JSON bytes của value, lưu trong cache entry nếu value lấy từ cache_service
+    (cache hit không phải encode lại)
+
+    Với `model`, value được validate/lọc theo response model một lần trước khi serialize.
+    """
+    if model is None:
+        return cache_service.get_derived(value, 'json', dumps_json)
+    return cache_service.get_derived(
+        value, f'json:{model.__name__}', lambda v: dumps_json(model.model_validate(v).model_dump(mode='json'))
+    )
+
+
+def json_bytes_response(body: bytes, response: Optional[Response] = None) -> Response:
+    """Response từ JSON đã serialize, giữ headers (ETag, Cache-Control...) endpoint đã gắn vào `response`"""
+    headers = None
+    if response is not None:
+        headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return Response(content=body, media_type="application/json", headers=headers)
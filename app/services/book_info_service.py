@@ -0,0 +1,116 @@
+import codecs
+import hashlib
+import json
+from typing import Any, Callable, Dict
+
+# Kích thước mỗi lần đọc book_info.json
+CHUNK_SIZE = 64 * 1024
+_WHITESPACE = ' \t\n\r'
+
+
+class _JsonStream:
+    """Đọc file JSON theo chunk, decode từng giá trị bằng JSONDecoder.raw_decode"""
+
+    def __init__(self, f):
+        self.f = f
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buffer = ''
+        self.pos = 0
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(CHUNK_SIZE)
+        text = self.text_decoder.decode(chunk, final=not chunk)
+        if not chunk and not text:
+            return False
+        # Bỏ phần đã decode để buffer chỉ giữ giá trị đang đọc dở
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Ký tự khác khoảng trắng tiếp theo (không tiêu thụ)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON")
+
+    def take(self, expected: str) -> str:
+        char = self.peek()
+        if char not in expected:
+            raise ValueError(f"Expected one of {expected!r}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Giá trị bị cắt ở cuối chunk: đọc thêm rồi decode lại
+                if not self._fill():
+                    raise
+                continue
+            # Số bị cắt ở cuối chunk ("12" của "1234", "1" của "1.5" / "1e5"): đọc thêm rồi decode lại
+            if (isinstance(value, (int, float)) and
+                    (end == len(self.buffer) or self.buffer[end] in '.eE+-') and self._fill()):
+                continue
+            self.pos = end
+            return value
+
+
+class BookInfoService:
+    """
+    Đọc book_info.json theo kiểu streaming
+
+    Mảng `chapters` (có novel hơn 10.000 chapters) được decode từng phần tử và
+    đưa cho callback thay vì giữ cả file lẫn toàn bộ danh sách trong memory;
+    các field còn lại (title, author, ...) được trả về như json.load.
+    """
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def read(self, path: str, on_chapter: Callable[[Dict], None]) -> Dict:
+        """
+        Đọc book_info.json, gọi on_chapter với từng chapter theo thứ tự trong file
+
+        Returns:
+            Các field của book_info trừ `chapters`
+        """
+        book_info = {}
+        with open(path, 'rb') as f:
+            stream = _JsonStream(f)
+            stream.take('{')
+            if stream.peek() == '}':
+                return book_info
+
+            while True:
+                key = stream.value()
+                stream.take(':')
+                if key == 'chapters' and stream.peek() == '[':
+                    stream.take('[')
+                    if stream.peek() == ']':
+                        stream.take(']')
+                    else:
+                        while True:
+                            on_chapter(stream.value())
+                            if stream.take(',]') == ']':
+                                break
+                else:
+                    book_info[key] = stream.value()
+                if stream.take(',}') == '}':
+                    return book_info
+
+
+# Global instance
+book_info_service = BookInfoService()
@@ -0,0 +1,165 @@
+import json
+import os
+import struct
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+# Bit 11: tên member dùng UTF-8
+ZIP_FLAG_UTF8 = 0x0800
+
+MEMBER_EXTENSIONS = {'markdown': 'md', 'html': 'html'}
+
+
+def _dos_datetime(mtime: float) -> Tuple[int, int]:
+    """(time, date) theo định dạng MS-DOS dùng trong header ZIP"""
+    t = time.localtime(max(mtime, 315532800))  # ZIP không biểu diễn được trước 1980
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def _split_gzip(data: bytes) -> Optional[Tuple[bytes, int, int]]:
+    """
+    Tách file gzip (một member) thành (deflate stream, crc32, kích thước gốc)
+
+    Deflate stream trong gzip dùng được nguyên vẹn làm member ZIP_DEFLATED,
+    nên bản gzip render sẵn được đưa vào ZIP mà không phải nén lại.
+    """
+    if len(data) < 18 or data[:3] != b'\x1f\x8b\x08':
+        return None
+    flags = data[3]
+    pos = 10
+    if flags & 0x04:  # FEXTRA
+        pos += 2 + struct.unpack('<H', data[pos:pos + 2])[0]
+    if flags & 0x08:  # FNAME
+        pos = data.index(b'\x00', pos) + 1
+    if flags & 0x10:  # FCOMMENT
+        pos = data.index(b'\x00', pos) + 1
+    if flags & 0x02:  # FHCRC
+        pos += 2
+    crc, size = struct.unpack('<II', data[-8:])
+    return data[pos:-8], crc, size
+
+
+class ZipStreamWriter:
+    """
+    Ghi file ZIP tuần tự để stream (không seek, không giữ dữ liệu các member)
+
+    Mỗi lần `add_*` trả về bytes của member (local header + data) để gửi ngay,
+    `finish()` trả về central directory. Chỉ giữ metadata của các member trong
+    memory. Không hỗ trợ ZIP64 (bundle bị giới hạn số chapter nên không cần).
+    """
+
+    def __init__(self):
+        self._offset = 0
+        self._entries: List[bytes] = []
+
+    def _member(self, name: str, method: int, payload: bytes, crc: int, size: int, mtime: float) -> bytes:
+        encoded_name = name.encode('utf-8')
+        dos_time, dos_date = _dos_datetime(mtime)
+        header = struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, 20, ZIP_FLAG_UTF8, method, dos_time, dos_date,
+            crc, len(payload), size, len(encoded_name), 0
+        ) + encoded_name
+        self._entries.append(struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, ZIP_FLAG_UTF8, method, dos_time, dos_date,
+            crc, len(payload), size, len(encoded_name), 0, 0, 0, 0, 0o644 << 16, self._offset
+        ) + encoded_name)
+        self._offset += len(header) + len(payload)
+        return header + payload
+
+    def add(self, name: str, data: bytes, mtime: float, compress: bool = False) -> bytes:
+        crc = zlib.crc32(data)
+        if compress:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            return self._member(name, ZIP_DEFLATED, compressor.compress(data) + compressor.flush(),
+                                crc, len(data), mtime)
+        return self._member(name, ZIP_STORED, data, crc, len(data), mtime)
+
+    def add_gzip(self, name: str, gzip_data: bytes, mtime: float) -> Optional[bytes]:
+        """Thêm member từ dữ liệu gzip (None nếu không tách được deflate stream)"""
+        parts = _split_gzip(gzip_data)
+        if parts is None:
+            return None
+        deflate_data, crc, size = parts
+        return self._member(name, ZIP_DEFLATED, deflate_data, crc, size, mtime)
+
+    def finish(self) -> bytes:
+        central_directory = b''.join(self._entries)
+        end_record = struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0, len(self._entries), len(self._entries),
+            len(central_directory), self._offset, 0
+        )
+        return central_directory + end_record
+
+
+class BundleService:
+    """
+    Stream nhiều chapters trong một response (NDJSON hoặc ZIP) cho đọc offline
+
+    Chapters được đọc tuần tự từ bản render sẵn trong storage, mỗi lần chỉ giữ
+    nội dung của một chapter trong memory. Nội dung không đi qua cache_service
+    để bundle lớn không đẩy các entry đang dùng ra khỏi cache.
+    """
+
+    def __init__(self, chapter_service):
+        self.chapter_service = chapter_service
+
+    def _read_chapter(self, chapter_id: int, format: str, compressed: bool = False) -> Optional[Tuple[bytes, float]]:
+        """(dữ liệu, mtime) của bản render sẵn, None nếu chapter không có nội dung"""
+        try:
+            variant = self.chapter_service.get_chapter_variant(chapter_id, format, compressed)
+            if variant is None:
+                return None
+            if 'path' in variant:
+                with open(variant['path'], 'rb') as f:
+                    return f.read(), os.fstat(f.fileno()).st_mtime
+            return variant['data'], variant['mtime']
+        except Exception as e:
+            print(f"Error reading chapter {chapter_id} for bundle: {e}")
+            return None
+
+    def iter_ndjson(self, chapters: List[Dict], format: str) -> Iterator[bytes]:
+        """Mỗi dòng là một JSON object: id, chapter_number, title, content (null nếu không có nội dung)"""
+        for chapter in chapters:
+            result = self._read_chapter(chapter['id'], format)
+            line = {
+                **chapter,
+                'format': format,
+                'content': result[0].decode('utf-8') if result else None,
+            }
+            yield (json.dumps(line, ensure_ascii=False) + '\n').encode('utf-8')
+
+    def iter_zip(self, chapters: List[Dict], format: str, compress: bool = True) -> Iterator[bytes]:
+        """
+        ZIP gồm một file cho mỗi chapter và `toc.json` (mục lục các file trong bundle)
+
+        Với `compress`, bản gzip render sẵn được dùng làm member nén (không tốn CPU
+        nén lại), chapter chưa có bản gzip được lưu không nén.
+        """
+        writer = ZipStreamWriter()
+        extension = MEMBER_EXTENSIONS[format]
+        toc = []
+        for position, chapter in enumerate(chapters, start=1):
+            name = f"{position:05d}-{chapter['id']}.{extension}"
+            member = None
+            if compress:
+                result = self._read_chapter(chapter['id'], format, compressed=True)
+                if result is not None:
+                    member = writer.add_gzip(name, *result)
+            if member is None:
+                result = self._read_chapter(chapter['id'], format)
+                if result is None:
+                    continue
+                member = writer.add(name, *result)
+
+            toc.append({**chapter, 'file': name})
+            yield member
+
+        toc_data = json.dumps({'format': format, 'chapters': toc}, ensure_ascii=False).encode('utf-8')
+        yield writer.add('toc.json', toc_data, time.time(), compress=compress)
+        yield writer.finish()
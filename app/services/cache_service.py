@@ -1,6 +1,6 @@
 import json
 import time
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 from datetime import datetime, timedelta
 from app.core.config import settings
 
@@ -9,6 +9,8 @@ class CacheService:
     def __init__(self):
         self.cache: Dict[str, Dict] = {}
         self.default_ttl = 3600  # 1 giờ mặc định
+        # id(data) → key, để tìm entry từ object đã lấy ra khỏi cache (xem get_etag)
+        self._keys_by_id: Dict[int, str] = {}
     
     def _generate_key(self, prefix: str, identifier: Any) -> str:
         """Tạo cache key"""
@@ -28,12 +30,19 @@ class CacheService:
         
         expires_at = datetime.now() + timedelta(seconds=ttl)
         
+        self._forget(key)
         self.cache[key] = {
             'data': value,
             'created_at': datetime.now(),
             'expires_at': expires_at,
             'ttl': ttl
         }
+        self._keys_by_id[id(value)] = key
+    
+    def _forget(self, key: str) -> None:
+        entry = self.cache.get(key)
+        if entry is not None and self._keys_by_id.get(id(entry['data'])) == key:
+            del self._keys_by_id[id(entry['data'])]
     
     def get(self, key: str) -> Optional[Any]:
         """Lấy data từ cache"""
@@ -43,14 +52,37 @@ class CacheService:
         cache_entry = self.cache[key]
         
         if self._is_expired(cache_entry):
+            self._forget(key)
             del self.cache[key]
             return None
         
         return cache_entry['data']
     
+    def get_derived(self, value: Any, name: str, compute: Callable[[Any], Any]) -> Any:
+        """
+        Giá trị suy ra từ object lấy từ cache (ETag, JSON đã serialize...), chỉ tính
+        một lần và lưu trong cache entry, mất theo entry khi bị xóa/hết hạn
+        
+        Object không nằm trong cache (hoặc entry đã bị thay) thì tính lại mỗi lần.
+        """
+        key = self._keys_by_id.get(id(value))
+        entry = self.cache.get(key) if key is not None else None
+        if entry is None or entry['data'] is not value:
+            return compute(value)
+        
+        derived = entry.setdefault('derived', {})
+        if name not in derived:
+            derived[name] = compute(value)
+        return derived[name]
+    
+    def get_etag(self, value: Any, compute: Callable[[Any], str]) -> str:
+        """ETag của object lấy từ cache (xem get_derived)"""
+        return self.get_derived(value, 'etag', compute)
+    
     def delete(self, key: str) -> bool:
         """Xóa cache entry"""
         if key in self.cache:
+            self._forget(key)
             del self.cache[key]
             return True
         return False
@@ -58,6 +90,7 @@ class CacheService:
     def clear(self) -> None:
         """Xóa tất cả cache"""
         self.cache.clear()
+        self._keys_by_id.clear()
     
     def cleanup_expired(self) -> int:
         """Dọn dẹp cache entries hết hạn"""
@@ -68,6 +101,7 @@ class CacheService:
                 expired_keys.append(key)
         
         for key in expired_keys:
+            self._forget(key)
             del self.cache[key]
         
         return len(expired_keys)
@@ -0,0 +1,322 @@
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.services.cache_service import cache_service
+
+
+# Thứ tự sắp xếp hỗ trợ (đều giảm dần) → cột của novel
+SORT_FIELDS = {
+    'created': 'created_at',
+    'updated': 'updated_at',
+    'views': 'views',
+    'rating': 'rating',
+}
+DEFAULT_SORT = 'created'
+
+# Giữ snapshot trước đó để client đang phân trang (truyền `snapshot`) không bị lệch trang
+MAX_SNAPSHOTS = 2
+# Số tác giả tối đa trong facet counts
+MAX_AUTHOR_FACETS = 50
+# Số tổ hợp filter được giữ facet counts trong một snapshot
+MAX_CACHED_FACETS = 1024
+
+
+class CatalogSnapshot:
+    """
+    Snapshot bất biến của catalog novels, lưu theo cột
+
+    - status/author được mã hóa thành số (dictionary encoding) trong `array`
+    - thứ tự theo từng kiểu sort là một hoán vị vị trí các dòng, tính một lần
+      lúc build (giảm dần, cùng giá trị thì id giảm dần để phân trang ổn định)
+    - danh sách đã lọc theo status và facet counts được tính lazily rồi giữ lại
+      trong snapshot
+    """
+
+    def __init__(self, novels: List[Dict], version: int):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.rows = sorted(novels, key=lambda novel: novel['id'])
+
+        self.statuses: List[str] = []
+        self.authors: List[str] = []
+        status_codes: Dict[str, int] = {}
+        author_codes: Dict[str, int] = {}
+        self.status_column = array('H')
+        self.author_column = array('I')
+        self.author_positions: Dict[int, List[int]] = {}
+        for position, novel in enumerate(self.rows):
+            status = novel.get('status') or ''
+            if status not in status_codes:
+                status_codes[status] = len(self.statuses)
+                self.statuses.append(status)
+            author = novel.get('author') or ''
+            if author not in author_codes:
+                author_codes[author] = len(self.authors)
+                self.authors.append(author)
+            self.status_column.append(status_codes[status])
+            self.author_column.append(author_codes[author])
+            self.author_positions.setdefault(author_codes[author], []).append(position)
+        self._status_codes = status_codes
+        self._author_codes = author_codes
+
+        ids = array('q', (novel['id'] for novel in self.rows))
+        columns = {
+            'created_at': [novel.get('created_at') or '' for novel in self.rows],
+            'updated_at': [novel.get('updated_at') or novel.get('created_at') or '' for novel in self.rows],
+            'views': array('q', (novel.get('views') or 0 for novel in self.rows)),
+            'rating': array('d', (novel.get('rating') or 0 for novel in self.rows)),
+        }
+        # orders[sort] = vị trí các dòng theo thứ tự; ranks[sort][vị trí] = thứ hạng
+        self.orders: Dict[str, array] = {}
+        self.ranks: Dict[str, array] = {}
+        for sort, field in SORT_FIELDS.items():
+            column = columns[field]
+            order = array('I', sorted(range(len(self.rows)), key=lambda p: (column[p], ids[p]), reverse=True))
+            rank = array('I', bytes(4 * len(order)))
+            for index, position in enumerate(order):
+                rank[position] = index
+            self.orders[sort] = order
+            self.ranks[sort] = rank
+
+        self._filtered: Dict[tuple, array] = {}
+        self._facets: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _positions(self, status: Optional[str], author: Optional[str], sort: str):
+        """Vị trí các dòng khớp filter theo thứ tự sort (None nếu filter không khớp novel nào)"""
+        status_code = self._status_codes.get(status) if status else None
+        if status and status_code is None:
+            return None
+
+        if author:
+            author_code = self._author_codes.get(author)
+            if author_code is None:
+                return None
+            positions = self.author_positions[author_code]
+            if status_code is not None:
+                positions = [p for p in positions if self.status_column[p] == status_code]
+            return sorted(positions, key=self.ranks[sort].__getitem__)
+
+        if status_code is None:
+            return self.orders[sort]
+
+        key = (sort, status_code)
+        filtered = self._filtered.get(key)
+        if filtered is None:
+            column = self.status_column
+            filtered = array('I', (p for p in self.orders[sort] if column[p] == status_code))
+            self._filtered[key] = filtered
+        return filtered
+
+    def query(self, status: Optional[str] = None, author: Optional[str] = None, sort: str = DEFAULT_SORT,
+              page: int = 1, limit: int = 20) -> Dict[str, Any]:
+        positions = self._positions(status, author, sort)
+        if positions is None:
+            positions = ()
+
+        total = len(positions)
+        start = (page - 1) * limit
+        total_pages = (total + limit - 1) // limit if total > 0 else 0
+        has_next = page < total_pages
+        has_prev = page > 1
+        return {
+            "items": [self.rows[p] for p in positions[start:start + limit]],
+            "total": total,
+            "page": page,
+            "limit": limit,
+            "total_pages": total_pages,
+            "has_next": has_next,
+            "has_prev": has_prev,
+            "next_page": page + 1 if has_next else None,
+            "prev_page": page - 1 if has_prev else None,
+            "sort": sort,
+            "snapshot": self.version,
+        }
+
+    def facets(self, status: Optional[str] = None, author: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Số novel theo từng status và từng tác giả
+
+        Mỗi facet được đếm với filter của facet còn lại (chọn một status vẫn
+        thấy số lượng của các status khác).
+        """
+        key = (status or None, author or None)
+        cached = self._facets.get(key)
+        if cached is not None:
+            return cached
+
+        if author:
+            author_code = self._author_codes.get(author)
+            positions = self.author_positions.get(author_code, []) if author_code is not None else []
+            status_counts = Counter(self.status_column[p] for p in positions)
+        else:
+            status_counts = Counter(self.status_column)
+
+        if status:
+            status_code = self._status_codes.get(status)
+            author_counts = Counter(
+                code for code, s in zip(self.author_column, self.status_column) if s == status_code
+            ) if status_code is not None else Counter()
+        else:
+            author_counts = Counter({code: len(positions) for code, positions in self.author_positions.items()})
+
+        result = {
+            "status": [
+                {"value": self.statuses[code], "count": count}
+                for code, count in sorted(status_counts.items(), key=lambda item: (-item[1], self.statuses[item[0]]))
+                if self.statuses[code]
+            ],
+            "author": [
+                {"value": self.authors[code], "count": count}
+                for code, count in sorted(author_counts.items(), key=lambda item: (-item[1], self.authors[item[0]]))
+                if self.authors[code]
+            ][:MAX_AUTHOR_FACETS],
+            "total": len(self.rows),
+            "snapshot": self.version,
+        }
+        with self._lock:
+            if len(self._facets) < MAX_CACHED_FACETS:
+                self._facets[key] = result
+        return result
+
+
+class CatalogService:
+    """
+    Catalog novels trong memory cho GET /novels (filter status/author, sort, facet counts)
+
+    Snapshot được load một lần từ database (theo batch) rồi build lại ở
+    background sau CATALOG_REFRESH_SECONDS hoặc khi novel thay đổi qua
+    NovelService/sync. Trong lúc build, request vẫn dùng snapshot cũ nên duyệt
+    catalog không cần query database.
+    """
+
+    def __init__(self):
+        self._supabase_service = None
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[int, CatalogSnapshot]" = OrderedDict()
+        self._current: Optional[CatalogSnapshot] = None
+        self._stale = False
+        self._rebuilding = False
+
+    def _get_supabase_service(self):
+        if self._supabase_service is None:
+            from app.services.supabase_service import SupabaseService
+            self._supabase_service = SupabaseService()
+        return self._supabase_service
+
+    def _load(self) -> bool:
+        try:
+            novels = self._get_supabase_service().get_all_novels()
+        except Exception as e:
+            print(f"❌ Error loading catalog snapshot: {e}")
+            return False
+
+        with self._lock:
+            # Version tăng dần kể cả khi hai lần build trong cùng một millisecond
+            version = int(time.time() * 1000)
+            if self._current is not None and version <= self._current.version:
+                version = self._current.version + 1
+        snapshot = CatalogSnapshot(novels, version)
+
+        with self._lock:
+            self._snapshots[version] = snapshot
+            while len(self._snapshots) > MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+            self._current = snapshot
+        print(f"📚 Catalog snapshot built: {len(snapshot)} novels (version {version})")
+        return True
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+            self._stale = False
+
+        def refresh():
+            try:
+                self._load()
+            finally:
+                self._rebuilding = False
+
+        threading.Thread(target=refresh, name="catalog-refresh", daemon=True).start()
+
+    def get_snapshot(self, version: Optional[int] = None) -> Optional[CatalogSnapshot]:
+        """
+        Snapshot hiện tại (load nếu chưa có, build lại ở background nếu đã cũ)
+
+        Args:
+            version: Snapshot client đang phân trang, dùng lại nếu vẫn còn giữ
+        """
+        current = self._current
+        if current is None:
+            with self._lock:
+                loading = self._current is None and not self._rebuilding
+                if loading:
+                    self._rebuilding = True
+            if loading:
+                try:
+                    self._load()
+                finally:
+                    self._rebuilding = False
+            current = self._current
+            if current is None:
+                return None
+        elif self._stale or time.monotonic() - current.built_at > settings.catalog_refresh_seconds:
+            self._refresh_in_background()
+
+        if version is not None:
+            return self._snapshots.get(version, current)
+        return current
+
+    def invalidate(self) -> None:
+        """Đánh dấu snapshot đã cũ (novel vừa thay đổi), build lại ở request tiếp theo"""
+        self._stale = True
+
+    def list_novels(self, page: int = 1, limit: int = 20, status: Optional[str] = None,
+                    author: Optional[str] = None, sort: str = DEFAULT_SORT,
+                    snapshot: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Trang novels theo filter/sort từ snapshot (None nếu không load được snapshot)
+
+        Kết quả được giữ trong cache_service theo version snapshot để ETag/JSON
+        bytes của trang chỉ tính một lần.
+        """
+        current = self.get_snapshot(snapshot)
+        if current is None:
+            return None
+
+        cache_key = f"catalog:{current.version}:{status}:{author}:{sort}:{page}:{limit}"
+        result = cache_service.get(cache_key)
+        if result is None:
+            result = current.query(status, author, sort, page, limit)
+            cache_service.set(cache_key, result, ttl=settings.catalog_refresh_seconds)
+        return result
+
+    def get_facets(self, status: Optional[str] = None, author: Optional[str] = None,
+                   snapshot: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        current = self.get_snapshot(snapshot)
+        if current is None:
+            return None
+        return current.facets(status, author)
+
+    def get_stats(self) -> Dict[str, Any]:
+        current = self._current
+        return {
+            'loaded': current is not None,
+            'novels': len(current) if current is not None else 0,
+            'version': current.version if current is not None else None,
+            'snapshots': len(self._snapshots),
+            'stale': self._stale,
+            'age_seconds': round(time.monotonic() - current.built_at, 1) if current is not None else None,
+        }
+
+
+# Global instance
+catalog_service = CatalogService()
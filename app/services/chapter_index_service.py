@@ -0,0 +1,289 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa giữa các thread trong process
+    fcntl = None
+
+
+# Log index nằm ở gốc storage (sync chỉ quét thư mục nên không bị ảnh hưởng)
+INDEX_FILENAME = '.chapter_index.log'
+# Index JSON cũ (ghi lại toàn bộ mỗi lần thay đổi), được import một lần
+LEGACY_INDEX_FILENAME = '.chapter_index.json'
+LOCK_FILENAME = '.chapter_index.lock'
+# Compact log khi số record vượt quá bấy nhiêu lần số entry còn sống
+COMPACT_RATIO = 4
+COMPACT_MIN_RECORDS = 10000
+
+
+class ChapterLocation(NamedTuple):
+    novel_id: int
+    novel_dir: str
+    content_file: str
+    # sha256 nội dung (object store), None nếu chưa biết hoặc không dùng dedup
+    content_hash: Optional[str] = None
+
+
+class ChapterIndexService:
+    """
+    Index chapter_id → vị trí file content (thư mục novel + tên file) và hash nội dung
+
+    Được ghi lúc sync/ingest và khi admin tạo/sửa/xóa chapter, giữ trong memory
+    và persist ra một log append-only (mỗi dòng JSON là một entry hoặc một lần
+    xóa) để sau khi restart vẫn resolve được đường dẫn mà không cần query novel
+    hay quét các thư mục.
+
+    - Mỗi lần thay đổi chỉ append các dòng mới dưới flock, nên nhiều worker
+      process ghi cùng lúc không ghi đè lên nhau; process khác đọc tiếp phần
+      log mới append khi gặp chapter chưa có trong memory
+    - Entry resolve được trên read path (`remember`) chỉ giữ trong memory
+    - Log được compact (ghi lại chỉ các entry còn sống) khi quá dài; process
+      khác nhận ra qua inode của file và đọc lại từ đầu
+    """
+
+    def __init__(self):
+        self.storage_path = settings.storage_path
+        self.index_path = os.path.join(self.storage_path, INDEX_FILENAME)
+        self.legacy_path = os.path.join(self.storage_path, LEGACY_INDEX_FILENAME)
+        self.lock_path = os.path.join(self.storage_path, LOCK_FILENAME)
+        self._entries: Dict[int, ChapterLocation] = {}
+        # Entry resolve được trên read path, không ghi ra log
+        self._remembered: Dict[int, ChapterLocation] = {}
+        self._loaded = False
+        # Vị trí đã đọc tới trong log (inode, offset) và số record đã đọc
+        self._ino: Optional[int] = None
+        self._offset = 0
+        self._records = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.storage_path, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+    def _load(self) -> None:
+        """Đọc (hoặc đọc tiếp phần mới append) log index, gọi khi đang giữ lock"""
+        try:
+            with open(self.index_path, 'rb') as f:
+                ino = os.fstat(f.fileno()).st_ino
+                if ino != self._ino:
+                    # Lần đầu hoặc log đã bị compact: đọc lại từ đầu
+                    self._entries = {}
+                    self._ino = ino
+                    self._offset = 0
+                    self._records = 0
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            if not self._loaded:
+                self._loaded = True
+                self._import_legacy()
+            return
+
+        # Dòng cuối chưa có '\n' là record đang được process khác ghi dở
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                self._apply(json.loads(line))
+            except Exception as e:
+                print(f"⚠️ Skipping invalid chapter index record: {e}")
+        self._offset += end
+        self._loaded = True
+
+    def _apply(self, record: List) -> None:
+        """Record [chapter_id, novel_id, novel_dir, content_file, content_hash] hoặc [chapter_id] (xóa)"""
+        self._records += 1
+        chapter_id = record[0]
+        # Record trên log mới hơn entry resolve trên read path
+        self._remembered.pop(chapter_id, None)
+        if len(record) == 1:
+            self._entries.pop(chapter_id, None)
+        else:
+            self._entries[chapter_id] = ChapterLocation(*record[1:])
+
+    def _import_legacy(self) -> None:
+        """Chuyển index JSON cũ sang log (một lần, khi chưa có log)"""
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"⚠️ Error loading legacy chapter index, rebuilding from scratch: {e}")
+            return
+        records = [
+            [int(chapter_id), *location]
+            for chapter_id, location in data.get('chapters', {}).items()
+        ]
+        for record in records:
+            self._apply(record)
+        self._append(records)
+        print(f"✅ Imported {len(records)} entries from {LEGACY_INDEX_FILENAME}")
+
+    def reload(self) -> None:
+        """Đọc tiếp phần log process khác đã ghi (gọi khi vừa giữ sync lock)"""
+        with self._lock:
+            self._load()
+
+    def _reload_if_changed(self) -> None:
+        """Đọc tiếp log nếu process khác (worker khác) đã append hoặc compact"""
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return
+        if stat.st_ino != self._ino or stat.st_size != self._offset:
+            with self._lock:
+                self._load()
+
+    def _append(self, records: List[List]) -> None:
+        """Append records vào log dưới flock, gọi khi đang giữ lock"""
+        if not records:
+            return
+        try:
+            with self._file_lock():
+                # Record process khác vừa append được áp dụng trước record của mình
+                self._load()
+                payload = ''.join(
+                    json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+                    for record in records
+                ).encode('utf-8')
+                fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    written = 0
+                    while written < len(payload):
+                        written += os.write(fd, payload[written:])
+                finally:
+                    os.close(fd)
+                # Đọc lại chính record vừa ghi để offset/records khớp với file
+                self._load()
+                if self._records > COMPACT_MIN_RECORDS and self._records > len(self._entries) * COMPACT_RATIO:
+                    self._compact()
+        except Exception as e:
+            print(f"❌ Error saving chapter index: {e}")
+
+    def _compact(self) -> None:
+        """Ghi lại log chỉ với các entry còn sống, gọi khi đang giữ lock và flock"""
+        tmp_path = f"{self.index_path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            for chapter_id, location in self._entries.items():
+                f.write(json.dumps([chapter_id, *location], ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+            size = f.tell()
+            ino = os.fstat(f.fileno()).st_ino
+        os.replace(tmp_path, self.index_path)
+        self._ino = ino
+        self._offset = size
+        self._records = len(self._entries)
+
+    def _forget_remembered(self, novel_id: int) -> None:
+        for chapter_id in [chapter_id for chapter_id, location in self._remembered.items() if location.novel_id == novel_id]:
+            del self._remembered[chapter_id]
+
+    def get(self, chapter_id: int) -> Optional[ChapterLocation]:
+        self._ensure_loaded()
+        location = self._remembered.get(chapter_id) or self._entries.get(chapter_id)
+        if location is None:
+            self._reload_if_changed()
+            location = self._entries.get(chapter_id)
+        return location
+
+    def entries(self) -> Dict[int, ChapterLocation]:
+        """Bản sao toàn bộ entries (chapter_id → vị trí)"""
+        self._ensure_loaded()
+        self._reload_if_changed()
+        with self._lock:
+            return dict(self._entries)
+
+    def get_path(self, chapter_id: int) -> Optional[str]:
+        """Đường dẫn tuyệt đối tới file content của chapter"""
+        location = self.get(chapter_id)
+        if location is None:
+            return None
+        return os.path.abspath(os.path.join(self.storage_path, location.novel_dir, location.content_file))
+
+    def remember(self, chapter_id: int, novel_id: int, novel_dir: str, content_file: str,
+                 content_hash: Optional[str] = None) -> None:
+        """Giữ entry resolve được trên read path trong memory (không ghi ra đĩa)"""
+        self._ensure_loaded()
+        location = ChapterLocation(novel_id, novel_dir, content_file, content_hash)
+        with self._lock:
+            if self._entries.get(chapter_id) != location:
+                self._remembered[chapter_id] = location
+
+    def set(self, chapter_id: int, novel_id: int, novel_dir: str, content_file: str,
+            content_hash: Optional[str] = None) -> None:
+        self.set_many([(chapter_id, novel_id, novel_dir, content_file, content_hash)])
+
+    def set_many(self, entries: Iterable[Tuple]) -> None:
+        """Ghi nhiều entries (chapter_id, novel_id, novel_dir, content_file[, content_hash]) với một lần append"""
+        self._ensure_loaded()
+        with self._lock:
+            records = []
+            for chapter_id, *fields in entries:
+                location = ChapterLocation(*fields)
+                self._remembered.pop(chapter_id, None)
+                if self._entries.get(chapter_id) != location:
+                    self._entries[chapter_id] = location
+                    records.append([chapter_id, *location])
+            self._append(records)
+
+    def remove(self, chapter_id: int) -> None:
+        self.remove_many([chapter_id])
+
+    def remove_many(self, chapter_ids: Iterable[int]) -> None:
+        self._ensure_loaded()
+        with self._lock:
+            records = []
+            for chapter_id in chapter_ids:
+                self._remembered.pop(chapter_id, None)
+                if self._entries.pop(chapter_id, None) is not None:
+                    records.append([chapter_id])
+            self._append(records)
+
+    def rename_novel_dir(self, novel_id: int, novel_dir: str) -> int:
+        """Cập nhật thư mục cho toàn bộ chapters của novel (khi đổi tên thư mục)"""
+        self._ensure_loaded()
+        with self._lock:
+            self._forget_remembered(novel_id)
+            records = []
+            for chapter_id, location in self._entries.items():
+                if location.novel_id == novel_id and location.novel_dir != novel_dir:
+                    location = location._replace(novel_dir=novel_dir)
+                    self._entries[chapter_id] = location
+                    records.append([chapter_id, *location])
+            self._append(records)
+            return len(records)
+
+    def remove_novel(self, novel_id: int) -> int:
+        """Xóa toàn bộ chapters của novel khỏi index"""
+        self._ensure_loaded()
+        with self._lock:
+            self._forget_remembered(novel_id)
+            chapter_ids = [chapter_id for chapter_id, location in self._entries.items() if location.novel_id == novel_id]
+            for chapter_id in chapter_ids:
+                del self._entries[chapter_id]
+            self._append([[chapter_id] for chapter_id in chapter_ids])
+            return len(chapter_ids)
+
+
+# Global instance
+chapter_index_service = ChapterIndexService()
@@ -1,10 +1,13 @@
 from typing import List, Optional, Dict, Any
-from app.services.markdown_service import ContentService
+from app.services.markdown_service import CONTENT_FORMATS, ContentService
 from app.services.supabase_service import SupabaseService
 from app.services.cache_service import cache_service
+from app.services.chapter_index_service import ChapterLocation, chapter_index_service
+from app.services.content_search_service import content_search_service
+from app.services.storage_key_service import storage_key_service
+from app.services.navigation_service import navigation_service
 from supabase import create_client
 from app.core.config import settings
-import os
 
 
 class ChapterService:
@@ -58,48 +61,127 @@ class ChapterService:
     
     def get_chapter_content(self, chapter_id: int, format: str = "markdown") -> Optional[str]:
         """Lấy nội dung chapter với cache"""
-        # Tạo cache key cho content
-        cache_key = f"chapter_content:{chapter_id}:{format}"
+        cache_key = self.get_content_cache_key(chapter_id, format)
         cached_content = cache_service.get(cache_key)
         
         if cached_content:
             return cached_content
         
-        # Nếu không có trong cache, lấy từ file
-        chapter = self.get_chapter(chapter_id)
-        if not chapter or not chapter.get('content_file'):
-            return None
+        # Nếu không có trong cache, lấy từ file (vị trí file lấy từ chapter index)
+        content = self._read_chapter_content(chapter_id, format)
+        if content is None:
+            # Index có thể đã cũ (file bị đổi tên/di chuyển ngoài API): resolve lại từ database
+            content = self._read_chapter_content(chapter_id, format, refresh=True)
         
-        # Lấy novel title để tìm đúng directory
-        novel = self.supabase_service.get_novel(chapter['novel_id'])
-        novel_title = novel.get('title') if novel else None
-        
-        content = self.content_service.read_content_file(chapter['content_file'], novel_title)
         if not content:
             return None
         
-        # Nếu format là markdown và content là HTML, chuyển đổi
-        if format == "markdown" and content.startswith('<'):
-            # Content là HTML, giữ nguyên cho markdown format
-            pass
-        elif format == "html" and not content.startswith('<'):
-            # Content là markdown, chuyển đổi thành HTML
-            content = self.content_service.convert_to_html(content)
-        
         # Cache content trong 2 giờ
         cache_service.set(cache_key, content, ttl=7200)
         
         return content
     
-    def create_chapter(self, chapter_data: dict) -> Optional[dict]:
-        """Tạo chapter mới (admin only)"""
+    def get_content_cache_key(self, chapter_id: int, format: str) -> str:
+        """
+        Cache key cho content: theo hash nội dung nếu đã biết, để các chapter
+        có nội dung giống nhau dùng chung một cache entry
+        """
+        location = chapter_index_service.get(chapter_id)
+        if location is not None and location.content_hash:
+            return f"content:{location.content_hash}:{format}"
+        return f"chapter_content:{chapter_id}:{format}"
+    
+    def _read_chapter_content(self, chapter_id: int, format: str, refresh: bool = False) -> Optional[str]:
+        """Đọc nội dung chapter: ưu tiên bản render sẵn, fallback về file gốc"""
+        location = self._get_chapter_location(chapter_id, refresh=refresh)
+        if location is None:
+            return None
+        
+        # Ưu tiên bản render sẵn lúc ingest (không tốn CPU convert)
+        content = self.content_service.read_variant(location.novel_dir, location.content_file, format)
+        if content is not None:
+            return content
+        
+        content = self.content_service.read_content_file(location.content_file, location.novel_dir)
+        if not content:
+            return None
+        
+        # Chưa có bản render (dữ liệu cũ): render một lần và lưu lại cho lần sau
+        self.content_service.render_variants(location.novel_dir, location.content_file, content)
+        return self.content_service.render_content(content, format)
+    
+    def _get_chapter_location(self, chapter_id: int, chapter: dict = None, refresh: bool = False) -> Optional[ChapterLocation]:
+        """
+        Vị trí file content của chapter (thư mục novel + tên file)
+        
+        Lấy từ chapter index nếu có, nếu không thì resolve từ chapter (storage
+        key là novel ID, chỉ novel chưa migrate mới cần query title) rồi giữ
+        lại trong index (memory) cho lần sau.
+        """
+        if not refresh:
+            location = chapter_index_service.get(chapter_id)
+            if location is not None and (chapter is None or location.content_file == chapter.get('content_file')):
+                return location
+        
+        chapter = chapter or self.get_chapter(chapter_id)
+        if not chapter or not chapter.get('content_file'):
+            return None
+        
+        novel_dir = storage_key_service.existing_key(chapter['novel_id'])
+        if novel_dir is None:
+            # Thư mục cũ đặt theo title (chưa chạy scripts/migrate_storage_keys.py)
+            novel = self.supabase_service.get_novel(chapter['novel_id'])
+            novel_dir = novel.get('title') if novel else None
+            if not novel_dir:
+                return None
+        
+        content_hash = self.content_service.get_content_hash(novel_dir, chapter['content_file'])
+        location = ChapterLocation(chapter['novel_id'], novel_dir, chapter['content_file'], content_hash)
+        # Read path: chỉ giữ trong memory, index trên đĩa do sync/ingest ghi
+        chapter_index_service.remember(chapter_id, *location)
+        return location
+    
+    def get_chapter_variant(self, chapter_id: int, format: str = "markdown", compressed: bool = False) -> Optional[dict]:
+        """
+        Lấy vị trí bản render sẵn của chapter để stream thẳng file cho client
+
+        Returns:
+            Kết quả của ContentService.locate_variant, None nếu không có nội dung
+        """
+        location = self._get_chapter_location(chapter_id)
+        if location is None:
+            return None
+
+        variant = self.content_service.locate_variant(location.novel_dir, location.content_file, format, compressed)
+        if variant is None:
+            # Chưa có bản render (dữ liệu cũ): render một lần rồi tìm lại
+            if not self.content_service.ensure_variants(location.novel_dir, location.content_file):
+                return None
+            variant = self.content_service.locate_variant(location.novel_dir, location.content_file, format, compressed)
+
+        return variant
+
+    def create_chapter(self, chapter_data: dict, index_content: bool = True) -> Optional[dict]:
+        """
+        Tạo chapter mới (admin only)
+        
+        Args:
+            index_content: False khi tạo nhiều chapters liên tiếp (EPUB ingest),
+                caller gọi index_chapters_content một lần cho cả batch
+        """
         try:
             # Sử dụng service key để bypass RLS cho admin operations
             response = self.supabase_admin.table('chapters').insert(chapter_data).execute()
             chapter = response.data[0] if response.data else None
             
             if chapter:
+                # Render sẵn các variants của content
+                self._render_chapter_variants(chapter)
+                if index_content:
+                    self.index_chapters_content([chapter])
+                
                 # Clear cache khi tạo chapter mới
+                navigation_service.invalidate(chapter['novel_id'])
                 self._clear_chapters_list_cache()
                 print("✅ Cleared chapters cache after creating chapter")
             
@@ -120,6 +202,7 @@ class ChapterService:
             # Kiểm tra xem có đổi tên file không
             old_content_file = current_chapter.get('content_file')
             new_content_file = chapter_data.get('content_file')
+            old_content_hash = self._get_content_hash(chapter_id)
             
             # Cập nhật chapter trong database
             response = self.supabase_admin.table('chapters').update(chapter_data).eq('id', chapter_id).execute()
@@ -130,7 +213,14 @@ class ChapterService:
                 self._update_chapter_file(chapter_id, old_content_file, new_content_file)
             
             if updated_chapter:
-                # Clear cache khi update chapter
+                # Render lại variants cho content file hiện tại
+                self._render_chapter_variants(updated_chapter)
+                self.index_chapters_content([updated_chapter])
+                
+                # Clear cache khi update chapter (chapter có thể đổi số/novel)
+                navigation_service.invalidate(current_chapter['novel_id'])
+                navigation_service.invalidate(updated_chapter['novel_id'])
+                self._invalidate_chapter_cache(chapter_id, old_content_hash)
                 self._clear_chapters_list_cache()
                 print("✅ Cleared chapters cache after updating chapter")
             
@@ -153,11 +243,15 @@ class ChapterService:
             success = len(response.data) > 0
             
             if success:
+                # Hash lấy trước khi entry bị xóa khỏi chapter index
+                content_hash = self._get_content_hash(chapter_id)
+                
                 # Xóa file content của chapter
                 self._delete_chapter_file(chapter)
                 
                 # Xóa cache
-                self._invalidate_chapter_cache(chapter_id)
+                navigation_service.invalidate(chapter['novel_id'])
+                self._invalidate_chapter_cache(chapter_id, content_hash)
                 self._clear_chapters_list_cache()
             
             return success
@@ -215,8 +309,12 @@ class ChapterService:
             print(f"Error getting chapter activities: {e}")
             return []
     
-    def _invalidate_chapter_cache(self, chapter_id: int) -> None:
-        """Xóa cache của chapter"""
+    def _get_content_hash(self, chapter_id: int) -> Optional[str]:
+        location = chapter_index_service.get(chapter_id)
+        return location.content_hash if location is not None else None
+    
+    def _invalidate_chapter_cache(self, chapter_id: int, content_hash: Optional[str] = None) -> None:
+        """Xóa cache của chapter (content_hash: hash nội dung trước khi sửa/xóa)"""
         cache_key = f"chapter:{chapter_id}"
         cache_service.delete(cache_key)
         
@@ -225,6 +323,11 @@ class ChapterService:
         cache_service.delete(content_cache_key)
         content_cache_key = f"chapter_content:{chapter_id}:html"
         cache_service.delete(content_cache_key)
+        
+        # Cache theo hash nội dung (get_content_cache_key), cả hash cũ lẫn hash hiện tại
+        for digest in {content_hash, self._get_content_hash(chapter_id)} - {None}:
+            for format in CONTENT_FORMATS:
+                cache_service.delete(f"content:{digest}:{format}")
     
     def _clear_chapters_list_cache(self) -> None:
         """Xóa cache của danh sách chapters"""
@@ -251,25 +354,20 @@ class ChapterService:
                 print("Chapter không có content_file")
                 return
             
-            # Lấy thông tin novel để tìm đúng thư mục
-            novel = self.supabase_service.get_novel(chapter['novel_id'])
-            if not novel:
-                print(f"Không tìm thấy novel {chapter['novel_id']}")
-                return
-            
-            novel_title = novel.get('title')
-            if not novel_title:
-                print("Novel không có title")
+            # Lấy thư mục novel (từ chapter index hoặc database)
+            location = self._get_chapter_location(chapter['id'], chapter)
+            chapter_index_service.remove(chapter['id'])
+            if not location:
+                print(f"Không tìm thấy thư mục của novel {chapter['novel_id']}")
                 return
             
-            # Tạo đường dẫn đến file
-            file_path = os.path.join(settings.storage_path, novel_title, content_file)
+            content_search_service.remove_chapters(location.novel_dir, [chapter['id']])
             
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                print(f"Đã xóa file content: {file_path}")
+            # Xóa file gốc (hoặc entry trong packed store) và các bản render sẵn
+            if self.content_service.delete_chapter_file(location.novel_dir, content_file):
+                print(f"Đã xóa file content: {location.novel_dir}/{content_file}")
             else:
-                print(f"File content không tồn tại: {file_path}")
+                print(f"File content không tồn tại: {location.novel_dir}/{content_file}")
         except Exception as e:
             print(f"Error deleting chapter file: {e}")
     
@@ -281,43 +379,63 @@ class ChapterService:
                 print(f"Chapter {chapter_id} không tồn tại")
                 return
             
-            # Lấy thông tin novel
-            novel = self.supabase_service.get_novel(chapter['novel_id'])
-            if not novel:
-                print(f"Không tìm thấy novel {chapter['novel_id']}")
+            # Lấy thư mục novel (từ chapter index hoặc database)
+            location = self._get_chapter_location(chapter_id)
+            if not location:
+                print(f"Không tìm thấy thư mục của novel {chapter['novel_id']}")
                 return
             
-            novel_title = novel.get('title')
-            if not novel_title:
-                print("Novel không có title")
-                return
-            
-            # Tạo đường dẫn đến file cũ và mới
-            old_file_path = os.path.join(settings.storage_path, novel_title, old_content_file)
-            new_file_path = os.path.join(settings.storage_path, novel_title, new_content_file)
-            
-            if os.path.exists(old_file_path):
-                # Đổi tên file
-                os.rename(old_file_path, new_file_path)
-                print(f"Đã đổi tên file content: {old_file_path} -> {new_file_path}")
+            if self.content_service.rename_chapter_file(location.novel_dir, old_content_file, new_content_file):
+                print(f"Đã đổi tên file content: {old_content_file} -> {new_content_file}")
             else:
-                print(f"File content cũ không tồn tại: {old_file_path}")
+                print(f"File content cũ không tồn tại: {location.novel_dir}/{old_content_file}")
+            
+            chapter_index_service.set(chapter_id, location.novel_id, location.novel_dir, new_content_file,
+                                      location.content_hash)
         except Exception as e:
             print(f"Error updating chapter file: {e}")
     
     def _create_chapter_file(self, novel_title: str, content_file: str, content: str) -> None:
         """Tạo file content cho chapter"""
         try:
-            # Tạo đường dẫn đến file
-            file_path = os.path.join(settings.storage_path, novel_title, content_file)
+            # Ghi nội dung (file riêng hoặc packed store tùy backend)
+            if not self.content_service.save_chapter_file(novel_title, content_file, content):
+                return
+            
+            # Render sẵn các variants
+            self.content_service.render_variants(novel_title, content_file, content)
             
-            # Tạo thư mục nếu chưa có
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            print(f"Đã tạo file content: {novel_title}/{content_file}")
+        except Exception as e:
+            print(f"Error creating chapter file: {e}")
+    
+    def index_chapters_content(self, chapters: List[dict]) -> None:
+        """Cập nhật index nội dung (full-text search) cho các chapters, một segment cho mỗi novel"""
+        if not settings.content_search_enabled:
+            return
+        try:
+            by_novel_dir: Dict[str, list] = {}
+            for chapter in chapters:
+                location = self._get_chapter_location(chapter['id'], chapter)
+                if location:
+                    by_novel_dir.setdefault(location.novel_dir, []).append(
+                        (chapter['id'], location.content_file, location.content_hash))
             
-            # Ghi nội dung vào file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            for novel_dir, entries in by_novel_dir.items():
+                content_search_service.index_chapters(novel_dir, entries)
+        except Exception as e:
+            print(f"Error indexing chapter content: {e}")
+    
+    def _render_chapter_variants(self, chapter: dict) -> None:
+        """Render sẵn các variants (markdown/html/gzip) cho content file của chapter"""
+        try:
+            # Resolve vị trí file theo content_file mới nhất
+            location = self._get_chapter_location(chapter['id'], chapter)
+            if not location:
+                return
             
-            print(f"Đã tạo file content: {file_path}")
+            self.content_service.ensure_variants(location.novel_dir, location.content_file)
+            # Write path (admin tạo/sửa chapter): ghi vào chapter index trên đĩa
+            chapter_index_service.set(chapter['id'], *location)
         except Exception as e:
-            print(f"Error creating chapter file: {e}") 
\ No newline at end of file
+            print(f"Error rendering chapter variants: {e}")
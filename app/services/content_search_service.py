@@ -0,0 +1,533 @@
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import unicodedata
+import zlib
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from html import escape
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.core.config import settings
+from app.services.html_text_service import html_text_service, normalize_whitespace
+from app.services.markdown_service import ContentService
+from app.services.search_service import BM25_B, BM25_K1, TOKEN_PATTERN, fold_text, tokenize
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa giữa các thread trong process
+    fcntl = None
+
+# Thư mục (trong thư mục novel) chứa index nội dung chapters
+INDEX_DIR = '.search'
+MANIFEST_FILENAME = 'manifest.json'
+# flock giữa các process ghi index của cùng một novel (worker uvicorn, scripts)
+LOCK_FILENAME = 'write.lock'
+MANIFEST_VERSION = 1
+SEGMENT_MAGIC = b'NSI1'
+
+# Gộp tất cả segments thành một khi số segment vượt ngưỡng
+MAX_SEGMENTS = 8
+# Số novel giữ index đã mở (header đã parse + mmap) trong memory (LRU)
+MAX_OPEN_NOVELS = 32
+MAX_QUERY_TERMS = 8
+# Độ dài snippet (ký tự) trước và sau vị trí khớp
+SNIPPET_BEFORE = 80
+SNIPPET_AFTER = 160
+
+
+class _FoldTable(dict):
+    """
+    Bảng str.translate bỏ dấu từng ký tự, giữ nguyên độ dài chuỗi để vị trí
+    token trong text đã bỏ dấu cũng là vị trí trong text gốc (NFC)
+    """
+
+    def __missing__(self, code: int) -> str:
+        char = chr(code)
+        folded = fold_text(char)
+        if len(folded) != 1:
+            lowered = char.lower()
+            folded = lowered if len(lowered) == 1 else char
+        self[code] = folded
+        return folded
+
+
+_FOLD_TABLE = _FoldTable()
+
+
+def fold_preserving_length(text: str) -> str:
+    return text.translate(_FOLD_TABLE)
+
+
+def encode_varints(values: Iterable[int], out: bytearray) -> None:
+    """Ghi các số nguyên không âm dạng varint (7 bit mỗi byte, bit cao = còn byte tiếp)"""
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def decode_varints(data: bytes) -> List[int]:
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+class _Segment:
+    """
+    Một segment bất biến của index (một lần ghi của sync/ingest)
+
+    Layout file: magic, độ dài header (uint32 LE), header JSON, postings, text.
+    - header: `docs` = [[chapter_id, số token, offset text, độ dài text]],
+      `terms` = {term: [offset, độ dài, df]}, `text_start` = vị trí vùng text
+      tính từ đầu vùng postings
+    - postings của một term: các bộ varint (doc tăng dần mã hóa delta, tf,
+      vị trí ký tự của lần xuất hiện đầu tiên dùng cho snippet)
+    - text: plain text của từng chapter (zlib) để cắt snippet, không cần đọc lại file chapter
+    """
+
+    __slots__ = ('name', 'data', 'doc_ids', 'doc_lengths', 'doc_texts', 'terms', 'postings_start', 'text_start')
+
+    def __init__(self, path: str):
+        self.name = os.path.basename(path)
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:4] != SEGMENT_MAGIC:
+            raise ValueError(f"Invalid content index segment: {path}")
+        header_length = struct.unpack_from('<I', self.data, 4)[0]
+        header = json.loads(self.data[8:8 + header_length])
+        self.doc_ids = [doc[0] for doc in header['docs']]
+        self.doc_lengths = [doc[1] for doc in header['docs']]
+        self.doc_texts = [(doc[2], doc[3]) for doc in header['docs']]
+        self.terms: Dict[str, List[int]] = header['terms']
+        self.postings_start = 8 + header_length
+        self.text_start = self.postings_start + header['text_start']
+
+    def postings(self, term: str) -> List[Tuple[int, int, int]]:
+        """[(vị trí doc trong segment, tf, vị trí ký tự đầu tiên)] của term"""
+        entry = self.terms.get(term)
+        if entry is None:
+            return []
+        start = self.postings_start + entry[0]
+        values = decode_varints(self.data[start:start + entry[1]])
+        result = []
+        doc = 0
+        for i in range(0, len(values), 3):
+            doc += values[i]
+            result.append((doc, values[i + 1], values[i + 2]))
+        return result
+
+    def text(self, doc: int) -> str:
+        offset, length = self.doc_texts[doc]
+        start = self.text_start + offset
+        return zlib.decompress(self.data[start:start + length]).decode('utf-8')
+
+    @staticmethod
+    def write(path: str, docs: List[Tuple[int, str]]) -> None:
+        """Ghi segment mới từ [(chapter_id, plain text)] (file tạm + rename)"""
+        postings: Dict[str, List[int]] = {}
+        doc_rows = []
+        texts = bytearray()
+        for doc, (chapter_id, text) in enumerate(docs):
+            folded = fold_preserving_length(text)
+            first_offsets: Dict[str, int] = {}
+            for match in TOKEN_PATTERN.finditer(folded):
+                first_offsets.setdefault(match.group(), match.start())
+            counts = Counter(TOKEN_PATTERN.findall(folded))
+            length = sum(counts.values())
+            for term, offset in first_offsets.items():
+                postings.setdefault(term, []).extend((doc, counts[term], offset))
+
+            compressed = zlib.compress(text.encode('utf-8'), 6)
+            doc_rows.append([chapter_id, length, len(texts), len(compressed)])
+            texts += compressed
+
+        blob = bytearray()
+        terms = {}
+        for term in sorted(postings):
+            values = postings[term]
+            start = len(blob)
+            previous = 0
+            for i in range(0, len(values), 3):
+                encode_varints((values[i] - previous, values[i + 1], values[i + 2]), blob)
+                previous = values[i]
+            terms[term] = [start, len(blob) - start, len(values) // 3]
+
+        header = json.dumps({'docs': doc_rows, 'terms': terms, 'text_start': len(blob)},
+                            ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(SEGMENT_MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            f.write(blob)
+            f.write(texts)
+        os.replace(tmp_path, path)
+
+
+class _NovelIndex:
+    """Index nội dung đã mở của một novel: các segment + chapter nào đang sống ở segment nào"""
+
+    __slots__ = ('mtime', 'segments', 'live', 'total_length')
+
+    def __init__(self, index_dir: str, manifest: Dict, mtime: float):
+        self.mtime = mtime
+        self.segments: Dict[str, _Segment] = {
+            name: _Segment(os.path.join(index_dir, name)) for name in manifest['segments']
+        }
+        # chapter_id → (segment, vị trí doc); bản cũ của chapter trong segment khác bị bỏ qua
+        self.live: Dict[int, Tuple[_Segment, int]] = {}
+        self.total_length = 0
+        for segment in self.segments.values():
+            for doc, chapter_id in enumerate(segment.doc_ids):
+                entry = manifest['docs'].get(str(chapter_id))
+                if entry is not None and entry[0] == segment.name:
+                    self.live[chapter_id] = (segment, doc)
+                    self.total_length += segment.doc_lengths[doc]
+
+
+class ContentSearchService:
+    """
+    Full-text search trong nội dung chapters của một novel
+
+    Mỗi novel có một inverted index trên đĩa (`{novel}/.search/`) gồm các
+    segment bất biến và một manifest. Sync/EPUB ingest/admin ghi thêm segment
+    cho các chapter mới hoặc đã đổi (so theo hash nội dung hoặc mtime), manifest
+    chỉ ra bản hiện tại của từng chapter; khi có quá MAX_SEGMENTS segment thì
+    gộp lại từ text đã lưu trong index. Query chỉ đọc postings (varint, delta)
+    và text của các chapter trong trang kết quả, không quét file chapter.
+
+    Đọc manifest → ghi segment → commit chạy trong flock exclusive trên
+    `.search/write.lock`, nên hai process không đặt trùng tên segment hay xóa
+    segment chưa commit của nhau; mở index giữ flock shared để không thấy
+    manifest trỏ tới segment vừa bị xóa.
+    """
+
+    def __init__(self):
+        self.storage_path = settings.storage_path
+        self.content_service = ContentService()
+        self._open: "OrderedDict[str, _NovelIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_locks: Dict[str, threading.Lock] = {}
+
+    def _index_dir(self, novel_dir: str) -> str:
+        return os.path.join(self.storage_path, novel_dir, INDEX_DIR)
+
+    def _read_manifest(self, novel_dir: str) -> Dict:
+        try:
+            with open(os.path.join(self._index_dir(novel_dir), MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Error reading content index manifest of {novel_dir}, rebuilding: {e}")
+        return {'version': MANIFEST_VERSION, 'next_segment': 1, 'segments': [], 'docs': {}}
+
+    def _write_manifest(self, novel_dir: str, manifest: Dict) -> None:
+        os.makedirs(self._index_dir(novel_dir), exist_ok=True)
+        path = os.path.join(self._index_dir(novel_dir), MANIFEST_FILENAME)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def _get_write_lock(self, novel_dir: str) -> threading.Lock:
+        with self._lock:
+            return self._write_locks.setdefault(novel_dir, threading.Lock())
+
+    @contextmanager
+    def _locked(self, novel_dir: str, exclusive: bool = True):
+        """Khóa index của novel: lock trong process + flock giữa các process"""
+        with self._get_write_lock(novel_dir):
+            if fcntl is None:
+                yield
+                return
+            index_dir = self._index_dir(novel_dir)
+            try:
+                os.makedirs(index_dir, exist_ok=True)
+                fd = os.open(os.path.join(index_dir, LOCK_FILENAME), os.O_RDWR | os.O_CREAT, 0o644)
+            except OSError:
+                if exclusive:
+                    raise
+                # Storage chỉ đọc: không ai ghi index nên không cần khóa
+                yield
+                return
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                yield
+            finally:
+                os.close(fd)
+
+    def _source_key(self, novel_dir: str, content_file: str, content_hash: Optional[str]) -> Optional[str]:
+        """Phiên bản nội dung chapter (hash hoặc mtime + size), None nếu không có file"""
+        if content_hash:
+            return content_hash
+        return self.content_service.get_source_version(novel_dir, content_file)
+
+    def _extract_text(self, novel_dir: str, content_file: str) -> Optional[str]:
+        content = self.content_service.read_content_file(content_file, novel_dir)
+        if content is None:
+            return None
+        text = html_text_service.to_text(self.content_service.render_content(content, 'html'))
+        return unicodedata.normalize('NFC', text)
+
+    def index_chapters(self, novel_dir: str, chapters: Iterable[Tuple], rebuild: bool = False) -> int:
+        """
+        Index các chapters (chapter_id, content_file[, content_hash]) của một novel
+
+        Chapter không đổi từ lần index trước được bỏ qua, các chapter còn lại được
+        ghi thành một segment mới. `rebuild=True` index lại toàn bộ `chapters`.
+
+        Returns:
+            Số chapter đã index
+        """
+        if not novel_dir:
+            return 0
+        try:
+            with self._locked(novel_dir):
+                return self._index_chapters(novel_dir, chapters, rebuild)
+        except Exception as e:
+            print(f"❌ Error indexing chapter content of {novel_dir}: {e}")
+            return 0
+
+    def _index_chapters(self, novel_dir: str, chapters: Iterable[Tuple], rebuild: bool) -> int:
+        """index_chapters khi đang giữ lock của novel"""
+        manifest = self._read_manifest(novel_dir)
+        if rebuild:
+            # Index lại từ đầu: chapter không có trong `chapters` bị bỏ khỏi index
+            manifest['docs'] = {}
+        docs: Dict[int, str] = {}
+        keys = {}
+        for chapter_id, content_file, *rest in chapters:
+            key = self._source_key(novel_dir, content_file, rest[0] if rest else None)
+            if key is None:
+                continue
+            current = manifest['docs'].get(str(chapter_id))
+            if current is not None and current[1] == key:
+                continue
+            text = self._extract_text(novel_dir, content_file)
+            if text is None:
+                continue
+            docs[chapter_id] = text
+            keys[chapter_id] = key
+
+        if not docs:
+            if rebuild:
+                self._commit(novel_dir, manifest)
+            return 0
+
+        os.makedirs(self._index_dir(novel_dir), exist_ok=True)
+        name = f"seg-{manifest['next_segment']}.idx"
+        manifest['next_segment'] += 1
+        _Segment.write(os.path.join(self._index_dir(novel_dir), name), list(docs.items()))
+        manifest['segments'].append(name)
+        for chapter_id, key in keys.items():
+            manifest['docs'][str(chapter_id)] = [name, key]
+
+        if len(manifest['segments']) > MAX_SEGMENTS:
+            self._merge_segments(novel_dir, manifest)
+        self._commit(novel_dir, manifest)
+        print(f"🔎 Indexed content of {len(docs)} chapters in {novel_dir}")
+        return len(docs)
+
+    def remove_chapters(self, novel_dir: str, chapter_ids: Iterable[int]) -> None:
+        """Bỏ chapters khỏi index (khi xóa chapter)"""
+        if not self.has_index(novel_dir):
+            return
+        try:
+            with self._locked(novel_dir):
+                manifest = self._read_manifest(novel_dir)
+                removed = [manifest['docs'].pop(str(chapter_id), None) for chapter_id in chapter_ids]
+                if any(entry is not None for entry in removed):
+                    self._commit(novel_dir, manifest)
+        except Exception as e:
+            print(f"❌ Error removing chapters from content index of {novel_dir}: {e}")
+
+    def _merge_segments(self, novel_dir: str, manifest: Dict) -> None:
+        """Gộp các chapter còn sống thành một segment, dùng text đã lưu trong index"""
+        index_dir = self._index_dir(novel_dir)
+        docs = []
+        for name in manifest['segments']:
+            segment = _Segment(os.path.join(index_dir, name))
+            for doc, chapter_id in enumerate(segment.doc_ids):
+                entry = manifest['docs'].get(str(chapter_id))
+                if entry is not None and entry[0] == name:
+                    docs.append((chapter_id, segment.text(doc)))
+
+        name = f"seg-{manifest['next_segment']}.idx"
+        manifest['next_segment'] += 1
+        _Segment.write(os.path.join(index_dir, name), docs)
+        manifest['segments'] = [name]
+        for chapter_id, _ in docs:
+            manifest['docs'][str(chapter_id)][0] = name
+
+    def _commit(self, novel_dir: str, manifest: Dict) -> None:
+        """Ghi manifest rồi xóa các segment không còn chapter nào sống (khi đang giữ flock exclusive)"""
+        live_segments = {entry[0] for entry in manifest['docs'].values()}
+        manifest['segments'] = [name for name in manifest['segments'] if name in live_segments]
+        self._write_manifest(novel_dir, manifest)
+
+        # Reader đang mmap segment cũ vẫn đọc được sau khi file bị xóa
+        index_dir = self._index_dir(novel_dir)
+        for filename in os.listdir(index_dir):
+            if filename.endswith('.idx') and filename not in live_segments:
+                try:
+                    os.remove(os.path.join(index_dir, filename))
+                except OSError:
+                    pass
+
+    def _get_index(self, novel_dir: str) -> Optional[_NovelIndex]:
+        """Index đã mở của novel, mở lại nếu manifest đã được ghi lại (process khác, sync...)"""
+        manifest_path = os.path.join(self._index_dir(novel_dir), MANIFEST_FILENAME)
+        try:
+            mtime = os.stat(manifest_path).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._open.pop(novel_dir, None)
+            return None
+
+        with self._lock:
+            index = self._open.get(novel_dir)
+            if index is not None and index.mtime == mtime:
+                self._open.move_to_end(novel_dir)
+                return index
+
+        try:
+            # flock shared: process khác không commit (xóa segment) giữa lúc đọc manifest và mở segment
+            with self._locked(novel_dir, exclusive=False):
+                index = _NovelIndex(self._index_dir(novel_dir), self._read_manifest(novel_dir), mtime)
+        except Exception as e:
+            print(f"❌ Error opening content index of {novel_dir}: {e}")
+            return None
+
+        with self._lock:
+            self._open[novel_dir] = index
+            self._open.move_to_end(novel_dir)
+            while len(self._open) > MAX_OPEN_NOVELS:
+                self._open.popitem(last=False)
+        return index
+
+    def has_index(self, novel_dir: str) -> bool:
+        return bool(novel_dir) and os.path.exists(os.path.join(self._index_dir(novel_dir), MANIFEST_FILENAME))
+
+    def search(self, novel_dir: str, query: str, page: int = 1, limit: int = 20) -> Optional[Dict[str, Any]]:
+        """
+        Tìm chapters chứa tất cả các từ trong query, xếp theo BM25
+
+        Returns:
+            {"items": [{"chapter_id", "score", "snippet"}], "total", ...}, None
+            nếu novel chưa có index
+        """
+        index = self._get_index(novel_dir) if novel_dir else None
+        if index is None:
+            return None
+
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        scores: Dict[int, float] = {}
+        first_match: Dict[int, int] = {}
+        if terms and index.live:
+            total_docs = len(index.live)
+            avg_length = index.total_length / total_docs or 1.0
+            candidates = None
+            per_term = []
+            for term in terms:
+                term_hits = {}
+                for segment in index.segments.values():
+                    for doc, tf, offset in segment.postings(term):
+                        chapter_id = segment.doc_ids[doc]
+                        live = index.live.get(chapter_id)
+                        if live is not None and live[0] is segment and live[1] == doc:
+                            term_hits[chapter_id] = (tf, offset, segment.doc_lengths[doc])
+                per_term.append(term_hits)
+                candidates = set(term_hits) if candidates is None else candidates & term_hits.keys()
+                if not candidates:
+                    break
+
+            idfs = [math.log(1 + (total_docs - len(term_hits) + 0.5) / (len(term_hits) + 0.5))
+                    for term_hits in per_term]
+            for chapter_id in candidates or ():
+                score = 0.0
+                for idf, term_hits in zip(idfs, per_term):
+                    tf, offset, length = term_hits[chapter_id]
+                    score += idf * tf * (BM25_K1 + 1) / (
+                        tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+                scores[chapter_id] = score
+                # Snippet quanh lần khớp sớm nhất
+                first_match[chapter_id] = min(term_hits[chapter_id][1] for term_hits in per_term)
+
+        ranked = sorted(scores, key=lambda chapter_id: (-scores[chapter_id], chapter_id))
+        total = len(ranked)
+        total_pages = (total + limit - 1) // limit if total else 0
+        offset = (page - 1) * limit
+        items = []
+        for chapter_id in ranked[offset:offset + limit]:
+            segment, doc = index.live[chapter_id]
+            items.append({
+                'chapter_id': chapter_id,
+                'score': round(scores[chapter_id], 4),
+                'snippet': self._snippet(segment.text(doc), set(terms), first_match[chapter_id]),
+            })
+
+        return {
+            'items': items,
+            'total': total,
+            'page': page,
+            'limit': limit,
+            'total_pages': total_pages,
+            'has_next': page < total_pages,
+            'has_prev': page > 1,
+        }
+
+    def _snippet(self, text: str, terms: set, position: int) -> str:
+        """Đoạn text quanh vị trí khớp, các từ khớp bọc trong <mark> (text đã escape)"""
+        start = max(0, position - SNIPPET_BEFORE)
+        end = min(len(text), position + SNIPPET_AFTER)
+        # Không cắt giữa từ
+        if start > 0:
+            space = text.find(' ', start, position)
+            if space != -1:
+                start = space + 1
+        if end < len(text):
+            space = text.rfind(' ', position, end)
+            if space > position:
+                end = space
+
+        window = normalize_whitespace(text[start:end])
+        parts = ['…'] if start > 0 else []
+        cursor = 0
+        for match in TOKEN_PATTERN.finditer(fold_preserving_length(window)):
+            if match.group() in terms:
+                parts.append(escape(window[cursor:match.start()], quote=False))
+                parts.append(f"<mark>{escape(window[match.start():match.end()], quote=False)}</mark>")
+                cursor = match.end()
+        parts.append(escape(window[cursor:], quote=False))
+        if end < len(text):
+            parts.append('…')
+        return ''.join(parts)
+
+    def get_stats(self, novel_dir: str) -> Optional[Dict[str, Any]]:
+        index = self._get_index(novel_dir) if novel_dir else None
+        if index is None:
+            return None
+        return {
+            'chapters': len(index.live),
+            'segments': len(index.segments),
+            'terms': sum(len(segment.terms) for segment in index.segments.values()),
+            'bytes': sum(len(segment.data) for segment in index.segments.values()),
+        }
+
+
+# Global instance
+content_search_service = ContentSearchService()
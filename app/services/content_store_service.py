@@ -0,0 +1,205 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+from app.core.config import settings
+
+
+# Object store nằm ở gốc storage, tên thư mục bắt đầu bằng '.' nên sync bỏ qua
+OBJECTS_DIR = '.objects'
+RENDERED_OBJECTS_DIR = 'rendered'
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Số file tối đa giữ hash trong memory
+HASH_CACHE_SIZE = 100000
+# gc() không xóa object mới ghi (có thể chưa kịp link vào thư mục novel)
+GC_MIN_AGE_SECONDS = 300
+
+
+class ContentStoreService:
+    """
+    Object store content-addressed cho nội dung chapter (backend files)
+
+    Mỗi nội dung khác nhau được lưu một lần tại `.objects/{ab}/{sha256}`, file
+    chapter do server ghi (`store_file`) là hard link tới object. Số reference chính là
+    `st_nlink - 1` (link từ các thư mục novel), object không còn reference bị
+    xóa khi `gc()`. Bản render sẵn cũng được lưu theo hash tại
+    `.objects/rendered/{ab}/{sha256}.{format}[.gz]` nên nội dung giống nhau
+    chỉ được render một lần.
+
+    Vì các link dùng chung inode, file chapter không được ghi đè tại chỗ:
+    luôn ghi file mới rồi rename (xem ContentService.save_chapter_file). File
+    chapter do sync đưa vào (crawler có thể sửa tại chỗ) không bao giờ được
+    link: nội dung sync chỉ được dedup bản render và cache (theo hash), bản
+    thân file vẫn được lưu riêng cho từng chapter và không có object/refcount.
+
+    Mọi hash đều tính trên bytes của file (không phải text đã decode), nên
+    file chapter và nội dung server ghi ra cho cùng một hash.
+    """
+
+    def __init__(self):
+        self.storage_path = settings.storage_path
+        self.objects_path = os.path.join(self.storage_path, OBJECTS_DIR)
+        # (st_dev, st_ino, st_mtime_ns, st_size) → hash, để file chưa đổi không phải hash lại;
+        # file sửa tại chỗ đổi mtime/size nên không dùng nhầm hash cũ
+        self._inode_hashes: "OrderedDict[Tuple[int, int, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def _stat_key(stat_result: os.stat_result) -> Tuple[int, int, int, int]:
+        return stat_result.st_dev, stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size
+
+    def hash_file(self, path: str) -> str:
+        """Hash bytes của file (dùng lại kết quả nếu file chưa đổi kể từ lần hash trước)"""
+        with open(path, 'rb') as f:
+            # stat trên fd đã mở: key và nội dung đọc ra là của cùng một inode
+            key = self._stat_key(os.fstat(f.fileno()))
+            with self._lock:
+                digest = self._inode_hashes.get(key)
+            if digest is not None:
+                return digest
+
+            hasher = hashlib.sha256()
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+            digest = hasher.hexdigest()
+            # File bị sửa trong lúc đang hash: không cache kết quả
+            if self._stat_key(os.fstat(f.fileno())) == key:
+                self._remember_key(key, digest)
+        return digest
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_path, digest[:2], digest)
+
+    def rendered_object_path(self, digest: str, format: str, compressed: bool = False) -> str:
+        filename = f"{digest}.{format}.gz" if compressed else f"{digest}.{format}"
+        return os.path.join(self.objects_path, RENDERED_OBJECTS_DIR, digest[:2], filename)
+
+    def _write_object(self, path: str, data: bytes) -> None:
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _link(self, source: str, dest: str) -> None:
+        """Thay dest bằng hard link tới source (copy nếu filesystem không hỗ trợ link)"""
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp_path = f"{dest}.tmp.{os.getpid()}.{threading.get_ident()}"
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, dest)
+
+    def _remember_key(self, key: Tuple[int, int, int, int], digest: str) -> None:
+        with self._lock:
+            self._inode_hashes[key] = digest
+            self._inode_hashes.move_to_end(key)
+            while len(self._inode_hashes) > HASH_CACHE_SIZE:
+                self._inode_hashes.popitem(last=False)
+
+    def _remember(self, path: str, digest: str) -> None:
+        self._remember_key(self._stat_key(os.stat(path)), digest)
+
+    def store_file(self, dest: str, data: bytes) -> str:
+        """Lưu nội dung vào store và link vào dest, trả về hash"""
+        digest = self.hash_bytes(data)
+        source = self.object_path(digest)
+        self._write_object(source, data)
+        self._link(source, dest)
+        self._remember(source, digest)
+        return digest
+
+    def detach_file(self, path: str) -> bool:
+        """
+        Thay hard link tới object bằng bản copy riêng của file
+
+        Dùng cho file chapter do sync đưa vào mà phiên bản cũ đã link vào store:
+        crawler sửa tại chỗ file đó sẽ sửa luôn object và mọi chapter dùng chung.
+
+        Returns:
+            True nếu file đã được tách khỏi object
+        """
+        try:
+            if os.stat(path).st_nlink < 2:
+                return False
+        except OSError:
+            return False
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        # copy2 giữ mtime để bản render sẵn không bị coi là cũ
+        shutil.copy2(path, tmp_path)
+        os.replace(tmp_path, path)
+        return True
+
+    def has_rendered(self, digest: str, variants) -> bool:
+        return all(os.path.exists(self.rendered_object_path(digest, format, compressed))
+                   for format, compressed in variants)
+
+    def store_rendered(self, digest: str, format: str, compressed: bool, data: bytes) -> str:
+        path = self.rendered_object_path(digest, format, compressed)
+        self._write_object(path, data)
+        return path
+
+    def link_rendered(self, digest: str, format: str, compressed: bool, dest: str) -> None:
+        self._link(self.rendered_object_path(digest, format, compressed), dest)
+
+    def refcount(self, digest: str) -> int:
+        """Số file chapter đang link tới object"""
+        try:
+            return os.stat(self.object_path(digest)).st_nlink - 1
+        except OSError:
+            return 0
+
+    def gc(self) -> Dict[str, int]:
+        """
+        Xóa các object và bản render không còn được file nào trong thư mục novel link tới
+
+        Bản render được xét riêng (st_nlink == 1), không theo object nguồn: bản
+        render của file sync (không có object) hay của nội dung cũ sau khi file
+        bị sửa tại chỗ cũng được thu hồi.
+        """
+        removed = 0
+        rendered_removed = 0
+        reclaimed = 0
+        rendered_root = os.path.join(self.objects_path, RENDERED_OBJECTS_DIR)
+        if not os.path.isdir(self.objects_path):
+            return {'removed': 0, 'rendered_removed': 0, 'reclaimed_bytes': 0}
+
+        cutoff = time.time() - GC_MIN_AGE_SECONDS
+        for root, dirs, files in os.walk(self.objects_path):
+            is_rendered = root == rendered_root or root.startswith(rendered_root + os.sep)
+            for filename in files:
+                # File tạm của lần ghi đang chạy
+                if '.tmp.' in filename:
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat_result = os.stat(path)
+                    if stat_result.st_nlink > 1 or stat_result.st_mtime > cutoff:
+                        continue
+                    os.remove(path)
+                except OSError:
+                    continue
+                if is_rendered:
+                    rendered_removed += 1
+                else:
+                    removed += 1
+                reclaimed += stat_result.st_size
+
+        with self._lock:
+            self._inode_hashes.clear()
+        return {'removed': removed, 'rendered_removed': rendered_removed, 'reclaimed_bytes': reclaimed}
+
+
+# Global instance
+content_store_service = ContentStoreService()
@@ -1,16 +1,24 @@
-import os
+import posixpath
+import re
 import zipfile
 import xml.etree.ElementTree as ET
 from typing import List, Dict, Any, Optional, Tuple
-from pathlib import Path
-import re
+from urllib.parse import unquote
 from app.core.config import settings
+from app.services.html_text_service import html_text_service
+from app.services.markdown_service import ContentService
+
+
+# Tiêu đề của document (spine không có TOC): heading đầu tiên, không có thì <title>
+_HEADING_RE = re.compile(r'<(h[1-6])\b[^>]*>(.*?)</\1\s*>', re.DOTALL | re.IGNORECASE)
+_TITLE_RE = re.compile(r'<title\b[^>]*>(.*?)</title\s*>', re.DOTALL | re.IGNORECASE)
 
 
 class EpubService:
     def __init__(self):
         self.storage_path = settings.storage_path
         self.epub_extensions = ['.epub']
+        self.content_service = ContentService()
     
     def extract_epub_info(self, epub_path: str) -> Dict[str, Any]:
         """
@@ -57,38 +65,59 @@ class EpubService:
                 manifest = opf_tree.find('.//{http://www.idpf.org/2007/opf}manifest')
                 items = manifest.findall('.//{http://www.idpf.org/2007/opf}item')
                 
-                # Tìm NCX file (table of contents)
-                ncx_file = None
+                # Index manifest theo path đã chuẩn hóa (relative với OPF) và theo id
+                opf_dir = posixpath.dirname(opf_path)
+                manifest_index = self._build_manifest_index(items, opf_dir)
+                items_by_id = {item.get('id'): item for item in items}
+                
+                # Tìm NCX file (EPUB2) và nav document (EPUB3)
+                ncx_item = None
+                nav_item = None
                 for item in items:
-                    if item.get('media-type') == 'application/x-dtbncx+xml':
-                        ncx_file = item.get('href')
-                        break
+                    if ncx_item is None and item.get('media-type') == 'application/x-dtbncx+xml':
+                        ncx_item = item
+                    if nav_item is None and 'nav' in (item.get('properties') or '').split():
+                        nav_item = item
+                
+                chapters = []
+                if ncx_item is not None:
+                    # Đọc NCX file để lấy table of contents
+                    ncx_path, _ = self._resolve_href(opf_dir, ncx_item.get('href'))
+                    ncx_tree = ET.fromstring(epub.read(ncx_path))
+                    chapters = self._extract_chapters_from_ncx(
+                        ncx_tree, manifest_index, posixpath.dirname(ncx_path)
+                    )
                 
-                # Nếu không có NCX, tìm trong spine
-                if not ncx_file:
+                if not chapters and nav_item is not None:
+                    # EPUB3: đọc nav.xhtml
+                    nav_path, _ = self._resolve_href(opf_dir, nav_item.get('href'))
+                    try:
+                        nav_tree = ET.fromstring(epub.read(nav_path))
+                        chapters = self._extract_chapters_from_nav(
+                            nav_tree, manifest_index, posixpath.dirname(nav_path)
+                        )
+                    except ET.ParseError as e:
+                        print(f"Error parsing EPUB3 nav document: {e}")
+                
+                # Nếu không có table of contents, lấy danh sách chapters từ spine
+                if not chapters:
                     spine = opf_tree.find('.//{http://www.idpf.org/2007/opf}spine')
                     if spine is not None:
                         spine_items = spine.findall('.//{http://www.idpf.org/2007/opf}itemref')
-                        # Lấy danh sách chapters từ spine
-                        chapters = []
                         for itemref in spine_items:
                             idref = itemref.get('idref')
-                            for item in items:
-                                if item.get('id') == idref:
-                                    chapters.append({
-                                        'id': idref,
-                                        'href': item.get('href'),
-                                        'media_type': item.get('media-type')
-                                    })
-                                    break
-                    else:
-                        chapters = []
-                else:
-                    # Đọc NCX file để lấy table of contents
-                    ncx_content = epub.read(ncx_file)
-                    ncx_tree = ET.fromstring(ncx_content)
-                    chapters = self._extract_chapters_from_ncx(ncx_tree, items)
+                            item = items_by_id.get(idref)
+                            if item is not None:
+                                path, _ = self._resolve_href(opf_dir, item.get('href'))
+                                chapters.append({
+                                    'id': idref,
+                                    'title': self._document_title(epub, path) or idref,
+                                    'href': item.get('href'),
+                                    'path': path,
+                                    'media_type': item.get('media-type')
+                                })
                 
+                self._assign_end_fragments(chapters)
                 return {
                     'title': title,
                     'creator': creator,
@@ -104,44 +133,167 @@ class EpubService:
             print(f"Error extracting EPUB info: {e}")
             return None
     
-    def _extract_chapters_from_ncx(self, ncx_tree: ET.Element, items: List[ET.Element]) -> List[Dict[str, Any]]:
+    def _resolve_href(self, base_dir: str, href: str) -> Tuple[str, Optional[str]]:
+        """
+        Chuẩn hóa href thành path trong archive
+        
+        Href trong OPF/NCX/nav là relative với file chứa nó, có thể %-encoded
+        và có #fragment.
+        
+        Returns:
+            Tuple (path trong archive, fragment hoặc None)
+        """
+        path, _, fragment = href.partition('#')
+        path = unquote(path)
+        if base_dir:
+            path = posixpath.join(base_dir, path)
+        path = posixpath.normpath(path) if path else path
+        return path, fragment or None
+    
+    def _build_manifest_index(self, items: List[ET.Element], opf_dir: str) -> Dict[str, ET.Element]:
+        """Tạo dict path → manifest item để resolve TOC entries trong O(1)"""
+        index = {}
+        for item in items:
+            href = item.get('href')
+            if href:
+                path, _ = self._resolve_href(opf_dir, href)
+                index[path] = item
+        return index
+    
+    def _toc_entry_to_chapter(self, title: str, src: str, manifest_index: Dict[str, ET.Element],
+                              base_dir: str, seen_entries: set) -> Optional[Dict[str, Any]]:
+        """Resolve một entry trong TOC thành chapter (None nếu không hợp lệ hoặc trùng entry)"""
+        if not src:
+            return None
+        
+        path, fragment = self._resolve_href(base_dir, src)
+        item = manifest_index.get(path)
+        
+        # Nhiều entry trỏ vào cùng một file với #fragment khác nhau là các chapter khác nhau
+        # (cắt file tại các anchor, xem _assign_end_fragments)
+        if item is None or (path, fragment) in seen_entries:
+            return None
+        seen_entries.add((path, fragment))
+        
+        return {
+            'title': title,
+            'href': item.get('href'),
+            'path': path,
+            'fragment': fragment,
+            'media_type': item.get('media-type'),
+            'id': item.get('id')
+        }
+    
+    def _extract_chapters_from_ncx(self, ncx_tree: ET.Element, manifest_index: Dict[str, ET.Element],
+                                   ncx_dir: str = '') -> List[Dict[str, Any]]:
         """Trích xuất thông tin chapters từ NCX file"""
+        ncx_ns = '{http://www.daisy.org/z3986/2005/ncx/}'
         chapters = []
-        nav_points = ncx_tree.findall('.//{http://www.daisy.org/z3986/2005/ncx/}navPoint')
+        seen_entries = set()
+        nav_points = ncx_tree.iter(f'{ncx_ns}navPoint')
         
         for nav_point in nav_points:
-            # Lấy title
-            text_elem = nav_point.find('.//{http://www.daisy.org/z3986/2005/ncx/}text')
-            title = text_elem.text if text_elem is not None else "Unknown Chapter"
+            # Lấy title (chỉ của navPoint hiện tại, không lấy của navPoint con)
+            text_elem = nav_point.find(f'{ncx_ns}navLabel/{ncx_ns}text')
+            title = text_elem.text.strip() if text_elem is not None and text_elem.text else "Unknown Chapter"
             
             # Lấy content file
-            content_elem = nav_point.find('.//{http://www.daisy.org/z3986/2005/ncx/}content')
+            content_elem = nav_point.find(f'{ncx_ns}content')
             src = content_elem.get('src') if content_elem is not None else None
             
-            if src:
-                # Tìm item tương ứng trong manifest
-                for item in items:
-                    if item.get('href') == src or item.get('href') in src:
-                        chapters.append({
-                            'title': title,
-                            'href': item.get('href'),
-                            'media_type': item.get('media-type'),
-                            'id': item.get('id')
-                        })
-                        break
+            chapter = self._toc_entry_to_chapter(title, src, manifest_index, ncx_dir, seen_entries)
+            if chapter:
+                chapters.append(chapter)
         
         return chapters
     
-    def extract_chapter_content(self, epub_path: str, chapter_info: Dict[str, Any]) -> Optional[str]:
-        """Trích xuất nội dung của một chapter từ EPUB"""
+    def _extract_chapters_from_nav(self, nav_tree: ET.Element, manifest_index: Dict[str, ET.Element],
+                                   nav_dir: str = '') -> List[Dict[str, Any]]:
+        """Trích xuất thông tin chapters từ EPUB3 nav document (nav.xhtml)"""
+        xhtml_ns = '{http://www.w3.org/1999/xhtml}'
+        epub_type = '{http://www.idpf.org/2007/ops}type'
+        
+        # Ưu tiên <nav epub:type="toc">, nếu không có thì lấy <nav> đầu tiên
+        navs = list(nav_tree.iter(f'{xhtml_ns}nav'))
+        toc_nav = next((nav for nav in navs if 'toc' in (nav.get(epub_type) or '').split()), None)
+        if toc_nav is None:
+            toc_nav = navs[0] if navs else None
+        if toc_nav is None:
+            return []
+        
+        chapters = []
+        seen_entries = set()
+        for anchor in toc_nav.iter(f'{xhtml_ns}a'):
+            title = ''.join(anchor.itertext()).strip() or "Unknown Chapter"
+            chapter = self._toc_entry_to_chapter(title, anchor.get('href'), manifest_index, nav_dir, seen_entries)
+            if chapter:
+                chapters.append(chapter)
+        
+        return chapters
+    
+    @staticmethod
+    def _assign_end_fragments(chapters: List[Dict[str, Any]]) -> None:
+        """
+        Chapter kết thúc tại anchor của chapter kế tiếp nếu chapter đó nằm trong
+        cùng file (TOC trỏ nhiều chapter vào một file qua #fragment)
+        """
+        for chapter, next_chapter in zip(chapters, chapters[1:]):
+            if next_chapter.get('fragment') and next_chapter['path'] == chapter['path']:
+                chapter['end_fragment'] = next_chapter['fragment']
+    
+    def _document_title(self, epub: zipfile.ZipFile, path: str) -> Optional[str]:
+        """Heading đầu tiên (hoặc <title>) của document, None nếu không có"""
+        try:
+            content = epub.read(path).decode('utf-8', errors='replace')
+        except KeyError:
+            return None
+        match = _HEADING_RE.search(content)
+        text = html_text_service.to_text(match.group(2)) if match else ''
+        if not text:
+            match = _TITLE_RE.search(content)
+            text = html_text_service.to_text(match.group(1)) if match else ''
+        return ' '.join(text.split()) or None
+    
+    def _find_anchor(self, content: str, fragment: str, start: int = 0) -> Optional[int]:
+        """Vị trí tag mang id (hoặc name) = fragment, None nếu không có"""
+        pattern = r'<[a-zA-Z][^>]*?\s(?:id|name)\s*=\s*(["\'])%s\1' % re.escape(unquote(fragment))
+        match = re.compile(pattern).search(content, start)
+        return match.start() if match else None
+    
+    def _slice_fragment(self, content: str, fragment: Optional[str], end_fragment: Optional[str]) -> str:
+        """Phần document từ anchor `fragment` (đầu file nếu None) tới anchor `end_fragment` (cuối file nếu None)"""
+        start = 0
+        if fragment:
+            start = self._find_anchor(content, fragment)
+            if start is None:
+                print(f"⚠️ EPUB anchor not found, using whole document: #{fragment}")
+                start = 0
+        end = self._find_anchor(content, end_fragment, start + 1) if end_fragment else None
+        return content[start:end] if end is not None else content[start:]
+    
+    def extract_chapter_content(self, epub_path: str, chapter_info: Dict[str, Any], as_html: bool = False) -> Optional[str]:
+        """
+        Trích xuất nội dung của một chapter từ EPUB
+        
+        Args:
+            as_html: True để trả về HTML đã sanitize thay vì text thuần
+        """
         try:
             with zipfile.ZipFile(epub_path, 'r') as epub:
                 # Đọc file content
-                content_file = chapter_info['href']
+                content_file = chapter_info.get('path') or chapter_info['href']
                 content = epub.read(content_file).decode('utf-8')
                 
+                # Nhiều chapter trong cùng file: chỉ lấy phần giữa các anchor
+                if chapter_info.get('fragment') or chapter_info.get('end_fragment'):
+                    content = self._slice_fragment(content, chapter_info.get('fragment'),
+                                                   chapter_info.get('end_fragment'))
+                
                 # Parse HTML và trích xuất text content
-                content = self._extract_text_from_html(content)
+                if as_html:
+                    content = self._sanitize_html(content)
+                else:
+                    content = self._extract_text_from_html(content)
                 
                 return content
                 
@@ -151,55 +303,24 @@ class EpubService:
     
     def _extract_text_from_html(self, html_content: str) -> str:
         """Trích xuất text từ HTML content"""
-        # Loại bỏ HTML tags nhưng giữ lại cấu trúc
-        # Đơn giản hóa - có thể cần cải thiện
-        import re
-        
-        # Loại bỏ script và style tags
-        html_content = re.sub(r'<script[^>]*>.*?</script>', '', html_content, flags=re.DOTALL)
-        html_content = re.sub(r'<style[^>]*>.*?</style>', '', html_content, flags=re.DOTALL)
-        
-        # Thay thế các HTML tags phổ biến
-        html_content = re.sub(r'<br\s*/?>', '\n', html_content)
-        html_content = re.sub(r'<p[^>]*>', '\n', html_content)
-        html_content = re.sub(r'</p>', '\n', html_content)
-        html_content = re.sub(r'<div[^>]*>', '\n', html_content)
-        html_content = re.sub(r'</div>', '\n', html_content)
-        
-        # Loại bỏ tất cả HTML tags còn lại
-        html_content = re.sub(r'<[^>]+>', '', html_content)
-        
-        # Xử lý HTML entities
-        html_content = html_content.replace('&nbsp;', ' ')
-        html_content = html_content.replace('&amp;', '&')
-        html_content = html_content.replace('&lt;', '<')
-        html_content = html_content.replace('&gt;', '>')
-        html_content = html_content.replace('&quot;', '"')
-        
-        # Loại bỏ khoảng trắng thừa
-        lines = html_content.split('\n')
-        cleaned_lines = []
-        for line in lines:
-            line = line.strip()
-            if line:
-                cleaned_lines.append(line)
-        
-        return '\n\n'.join(cleaned_lines)
+        return html_text_service.to_text(html_content)
+    
+    def _sanitize_html(self, html_content: str) -> str:
+        """Trích xuất HTML đã sanitize (chỉ giữ đoạn văn và các tag inline an toàn)"""
+        return html_text_service.to_html(html_content)
     
     def save_chapter_to_storage(self, novel_title: str, chapter_number: int, content: str) -> str:
         """Lưu chapter content vào storage folder"""
         try:
-            # Tạo directory cho novel
-            novel_dir = os.path.join(self.storage_path, novel_title)
-            os.makedirs(novel_dir, exist_ok=True)
-            
             # Tạo filename cho chapter
             filename = f"{chapter_number}.html"
-            file_path = os.path.join(novel_dir, filename)
             
-            # Lưu content dưới dạng HTML
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            # Lưu content (file riêng hoặc packed store tùy backend)
+            if not self.content_service.save_chapter_file(novel_title, filename, content):
+                return None
+            
+            # Render sẵn các variants để request đọc chapter không phải convert
+            self.content_service.render_variants(novel_title, filename, content)
             
             return filename
             
@@ -243,6 +364,8 @@ class EpubService:
             
             return {
                 'title': epub_info['title'],
+                # Thư mục staging (theo title), được đổi sang storage key sau khi tạo novel
+                'storage_dir': novel_title,
                 'creator': epub_info['creator'],
                 'language': epub_info['language'],
                 'identifier': epub_info['identifier'],
@@ -1,47 +1,76 @@
+import gzip
 import markdown
 import os
+import posixpath
+import threading
+import time
 from typing import Optional
 from app.core.config import settings
+from app.services.packed_store_service import PackedChapterStore, packed_store_service
+from app.services.content_store_service import content_store_service
+
+
+# Thư mục (trong thư mục novel) chứa các bản render sẵn của chapter
+RENDERED_DIR = '.rendered'
+CONTENT_FORMATS = ('markdown', 'html')
+
+# markdown.Markdown giữ state giữa các lần convert và không thread-safe,
+# nên mỗi thread dùng một instance riêng và reset() trước mỗi lần convert
+_markdown_local = threading.local()
+
+
+def _get_markdown() -> markdown.Markdown:
+    md = getattr(_markdown_local, 'md', None)
+    if md is None:
+        md = markdown.Markdown(extensions=['extra', 'codehilite'])
+        _markdown_local.md = md
+    return md
 
 
 class ContentService:
     def __init__(self):
         self.storage_path = settings.storage_path
-        self.md = markdown.Markdown(extensions=['extra', 'codehilite'])
+    
+    def _packed_store(self, novel_title: str, create: bool = False) -> Optional[PackedChapterStore]:
+        """Packed store của novel (None nếu backend là files hoặc novel chưa được pack)"""
+        if settings.storage_backend != "packed" or not novel_title:
+            return None
+        return packed_store_service.get_store(
+            os.path.join(self.storage_path, novel_title),
+            create=create,
+            compress=settings.packed_store_compression
+        )
     
     def read_content_file(self, file_path: str, novel_title: str = None) -> Optional[str]:
-        """Đọc nội dung từ file (HTML hoặc markdown)"""
+        """
+        Đọc nội dung từ file (HTML hoặc markdown)
+        
+        Args:
+            file_path: Tên file trong thư mục novel, hoặc đường dẫn relative
+                với storage nếu không có novel_title (vd: "{novel_title}/1.html")
+            novel_title: Tên thư mục novel
+        """
         try:
-            if not os.path.exists(self.storage_path):
-                print(f"Storage path not found: {self.storage_path}")
-                return None
-            
-            # Nếu có novel_title, tìm trong directory cụ thể
             if novel_title:
-                novel_path = os.path.join(self.storage_path, novel_title)
-                full_path = os.path.join(novel_path, file_path)
-                if os.path.exists(full_path):
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    return content
-                else:
-                    print(f"File not found: {full_path}")
-                    return None
+                # Backend packed: một pread trong file data của novel
+                store = self._packed_store(novel_title)
+                if store is not None:
+                    data = store.read(file_path)
+                    if data is not None:
+                        return data.decode('utf-8')
+                
+                full_path = os.path.join(self.storage_path, novel_title, file_path)
+            else:
+                # Tên file {n}.html trùng nhau giữa các novel nên không dò qua các thư mục:
+                # caller resolve thư mục qua chapter index (ChapterIndexService)
+                full_path = os.path.join(self.storage_path, file_path)
             
-            # Nếu không có novel_title, tìm trong tất cả directories
-            novels_path = self.storage_path  # storage_path đã là ./storage
-            if os.path.exists(novels_path):
-                for novel_dir in os.listdir(novels_path):
-                    novel_path = os.path.join(novels_path, novel_dir)
-                    if os.path.isdir(novel_path):
-                        full_path = os.path.join(novel_path, file_path)
-                        if os.path.exists(full_path):
-                            with open(full_path, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                            return content
-            
-            print(f"File not found: {file_path}")
-            return None
+            try:
+                with open(full_path, 'r', encoding='utf-8') as f:
+                    return f.read()
+            except FileNotFoundError:
+                print(f"File not found: {full_path}")
+                return None
         except Exception as e:
             print(f"Error reading content file: {e}")
             return None
@@ -52,7 +81,279 @@ class ContentService:
     
     def convert_to_html(self, markdown_content: str) -> str:
         """Chuyển đổi markdown thành HTML"""
-        return self.md.convert(markdown_content)
+        return _get_markdown().reset().convert(markdown_content)
+    
+    def render_content(self, content: str, format: str) -> str:
+        """Render nội dung gốc theo format (markdown: giữ nguyên, html: convert nếu là markdown)"""
+        if format == "html" and not content.startswith('<'):
+            return self.convert_to_html(content)
+        return content
+    
+    def get_variant_name(self, content_file: str, format: str, compressed: bool = False) -> str:
+        """
+        Tên bản render sẵn, relative với thư mục novel: .rendered/{tên file}.{format}[.gz]
+
+        Dùng cả tên file gốc (kể cả phần mở rộng) để `1.md` và `1.html` trong
+        cùng novel không dùng chung variants (.rendered/1.md.html, .rendered/1.html.html)
+        """
+        filename = f"{content_file}.{format}.gz" if compressed else f"{content_file}.{format}"
+        return posixpath.join(RENDERED_DIR, filename)
+    
+    def get_variant_path(self, novel_title: str, content_file: str, format: str, compressed: bool = False) -> str:
+        """Đường dẫn bản render sẵn: {novel}/.rendered/{tên file}.{format}[.gz]"""
+        return os.path.join(self.storage_path, novel_title, self.get_variant_name(content_file, format, compressed))
+    
+    def _variant_names(self, content_file: str):
+        for format in CONTENT_FORMATS:
+            for compressed in (False, True):
+                yield self.get_variant_name(content_file, format, compressed)
+    
+    def _legacy_variant_names(self, content_file: str):
+        """Tên variants kiểu cũ (theo stem, không có phần mở rộng của file gốc)"""
+        stem = os.path.splitext(content_file)[0]
+        for format in CONTENT_FORMATS:
+            for suffix in ('', '.gz'):
+                yield posixpath.join(RENDERED_DIR, f"{stem}.{format}{suffix}")
+    
+    def render_variants(self, novel_title: str, content_file: str, content: str = None) -> bool:
+        """
+        Render và lưu tất cả variants (markdown, html và bản gzip) cạnh file gốc
+        
+        Gọi lúc ingest (EPUB upload, sync, tạo/cập nhật chapter) để request đọc
+        chapter không phải convert lại.
+        """
+        try:
+            if content is None:
+                content = self.read_content_file(content_file, novel_title)
+                if content is None:
+                    return False
+            
+            store = self._packed_store(novel_title, create=True)
+            if store is not None:
+                # Variants mang mtime của bản gốc để ensure_variants phát hiện bản cũ
+                source_entry = store.get_entry(content_file)
+                source_mtime = source_entry.mtime if source_entry else time.time()
+            elif settings.content_dedup:
+                return self._render_variants_by_hash(novel_title, content_file, content)
+            
+            for format in CONTENT_FORMATS:
+                data = self.render_content(content, format).encode('utf-8')
+                # mtime=0 để file gzip giống hệt nhau giữa các lần render
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                
+                if store is not None:
+                    store.write(self.get_variant_name(content_file, format), data, mtime=source_mtime)
+                    store.write(self.get_variant_name(content_file, format, True), compressed,
+                                mtime=source_mtime, compress=False)
+                else:
+                    self._write_atomic(self.get_variant_path(novel_title, content_file, format), data)
+                    self._write_atomic(self.get_variant_path(novel_title, content_file, format, True), compressed)
+            return True
+        except Exception as e:
+            print(f"Error rendering content variants: {e}")
+            return False
+    
+    def _render_variants_by_hash(self, novel_title: str, content_file: str, content: str) -> bool:
+        """Render variants một lần cho mỗi nội dung (theo hash), link vào .rendered/ của novel"""
+        # Hash bytes của file (như get_content_hash), không phải text đã decode
+        try:
+            digest = content_store_service.hash_file(os.path.join(self.storage_path, novel_title, content_file))
+        except OSError:
+            digest = content_store_service.hash_bytes(content.encode('utf-8'))
+        variants = [(format, compressed) for format in CONTENT_FORMATS for compressed in (False, True)]
+        
+        if not content_store_service.has_rendered(digest, variants):
+            for format in CONTENT_FORMATS:
+                data = self.render_content(content, format).encode('utf-8')
+                content_store_service.store_rendered(digest, format, False, data)
+                content_store_service.store_rendered(digest, format, True,
+                                                     gzip.compress(data, compresslevel=9, mtime=0))
+        
+        for format, compressed in variants:
+            variant_path = self.get_variant_path(novel_title, content_file, format, compressed)
+            content_store_service.link_rendered(digest, format, compressed, variant_path)
+            # Bản render có thể cũ hơn file gốc vừa ghi: cập nhật mtime để ensure_variants không render lại
+            os.utime(variant_path)
+        return True
+    
+    def get_content_hash(self, novel_title: str, content_file: str) -> Optional[str]:
+        """Hash nội dung chapter trong object store (None nếu không dùng dedup)"""
+        if not settings.content_dedup or self._packed_store(novel_title) is not None:
+            return None
+        try:
+            return content_store_service.hash_file(os.path.join(self.storage_path, novel_title, content_file))
+        except OSError:
+            return None
+    
+    def get_source_version(self, novel_title: str, content_file: str) -> Optional[str]:
+        """Phiên bản nội dung gốc (mtime + size) để biết file đã đổi chưa, None nếu không có file"""
+        store = self._packed_store(novel_title)
+        if store is not None:
+            entry = store.get_entry(content_file)
+            if entry is not None:
+                return f"{entry.mtime}:{entry.raw_length}"
+        try:
+            stat = os.stat(os.path.join(self.storage_path, novel_title, content_file))
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+    
+    def ensure_variants(self, novel_title: str, content_file: str) -> bool:
+        """Render variants nếu chưa có hoặc cũ hơn file gốc"""
+        source_path = os.path.join(self.storage_path, novel_title, content_file)
+        try:
+            source_mtime = os.stat(source_path).st_mtime
+        except OSError:
+            source_mtime = None
+        
+        store = self._packed_store(novel_title, create=True)
+        if store is not None:
+            return self._ensure_packed(store, novel_title, content_file, source_path, source_mtime)
+        
+        if source_mtime is None:
+            return False
+        
+        for variant_name in self._variant_names(content_file):
+            try:
+                variant_mtime = os.stat(os.path.join(self.storage_path, novel_title, variant_name)).st_mtime
+            except OSError:
+                return self.render_variants(novel_title, content_file)
+            if variant_mtime < source_mtime:
+                return self.render_variants(novel_title, content_file)
+        return True
+    
+    def _ensure_packed(self, store: PackedChapterStore, novel_title: str, content_file: str,
+                       source_path: str, source_mtime: Optional[float]) -> bool:
+        """ensure_variants cho backend packed: pack file gốc mới hơn rồi render variants còn thiếu"""
+        entry = store.get_entry(content_file)
+        if source_mtime is not None and (entry is None or entry.mtime < source_mtime):
+            with open(source_path, 'rb') as f:
+                store.write(content_file, f.read(), mtime=source_mtime)
+            entry = store.get_entry(content_file)
+        
+        if entry is None:
+            return False
+        
+        for variant_name in self._variant_names(content_file):
+            variant = store.get_entry(variant_name)
+            if variant is None or variant.mtime < entry.mtime:
+                return self.render_variants(novel_title, content_file)
+        return True
+    
+    def read_variant(self, novel_title: str, content_file: str, format: str) -> Optional[str]:
+        """Đọc bản render sẵn (None nếu chưa được render)"""
+        store = self._packed_store(novel_title)
+        if store is not None:
+            data = store.read(self.get_variant_name(content_file, format))
+            if data is not None:
+                return data.decode('utf-8')
+        
+        try:
+            with open(self.get_variant_path(novel_title, content_file, format), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def locate_variant(self, novel_title: str, content_file: str, format: str,
+                       compressed: bool = False) -> Optional[dict]:
+        """
+        Tìm bản render sẵn để trả thẳng cho client (không decode/encode)
+
+        Returns:
+            {'path': đường dẫn file} với backend files,
+            {'data': bytes, 'mtime': float} với backend packed,
+            None nếu chưa được render
+        """
+        variant_name = self.get_variant_name(content_file, format, compressed)
+        store = self._packed_store(novel_title)
+        if store is not None:
+            entry = store.get_entry(variant_name)
+            if entry is not None:
+                return {'data': store.read(variant_name), 'mtime': entry.mtime}
+
+        path = os.path.join(self.storage_path, novel_title, variant_name)
+        if os.path.isfile(path):
+            return {'path': path}
+        return None
+
+    def delete_variants(self, novel_title: str, content_file: str) -> None:
+        """Xóa tất cả bản render sẵn của một file content"""
+        store = self._packed_store(novel_title)
+        # Xóa luôn bản tên kiểu cũ (có thể đã bị file cùng stem ghi đè, đằng nào cũng không còn dùng)
+        for variant_name in [*self._variant_names(content_file), *self._legacy_variant_names(content_file)]:
+            if store is not None:
+                store.delete(variant_name)
+            try:
+                os.remove(os.path.join(self.storage_path, novel_title, variant_name))
+            except OSError:
+                pass
+    
+    def save_chapter_file(self, novel_title: str, content_file: str, content: str) -> bool:
+        """Lưu nội dung gốc của chapter (file riêng hoặc packed store tùy backend)"""
+        try:
+            store = self._packed_store(novel_title, create=True)
+            if store is not None:
+                store.write(content_file, content.encode('utf-8'), mtime=time.time())
+                return True
+            
+            file_path = os.path.join(self.storage_path, novel_title, content_file)
+            if settings.content_dedup:
+                # Nội dung trùng với chapter khác chỉ tạo thêm một hard link
+                content_store_service.store_file(file_path, content.encode('utf-8'))
+                return True
+            
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            return True
+        except Exception as e:
+            print(f"Error saving chapter file: {e}")
+            return False
+    
+    def delete_chapter_file(self, novel_title: str, content_file: str) -> bool:
+        """Xóa nội dung gốc và các bản render sẵn của chapter"""
+        deleted = False
+        store = self._packed_store(novel_title)
+        if store is not None:
+            deleted = store.delete(content_file)
+        
+        file_path = os.path.join(self.storage_path, novel_title, content_file)
+        try:
+            os.remove(file_path)
+            deleted = True
+        except OSError:
+            pass
+        
+        self.delete_variants(novel_title, content_file)
+        return deleted
+    
+    def rename_chapter_file(self, novel_title: str, old_content_file: str, new_content_file: str) -> bool:
+        """Đổi tên nội dung gốc của chapter, variants sẽ được render lại theo tên mới"""
+        renamed = False
+        store = self._packed_store(novel_title)
+        if store is not None:
+            entry = store.get_entry(old_content_file)
+            data = store.read(old_content_file)
+            if data is not None:
+                store.write(new_content_file, data, mtime=entry.mtime)
+                store.delete(old_content_file)
+                renamed = True
+        
+        old_path = os.path.join(self.storage_path, novel_title, old_content_file)
+        if os.path.exists(old_path):
+            os.rename(old_path, os.path.join(self.storage_path, novel_title, new_content_file))
+            renamed = True
+        
+        self.delete_variants(novel_title, old_content_file)
+        return renamed
+    
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        """Ghi file qua file tạm + rename để reader không bao giờ thấy file ghi dở"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
     
     def get_word_count(self, content: str) -> int:
         """Đếm số từ trong nội dung"""
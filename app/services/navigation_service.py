@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+
+
+# Số novel giữ navigation index trong memory (LRU)
+MAX_NOVELS = 1000
+# Thư mục (ở gốc storage) chứa stamp file của từng novel, mtime đổi mỗi lần invalidate
+STAMPS_DIR = '.navigation'
+
+
+class NovelNavigation:
+    """
+    Navigation index của một novel: các mảng song song sắp xếp theo chapter_number
+
+    Tra prev/next của một chapter bằng bisect trên `numbers`, không cần query database.
+    """
+
+    __slots__ = ('numbers', 'ids', 'titles', 'stamp', 'loaded_at')
+
+    def __init__(self, rows: List[Dict], stamp: Optional[int] = None):
+        # Stamp của novel lúc load và thời điểm load, để biết index đã cũ chưa
+        self.stamp = stamp
+        self.loaded_at = time.monotonic()
+        rows = sorted(rows, key=lambda row: (row.get('chapter_number') or 0, row['id']))
+        self.numbers = [row.get('chapter_number') or 0 for row in rows]
+        self.ids = [row['id'] for row in rows]
+        self.titles = [row.get('title') or '' for row in rows]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def neighbors(self, chapter_number: int) -> Tuple[Optional[int], Optional[int]]:
+        """(prev_id, next_id) của chapter có chapter_number cho trước"""
+        left = bisect_left(self.numbers, chapter_number)
+        right = bisect_right(self.numbers, chapter_number)
+        prev_id = self.ids[left - 1] if left > 0 else None
+        next_id = self.ids[right] if right < len(self.ids) else None
+        return prev_id, next_id
+
+    def next_ids(self, chapter_number: int, limit: int) -> List[int]:
+        """ID của tối đa `limit` chapters đứng sau chapter_number"""
+        start = bisect_right(self.numbers, chapter_number)
+        return self.ids[start:start + limit]
+
+    def items(self, start: int = 0, end: Optional[int] = None) -> List[Dict]:
+        end = len(self.ids) if end is None else end
+        return [
+            {'id': self.ids[i], 'chapter_number': self.numbers[i], 'title': self.titles[i]}
+            for i in range(start, end)
+        ]
+
+    def range(self, from_number: float, to_number: float) -> List[Dict]:
+        """Các chapters có from_number <= chapter_number <= to_number"""
+        return self.items(bisect_left(self.numbers, from_number), bisect_right(self.numbers, to_number))
+
+
+class NavigationService:
+    """
+    Navigation index theo novel (prev/next chapter, mục lục)
+
+    Index của một novel được load lazily bằng một query (chỉ id, chapter_number,
+    title) ở lần đầu cần tới, sau đó mọi lần đọc chapter tra prev/next trong
+    memory. Index bị bỏ khi chapter của novel thay đổi (create/update/delete,
+    sync) và được load lại ở lần đọc tiếp theo.
+
+    Mỗi worker process giữ index riêng, nên invalidate còn ghi stamp file
+    `{storage}/.navigation/{novel_id}`: mỗi lần tra cứu so mtime của stamp với
+    lúc load, khác thì load lại. Index cũ hơn NAVIGATION_TTL_SECONDS cũng được
+    load lại (thay đổi database không đi qua service, vd sửa tay).
+    """
+
+    def __init__(self):
+        self.stamps_path = os.path.join(settings.storage_path, STAMPS_DIR)
+        self._supabase_service = None
+        self._novels: "OrderedDict[int, NovelNavigation]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Lock theo novel để nhiều request cùng lúc chỉ load index một lần
+        self._load_locks: Dict[int, threading.Lock] = {}
+        # Tăng mỗi lần invalidate, index load trong lúc đó không được lưu lại
+        self._generations: Dict[int, int] = {}
+
+    def _get_supabase_service(self):
+        if self._supabase_service is None:
+            from app.services.supabase_service import SupabaseService
+            self._supabase_service = SupabaseService()
+        return self._supabase_service
+
+    def _stamp_path(self, novel_id: int) -> str:
+        return os.path.join(self.stamps_path, str(novel_id))
+
+    def _read_stamp(self, novel_id: int) -> Optional[int]:
+        try:
+            return os.stat(self._stamp_path(novel_id)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _is_fresh(self, navigation: NovelNavigation, stamp: Optional[int]) -> bool:
+        if navigation.stamp != stamp:
+            return False
+        ttl = settings.navigation_ttl_seconds
+        return ttl <= 0 or time.monotonic() - navigation.loaded_at < ttl
+
+    def get_navigation(self, novel_id: int) -> Optional[NovelNavigation]:
+        """Navigation index của novel, load từ database nếu chưa có hoặc đã cũ"""
+        stamp = self._read_stamp(novel_id)
+        with self._lock:
+            navigation = self._novels.get(novel_id)
+            if navigation is not None and self._is_fresh(navigation, stamp):
+                self._novels.move_to_end(novel_id)
+                return navigation
+            load_lock = self._load_locks.setdefault(novel_id, threading.Lock())
+            generation = self._generations.get(novel_id, 0)
+
+        with load_lock:
+            with self._lock:
+                navigation = self._novels.get(novel_id)
+            if navigation is not None and self._is_fresh(navigation, stamp):
+                return navigation
+
+            try:
+                rows = self._get_supabase_service().get_chapter_toc(novel_id)
+            except Exception as e:
+                print(f"Error loading navigation index for novel {novel_id}: {e}")
+                return None
+
+            navigation = NovelNavigation(rows, stamp)
+            with self._lock:
+                if self._generations.get(novel_id, 0) != generation:
+                    return navigation
+                self._novels[novel_id] = navigation
+                self._novels.move_to_end(novel_id)
+                while len(self._novels) > MAX_NOVELS:
+                    self._novels.popitem(last=False)
+                self._load_locks.pop(novel_id, None)
+            return navigation
+
+    def get_neighbors(self, novel_id: int, chapter_number: int) -> Tuple[Optional[int], Optional[int]]:
+        """(prev_id, next_id) của chapter trong novel"""
+        navigation = self.get_navigation(novel_id)
+        if navigation is None:
+            return None, None
+        return navigation.neighbors(chapter_number)
+
+    def get_next_ids(self, novel_id: int, chapter_number: int, limit: int) -> List[int]:
+        navigation = self.get_navigation(novel_id)
+        if navigation is None:
+            return []
+        return navigation.next_ids(chapter_number, limit)
+
+    def get_toc(self, novel_id: int) -> Optional[List[Dict]]:
+        """Mục lục của novel (id, chapter_number, title theo thứ tự chapter)"""
+        navigation = self.get_navigation(novel_id)
+        if navigation is None:
+            return None
+        return navigation.items()
+
+    def get_range(self, novel_id: int, from_number: float, to_number: float) -> Optional[List[Dict]]:
+        """Các chapters trong khoảng chapter_number [from_number, to_number]"""
+        navigation = self.get_navigation(novel_id)
+        if navigation is None:
+            return None
+        return navigation.range(from_number, to_number)
+
+    def invalidate(self, novel_id: int) -> None:
+        """Bỏ navigation index của novel (gọi khi chapters của novel thay đổi) ở mọi process"""
+        with self._lock:
+            self._novels.pop(novel_id, None)
+            self._generations[novel_id] = self._generations.get(novel_id, 0) + 1
+        try:
+            os.makedirs(self.stamps_path, exist_ok=True)
+            path = self._stamp_path(novel_id)
+            with open(path, 'a'):
+                pass
+            # mtime mới (ns) báo cho process khác biết index của novel đã cũ
+            os.utime(path, ns=(time.time_ns(), time.time_ns()))
+        except OSError as e:
+            print(f"⚠️ Error writing navigation stamp for novel {novel_id}: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._novels.clear()
+
+
+# Global instance
+navigation_service = NavigationService()
@@ -1,6 +1,12 @@
 from typing import List, Optional, Dict, Any
 from app.services.supabase_service import SupabaseService
 from app.services.cache_service import cache_service
+from app.services.catalog_service import DEFAULT_SORT, SORT_FIELDS, catalog_service
+from app.services.packed_store_service import packed_store_service
+from app.services.chapter_index_service import chapter_index_service
+from app.services.navigation_service import navigation_service
+from app.services.search_service import search_service
+from app.services.storage_key_service import storage_key_service
 from supabase import create_client
 from app.core.config import settings
 import os
@@ -34,7 +40,8 @@ class NovelService:
         
         return novel
     
-    def get_novels(self, page: int = 1, limit: int = 20, status: str = None, author: str = None) -> Dict[str, Any]:
+    def get_novels(self, page: int = 1, limit: int = 20, status: str = None, author: str = None,
+                   sort: str = DEFAULT_SORT, snapshot: int = None) -> Dict[str, Any]:
         """
         Lấy danh sách novels với pagination và filtering
         
@@ -43,24 +50,47 @@ class NovelService:
             limit: Số bản ghi trả về
             status: Lọc theo trạng thái (ongoing, completed)
             author: Lọc theo tác giả
+            sort: Sắp xếp giảm dần theo created, updated, views hoặc rating
+            snapshot: Version catalog snapshot của trang trước (phân trang ổn định)
         """
+        if settings.catalog_backend == "snapshot":
+            # Catalog trong memory, fallback về database nếu không load được snapshot
+            result = catalog_service.list_novels(page, limit, status, author, sort, snapshot)
+            if result is not None:
+                return result
+        
         # Tạo cache key dựa trên parameters
-        cache_key = f"novels:page:{page}:limit:{limit}:status:{status}:author:{author}"
+        if sort == DEFAULT_SORT:
+            cache_key = f"novels:page:{page}:limit:{limit}:status:{status}:author:{author}"
+        else:
+            cache_key = f"novels:page:{page}:limit:{limit}:status:{status}:author:{author}:sort:{sort}"
         cached_result = cache_service.get(cache_key)
         
         if cached_result:
             return cached_result
         
         # Nếu không có trong cache, lấy từ database
-        result = self.supabase_service.get_novels_with_pagination(page, limit, status=status, author=author)
+        result = self.supabase_service.get_novels_with_pagination(
+            page, limit, status=status, author=author, order_by=SORT_FIELDS[sort]
+        )
         
         # Cache trong 15 phút cho danh sách
         cache_service.set(cache_key, result, ttl=900)
         
         return result
     
+    def get_facets(self, status: str = None, author: str = None, snapshot: int = None) -> Optional[Dict[str, Any]]:
+        """Số novels theo status và tác giả (từ catalog snapshot, None nếu không load được)"""
+        return catalog_service.get_facets(status, author, snapshot)
+    
     def search_novels(self, query: str, page: int = 1, limit: int = 20) -> Dict[str, Any]:
-        """Tìm kiếm novels theo title hoặc author với pagination"""
+        """Tìm kiếm novels theo title, author, description với pagination (xếp theo độ liên quan)"""
+        if settings.search_backend == "index":
+            # Index in-process: không cần cache, fallback về database nếu không load được index
+            result = search_service.search(query, page, limit)
+            if result is not None:
+                return result
+        
         # Tạo cache key cho search
         cache_key = f"novels:search:{query}:page:{page}:limit:{limit}"
         cached_result = cache_service.get(cache_key)
@@ -92,6 +122,9 @@ class NovelService:
             novel = response.data[0] if response.data else None
             
             if novel:
+                search_service.upsert(novel)
+                catalog_service.invalidate()
+                
                 # Clear cache khi tạo novel mới
                 self._clear_novels_list_cache()
                 print("✅ Cleared novels cache after creating novel")
@@ -119,10 +152,14 @@ class NovelService:
             updated_novel = response.data[0] if response.data else None
             
             if updated_novel and old_title and new_title and old_title != new_title:
-                # Đổi tên thư mục storage nếu title thay đổi
-                self._rename_novel_storage(old_title, new_title)
+                # Storage theo novel ID nên đổi title không cần đổi thư mục,
+                # chỉ chuyển thư mục cũ (đặt theo title) sang storage key nếu chưa migrate
+                self._migrate_novel_storage(novel_id, old_title)
             
             if updated_novel:
+                search_service.upsert(updated_novel)
+                catalog_service.invalidate()
+                
                 # Clear cache khi update novel
                 self._clear_novels_list_cache()
                 print("✅ Cleared novels cache after updating novel")
@@ -147,7 +184,11 @@ class NovelService:
             
             if success:
                 # Xóa thư mục storage của novel
-                self._delete_novel_storage(novel['title'])
+                self._delete_novel_storage(novel_id, novel['title'])
+                chapter_index_service.remove_novel(novel_id)
+                navigation_service.invalidate(novel_id)
+                search_service.remove(novel_id)
+                catalog_service.invalidate()
                 
                 # Xóa cache
                 self._invalidate_novel_cache(novel_id)
@@ -252,40 +293,38 @@ class NovelService:
         except Exception as e:
             print(f"Error clearing novels cache: {e}")
     
-    def _delete_novel_storage(self, novel_title: str) -> None:
+    def _delete_novel_storage(self, novel_id: int, novel_title: str = None) -> None:
         """Xóa thư mục storage của novel"""
         try:
-            # Tạo đường dẫn đến thư mục novel
-            novel_dir = os.path.join(settings.storage_path, novel_title)
+            # Thư mục theo storage key (hoặc theo title nếu chưa migrate)
+            dir_name = storage_key_service.resolve_dir_name(novel_id, novel_title)
+            if not dir_name:
+                print(f"Thư mục storage không tồn tại cho novel {novel_id}")
+                return
             
-            if os.path.exists(novel_dir):
-                # Xóa toàn bộ thư mục và nội dung
-                shutil.rmtree(novel_dir)
-                print(f"Đã xóa thư mục storage: {novel_dir}")
-            else:
-                print(f"Thư mục storage không tồn tại: {novel_dir}")
+            novel_dir = os.path.join(settings.storage_path, dir_name)
+            
+            # Đóng packed store (nếu có) trước khi xóa
+            packed_store_service.forget(novel_dir)
+            
+            # Xóa toàn bộ thư mục và nội dung
+            shutil.rmtree(novel_dir)
+            print(f"Đã xóa thư mục storage: {novel_dir}")
         except Exception as e:
             print(f"Error deleting novel storage: {e}")
     
-    def _rename_novel_storage(self, old_title: str, new_title: str) -> None:
-        """Đổi tên thư mục storage của novel"""
+    def _migrate_novel_storage(self, novel_id: int, old_title: str) -> None:
+        """Chuyển thư mục storage đặt theo title sang storage key (novel ID)"""
         try:
-            old_dir = os.path.join(settings.storage_path, old_title)
-            new_dir = os.path.join(settings.storage_path, new_title)
-            
-            if os.path.exists(old_dir):
-                # Đổi tên thư mục
-                os.rename(old_dir, new_dir)
-                print(f"Đã đổi tên thư mục storage: {old_dir} -> {new_dir}")
-            else:
-                print(f"Thư mục storage không tồn tại: {old_dir}")
+            if storage_key_service.existing_key(novel_id) is None:
+                storage_key_service.adopt_directory(old_title, novel_id)
         except Exception as e:
-            print(f"Error renaming novel storage: {e}")
+            print(f"Error migrating novel storage: {e}")
     
-    def _create_novel_storage(self, novel_title: str) -> None:
+    def _create_novel_storage(self, novel_id: int) -> None:
         """Tạo thư mục storage cho novel"""
         try:
-            novel_dir = os.path.join(settings.storage_path, novel_title)
+            novel_dir = storage_key_service.get_novel_dir(novel_id)
             
             if not os.path.exists(novel_dir):
                 os.makedirs(novel_dir)
@@ -293,4 +332,4 @@ class NovelService:
             else:
                 print(f"Thư mục storage đã tồn tại: {novel_dir}")
         except Exception as e:
-            print(f"Error creating novel storage: {e}") 
\ No newline at end of file
+            print(f"Error creating novel storage: {e}")
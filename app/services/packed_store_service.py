@@ -0,0 +1,310 @@
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa giữa các thread trong process
+    fcntl = None
+
+
+# File data (append-only) và file index của một novel
+PACK_FILENAME = 'chapters.pack'
+INDEX_FILENAME = 'chapters.idx'
+# File lock (flock) dùng chung cho mọi process ghi/compact store
+LOCK_FILENAME = 'chapters.lock'
+
+INDEX_MAGIC = b'RPIX'
+INDEX_VERSION = 1
+
+# Record trong index: name_len, flags, offset, length, raw_length, mtime, sau đó là name (utf-8)
+_RECORD = struct.Struct('<HBQIId')
+
+FLAG_COMPRESSED = 0x01
+FLAG_DELETED = 0x02
+
+# Chỉ giữ bản nén nếu tiết kiệm được ít nhất 10%
+MIN_COMPRESSION_RATIO = 0.9
+
+
+class PackedEntry(NamedTuple):
+    offset: int
+    length: int
+    raw_length: int
+    flags: int
+    mtime: float
+
+
+class PackedChapterStore:
+    """
+    Store chapter của một novel: toàn bộ nội dung nằm trong một file data
+    append-only (`chapters.pack`), vị trí từng entry nằm trong file index
+    (`chapters.idx`) là log các record nhị phân có kích thước nhỏ.
+
+    Ghi đè một key = append data + record mới (record sau thắng record trước),
+    xóa = append record có FLAG_DELETED. Đọc dùng `os.pread` nên không cần seek.
+
+    Nhiều process (worker uvicorn, scripts/pack_storage.py) có thể dùng chung
+    store: append và compact giữ flock exclusive trên `chapters.lock`, load
+    index giữ flock shared. Compact thay pack/index bằng file mới nên process
+    khác nhận ra qua inode của index, đọc lại index từ đầu và mở lại pack;
+    trong lúc đó fd cũ vẫn trỏ tới pack cũ, khớp với offset của index cũ.
+    """
+
+    def __init__(self, novel_dir: str, compress: bool = True):
+        self.novel_dir = novel_dir
+        self.pack_path = os.path.join(novel_dir, PACK_FILENAME)
+        self.index_path = os.path.join(novel_dir, INDEX_FILENAME)
+        self.lock_path = os.path.join(novel_dir, LOCK_FILENAME)
+        self.compress = compress
+        self.entries: Dict[str, PackedEntry] = {}
+        self._index_size = 0
+        self._index_ino: Optional[int] = None
+        # fd của pack tương ứng với index đã load (cùng một thế hệ compact)
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+        with self._lock, self._file_lock(exclusive=False):
+            self._load_index()
+
+    @staticmethod
+    def exists(novel_dir: str) -> bool:
+        return os.path.exists(os.path.join(novel_dir, INDEX_FILENAME))
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool = True):
+        """flock trên LOCK_FILENAME (exclusive khi ghi/compact, shared khi load index)"""
+        if fcntl is None:
+            yield
+            return
+        try:
+            if exclusive:
+                os.makedirs(self.novel_dir, exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            if exclusive:
+                raise
+            # Thư mục chỉ đọc: không ai ghi được nên không cần khóa
+            yield
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+
+    def _load_index(self) -> None:
+        """
+        Đọc (hoặc đọc tiếp phần mới append) file index
+
+        Gọi khi đang giữ self._lock và file lock, để index và pack mở ra là
+        cùng một thế hệ (không bị compact thay giữa chừng).
+        """
+        try:
+            with open(self.index_path, 'rb') as f:
+                ino = os.fstat(f.fileno()).st_ino
+                if ino != self._index_ino:
+                    # Index mới (lần đầu hoặc đã bị compact thay): đọc lại từ đầu, mở lại pack
+                    self.entries = {}
+                    self._index_size = 0
+                    self._index_ino = ino
+                    self._close_fd()
+                f.seek(self._index_size)
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        position = 0
+        if self._index_size == 0:
+            if data[:4] != INDEX_MAGIC:
+                raise ValueError(f"Invalid packed index: {self.index_path}")
+            position = 5
+
+        while position + _RECORD.size <= len(data):
+            name_len, flags, offset, length, raw_length, mtime = _RECORD.unpack_from(data, position)
+            name_end = position + _RECORD.size + name_len
+            if name_end > len(data):
+                # Record ghi dở (process khác đang append), đọc lại lần sau
+                break
+            name = data[position + _RECORD.size:name_end].decode('utf-8')
+            if flags & FLAG_DELETED:
+                self.entries.pop(name, None)
+            else:
+                self.entries[name] = PackedEntry(offset, length, raw_length, flags, mtime)
+            position = name_end
+
+        self._index_size += position
+        self._open_fd()
+
+    def _open_fd(self) -> None:
+        if self._fd is None and os.path.exists(self.pack_path):
+            self._fd = os.open(self.pack_path, os.O_RDONLY)
+
+    def _close_fd(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _refresh(self) -> None:
+        """Load thêm record nếu file index đã được process khác append hoặc compact"""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._index_ino or stat.st_size != self._index_size:
+            with self._lock, self._file_lock(exclusive=False):
+                self._load_index()
+
+    def get_entry(self, name: str) -> Optional[PackedEntry]:
+        entry = self.entries.get(name)
+        if entry is None:
+            self._refresh()
+            entry = self.entries.get(name)
+        return entry
+
+    def read_raw(self, name: str) -> Optional[Tuple[bytes, bool]]:
+        """Đọc bytes như được lưu trong pack, kèm cờ cho biết có bị nén (zlib) không"""
+        if self.get_entry(name) is None:
+            return None
+        # Lấy entry và fd cùng lúc dưới lock: compact/reload có thể đổi cả hai
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is None or self._fd is None:
+                return None
+            data = os.pread(self._fd, entry.length, entry.offset)
+        return data, bool(entry.flags & FLAG_COMPRESSED)
+
+    def read(self, name: str) -> Optional[bytes]:
+        """Đọc nội dung (đã giải nén) của một entry"""
+        result = self.read_raw(name)
+        if result is None:
+            return None
+        data, compressed = result
+        return zlib.decompress(data) if compressed else data
+
+    def write(self, name: str, data: bytes, mtime: float = 0.0, compress: Optional[bool] = None) -> None:
+        """Append một entry (ghi đè entry cùng tên nếu đã có)"""
+        compress = self.compress if compress is None else compress
+        flags = 0
+        stored = data
+        if compress and data:
+            compressed = zlib.compress(data, 6)
+            if len(compressed) < len(data) * MIN_COMPRESSION_RATIO:
+                stored = compressed
+                flags |= FLAG_COMPRESSED
+
+        with self._lock, self._file_lock():
+            # Đọc record process khác đã append (hoặc index mới sau compact) trước khi ghi
+            self._load_index()
+            fd = os.open(self.pack_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # Đang giữ file lock nên không ai append xen vào giữa fstat và write
+                offset = os.fstat(fd).st_size
+                written = 0
+                while written < len(stored):
+                    written += os.write(fd, stored[written:])
+            finally:
+                os.close(fd)
+            self._append_record(name, flags, offset, len(stored), len(data), mtime)
+            self.entries[name] = PackedEntry(offset, len(stored), len(data), flags, mtime)
+            self._open_fd()
+
+    def delete(self, name: str) -> bool:
+        """Đánh dấu xóa một entry (data được thu hồi khi compact)"""
+        with self._lock, self._file_lock():
+            self._load_index()
+            if name not in self.entries:
+                return False
+            self._append_record(name, FLAG_DELETED, 0, 0, 0, 0.0)
+            del self.entries[name]
+            return True
+
+    def _append_record(self, name: str, flags: int, offset: int, length: int, raw_length: int, mtime: float) -> None:
+        encoded = name.encode('utf-8')
+        with open(self.index_path, 'ab') as index:
+            if index.tell() == 0:
+                index.write(INDEX_MAGIC + bytes([INDEX_VERSION]))
+            index.write(_RECORD.pack(len(encoded), flags, offset, length, raw_length, mtime) + encoded)
+            self._index_size = index.tell()
+            if self._index_ino is None:
+                self._index_ino = os.fstat(index.fileno()).st_ino
+
+    def names(self) -> Iterator[str]:
+        return iter(list(self.entries.keys()))
+
+    def compact(self) -> int:
+        """
+        Viết lại pack chỉ với các entry còn sống (loại bỏ data bị ghi đè/xóa)
+
+        Returns:
+            Số bytes thu hồi được
+        """
+        with self._lock, self._file_lock():
+            self._load_index()
+            if self._fd is None:
+                return 0
+            old_size = os.fstat(self._fd).st_size
+            tmp_pack = f"{self.pack_path}.compact"
+            tmp_index = f"{self.index_path}.compact"
+            fd = self._fd
+            new_entries: Dict[str, PackedEntry] = {}
+
+            with open(tmp_pack, 'wb') as pack, open(tmp_index, 'wb') as index:
+                index.write(INDEX_MAGIC + bytes([INDEX_VERSION]))
+                for name in sorted(self.entries, key=lambda n: self.entries[n].offset):
+                    entry = self.entries[name]
+                    offset = pack.tell()
+                    pack.write(os.pread(fd, entry.length, entry.offset))
+                    encoded = name.encode('utf-8')
+                    index.write(_RECORD.pack(len(encoded), entry.flags, offset, entry.length, entry.raw_length, entry.mtime) + encoded)
+                    new_entries[name] = entry._replace(offset=offset)
+                index_size = index.tell()
+                index_ino = os.fstat(index.fileno()).st_ino
+
+            # Pack trước, index sau: process khác chỉ mở lại pack khi thấy index mới
+            os.replace(tmp_pack, self.pack_path)
+            os.replace(tmp_index, self.index_path)
+            self._close_fd()
+            self.entries = new_entries
+            self._index_size = index_size
+            self._index_ino = index_ino
+            self._open_fd()
+            return old_size - os.fstat(self._fd).st_size
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_fd()
+
+
+class PackedStoreService:
+    """Quản lý (và cache) các PackedChapterStore đang mở theo thư mục novel"""
+
+    def __init__(self):
+        self._stores: Dict[str, PackedChapterStore] = {}
+        self._lock = threading.Lock()
+
+    def get_store(self, novel_dir: str, create: bool = False, compress: bool = True) -> Optional[PackedChapterStore]:
+        store = self._stores.get(novel_dir)
+        if store is not None:
+            return store
+        if not create and not PackedChapterStore.exists(novel_dir):
+            return None
+        with self._lock:
+            store = self._stores.get(novel_dir)
+            if store is None:
+                store = PackedChapterStore(novel_dir, compress=compress)
+                self._stores[novel_dir] = store
+            return store
+
+    def forget(self, novel_dir: str) -> None:
+        """Đóng store (khi thư mục novel bị xóa hoặc đổi tên)"""
+        with self._lock:
+            store = self._stores.pop(novel_dir, None)
+        if store is not None:
+            store.close()
+
+
+# Global instance
+packed_store_service = PackedStoreService()
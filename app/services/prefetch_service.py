@@ -0,0 +1,219 @@
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.services.navigation_service import navigation_service
+
+
+# Cần ít nhất bấy nhiêu lần prefetch trước khi dùng hit rate để giảm độ sâu
+MIN_SAMPLES = 10
+# Giảm một nửa bộ đếm khi vượt ngưỡng để hit rate phản ánh hành vi gần đây
+DECAY_THRESHOLD = 200
+# Metadata của bấy nhiêu chapter tiếp theo được lấy trong một query khi thiếu cache
+METADATA_BATCH = 20
+
+
+class PrefetchService:
+    """
+    Prefetch các chapter tiếp theo sau khi một chapter được đọc
+
+    Sau khi chapter N được trả về, worker nền warm cache cho metadata và
+    content của các chapter N+1..N+K cùng novel. Tổng dung lượng content được
+    prefetch (chưa được đọc) bị giới hạn bởi memory budget, entry cũ nhất bị
+    xóa khỏi cache khi vượt budget. Độ sâu K của từng novel giảm xuống 1 khi
+    hit rate (tỷ lệ chapter prefetch được đọc thật) thấp; vẫn prefetch 1 chapter
+    để hit rate được đo tiếp và độ sâu tăng lại khi người đọc quay lại đọc tuần tự.
+
+    Chapter tiếp theo lấy từ navigation index (không query database mỗi lần
+    đọc); metadata chỉ được query cho các chapter chưa có trong cache, theo nhóm.
+    """
+
+    def __init__(self):
+        self.enabled = settings.prefetch_enabled
+        self.depth = settings.prefetch_depth
+        self.memory_budget = settings.prefetch_memory_budget_mb * 1024 * 1024
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._chapter_service = None
+        self._lock = threading.Lock()
+        # (chapter_id, format) → (novel_id, cache_key, size), theo thứ tự prefetch
+        self._prefetched: OrderedDict = OrderedDict()
+        self._prefetched_bytes = 0
+        self._in_flight: set = set()
+        # novel_id → [số chapter đã prefetch, số lần hit]
+        self._novel_stats: Dict[int, list] = {}
+        self._stats = {'scheduled': 0, 'prefetched': 0, 'hits': 0, 'evicted': 0, 'skipped_memory': 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=settings.prefetch_workers,
+                        thread_name_prefix="chapter-prefetch"
+                    )
+        return self._executor
+
+    def _get_chapter_service(self):
+        # Import muộn để tránh import vòng (ChapterService dùng cache/index services)
+        if self._chapter_service is None:
+            from app.services.chapter_service import ChapterService
+            self._chapter_service = ChapterService()
+        return self._chapter_service
+
+    def set_enabled(self, enabled: bool) -> None:
+        """Bật/tắt prefetch lúc runtime, tắt sẽ bỏ các entry đã prefetch khỏi cache"""
+        self.enabled = enabled
+        if not enabled:
+            self.release()
+
+    def release(self) -> int:
+        """Xóa toàn bộ content đã prefetch nhưng chưa được đọc khỏi cache"""
+        with self._lock:
+            released = len(self._prefetched)
+            for _, cache_key, _ in self._prefetched.values():
+                cache_service.delete(cache_key)
+            self._prefetched.clear()
+            self._prefetched_bytes = 0
+        return released
+
+    def _memory_pressure(self) -> bool:
+        """RSS của process vượt ngưỡng cấu hình (chỉ kiểm tra được trên Linux)"""
+        if settings.prefetch_max_rss_mb <= 0:
+            return False
+        try:
+            with open('/proc/self/statm') as f:
+                resident_pages = int(f.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            return False
+        import resource
+        return resident_pages * resource.getpagesize() > settings.prefetch_max_rss_mb * 1024 * 1024
+
+    def _depth_for(self, novel_id: int) -> int:
+        """Độ sâu prefetch của novel theo hit rate"""
+        prefetched, hits = self._novel_stats.get(novel_id, (0, 0))
+        if prefetched < MIN_SAMPLES:
+            return self.depth
+        if hits / prefetched >= 0.5:
+            return self.depth
+        # Không về 0: độ sâu 0 thì không còn mẫu mới, novel bị kẹt ở 0 mãi
+        return 1
+
+    def _record(self, novel_id: int, prefetched: int = 0, hits: int = 0) -> None:
+        stats = self._novel_stats.setdefault(novel_id, [0, 0])
+        stats[0] += prefetched
+        stats[1] += hits
+        if stats[0] > DECAY_THRESHOLD:
+            stats[0] //= 2
+            stats[1] //= 2
+
+    def on_chapter_served(self, chapter: dict, format: str = "markdown", warm_content: bool = True) -> None:
+        """
+        Gọi sau khi một chapter được trả về: ghi nhận hit nếu chapter đã được
+        prefetch, sau đó lên lịch prefetch các chapter tiếp theo
+        """
+        if not self.enabled:
+            return
+
+        chapter_id = chapter.get('id')
+        novel_id = chapter.get('novel_id')
+        with self._lock:
+            entry = self._prefetched.pop((chapter_id, format), None)
+            if entry is not None:
+                # Entry đã thành cache "thật", không còn tính vào budget prefetch
+                self._prefetched_bytes -= entry[2]
+                self._record(novel_id, hits=1)
+                self._stats['hits'] += 1
+
+            depth = self._depth_for(novel_id)
+            task_key = (novel_id, chapter.get('chapter_number'), format)
+            if depth <= 0 or task_key in self._in_flight:
+                return
+            self._in_flight.add(task_key)
+            self._stats['scheduled'] += 1
+
+        self._get_executor().submit(self._prefetch, chapter, format, depth, warm_content, task_key)
+
+    def _prefetch(self, chapter: dict, format: str, depth: int, warm_content: bool, task_key: tuple) -> None:
+        try:
+            if self._memory_pressure():
+                self._stats['skipped_memory'] += 1
+                return
+
+            novel_id = chapter['novel_id']
+            next_ids = navigation_service.get_next_ids(novel_id, chapter['chapter_number'], depth)
+            # Chapter cuối của novel: không có gì để prefetch
+            if not next_ids:
+                return
+
+            service = self._get_chapter_service()
+            # Metadata: tránh query chapter khi người đọc chuyển trang
+            if any(cache_service.get(f"chapter:{chapter_id}") is None for chapter_id in next_ids):
+                self._prefetch_metadata(service, novel_id, chapter['chapter_number'])
+
+            if warm_content:
+                for chapter_id in next_ids:
+                    self._prefetch_content(service, novel_id, chapter_id, format)
+        except Exception as e:
+            print(f"Error prefetching chapters after {chapter.get('id')}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(task_key)
+
+    def _prefetch_metadata(self, service, novel_id: int, chapter_number: float) -> None:
+        """Cache metadata của METADATA_BATCH chapter tiếp theo chưa có trong cache (một query)"""
+        missing = [
+            chapter_id
+            for chapter_id in navigation_service.get_next_ids(novel_id, chapter_number, METADATA_BATCH)
+            if cache_service.get(f"chapter:{chapter_id}") is None
+        ]
+        if not missing:
+            return
+        for next_chapter in service.supabase_service.get_chapters_by_ids(missing):
+            cache_service.set(f"chapter:{next_chapter['id']}", next_chapter, ttl=3600)
+
+    def _prefetch_content(self, service, novel_id: int, chapter_id: int, format: str) -> None:
+        cache_key = service.get_content_cache_key(chapter_id, format)
+        if cache_service.get(cache_key) is not None:
+            return
+
+        content = service.get_chapter_content(chapter_id, format)
+        if not content:
+            return
+
+        size = sys.getsizeof(content)
+        with self._lock:
+            self._prefetched[(chapter_id, format)] = (novel_id, cache_key, size)
+            self._prefetched_bytes += size
+            self._record(novel_id, prefetched=1)
+            self._stats['prefetched'] += 1
+
+            # Vượt budget: bỏ các entry prefetch cũ nhất chưa được đọc
+            while self._prefetched_bytes > self.memory_budget and self._prefetched:
+                (_, evicted_key, evicted_size) = self._prefetched.popitem(last=False)[1]
+                cache_service.delete(evicted_key)
+                self._prefetched_bytes -= evicted_size
+                self._stats['evicted'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hit_rate = self._stats['hits'] / self._stats['prefetched'] if self._stats['prefetched'] else 0.0
+            return {
+                **self._stats,
+                'enabled': self.enabled,
+                'depth': self.depth,
+                'hit_rate': round(hit_rate, 3),
+                'pending_entries': len(self._prefetched),
+                'pending_bytes': self._prefetched_bytes,
+                'memory_budget_bytes': self.memory_budget,
+                'novels': {
+                    novel_id: {'prefetched': stats[0], 'hits': stats[1], 'depth': self._depth_for(novel_id)}
+                    for novel_id, stats in self._novel_stats.items()
+                }
+            }
+
+
+# Global instance
+prefetch_service = PrefetchService()
@@ -3,7 +3,9 @@ import schedule
 import time
 import threading
 from datetime import datetime
-from app.services.sync_service import sync_service
+from app.core.config import settings
+from app.services.storage_watcher_service import storage_watcher_service
+from app.services.sync_coordinator_service import sync_coordinator_service
 
 
 class SchedulerService:
@@ -20,13 +22,19 @@ class SchedulerService:
         print("🚀 Starting scheduler service...")
         self.is_running = True
         
-        # Schedule sync job mỗi giờ
+        # Schedule sync job mỗi giờ (đối soát những gì watcher bỏ lỡ)
         schedule.every().hour.do(self.run_sync_job)
         
         # Chạy scheduler trong thread riêng
         self.thread = threading.Thread(target=self._run_scheduler, daemon=True)
         self.thread.start()
         
+        # Chỉ process leader (mỗi host một process) chạy sync job và watcher
+        if self._ensure_leader():
+            print("👑 This process runs scheduled sync jobs")
+        else:
+            print("💤 Another process is the sync leader, scheduled jobs are skipped here")
+        
         print("✅ Scheduler started successfully")
         print("📅 Sync job scheduled to run every hour")
     
@@ -39,6 +47,8 @@ class SchedulerService:
         print("🛑 Stopping scheduler service...")
         self.is_running = False
         schedule.clear()
+        storage_watcher_service.stop()
+        sync_coordinator_service.release_leadership()
         
         if self.thread:
             self.thread.join(timeout=5)
@@ -48,21 +58,38 @@ class SchedulerService:
     def _run_scheduler(self):
         """Chạy scheduler loop"""
         while self.is_running:
+            # Nhận làm leader nếu process leader cũ đã dừng
+            self._ensure_leader()
             schedule.run_pending()
             time.sleep(60)  # Check mỗi phút
     
+    def _ensure_leader(self) -> bool:
+        """Giữ leader lock và chạy storage watcher khi là leader"""
+        if not sync_coordinator_service.try_become_leader():
+            return False
+        # Sync từng novel ngay khi storage thay đổi
+        if settings.sync_watch_enabled and self.is_running and not storage_watcher_service.is_running:
+            storage_watcher_service.start()
+        return True
+    
     def run_sync_job(self):
         """Chạy sync job"""
         try:
+            if not sync_coordinator_service.is_leader:
+                print("💤 Skipping scheduled sync job, another process is the sync leader")
+                return
+            
             print(f"🔄 Scheduled sync job started at {datetime.now()}")
-            result = sync_service.sync_all_novels()
+            result = sync_coordinator_service.run_full_sync(source='scheduler')
             
-            if result['success']:
-                print(f"✅ Scheduled sync job completed successfully")
+            if result is None:
+                print("❌ Scheduled sync job failed")
+            elif result['success']:
+                print("✅ Scheduled sync job completed successfully")
                 print(f"   📚 Novels processed: {result['novels_processed']}")
                 print(f"   ⏱️ Duration: {result['duration']:.2f}s")
             else:
-                print(f"❌ Scheduled sync job failed")
+                print("❌ Scheduled sync job failed")
                 print(f"   📚 Novels processed: {result['novels_processed']}")
                 print(f"   ❌ Errors: {result['novels_error']}")
                 
@@ -74,7 +101,9 @@ class SchedulerService:
         return {
             "is_running": self.is_running,
             "next_job": schedule.next_run().isoformat() if schedule.jobs else None,
-            "jobs_count": len(schedule.jobs)
+            "jobs_count": len(schedule.jobs),
+            "is_leader": sync_coordinator_service.is_leader,
+            "watcher": storage_watcher_service.get_status()
         }
 
 
@@ -0,0 +1,399 @@
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+
+
+# Trọng số field khi tính BM25 (BM25F đơn giản: tf và độ dài theo trọng số)
+FIELD_WEIGHTS = {'title': 3.0, 'author': 2.0, 'description': 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Gợi ý (autocomplete): prefix tối đa được index, ngưỡng similarity trigram
+MAX_PREFIX_LENGTH = 24
+MIN_TRIGRAM_SIMILARITY = 0.3
+SUGGEST_FIELDS = ('title', 'author')
+
+# Các attribute chứa dữ liệu index (thay cùng lúc khi build lại)
+STATE_FIELDS = ('_postings', '_documents', '_novels', '_total_length',
+                '_prefixes', '_trigrams', '_phrases', '_prefix_top')
+# Số gợi ý tối đa được lưu sẵn cho mỗi prefix (>= limit tối đa của endpoint suggest)
+PREFIX_TOP_SIZE = 20
+
+
+def fold_text(text: str) -> str:
+    """Chữ thường, bỏ dấu tiếng Việt ("Tu Tiên Đạo" → "tu tien dao")"""
+    text = text.lower().replace('đ', 'd')
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(fold_text(text))
+
+
+def normalize_phrase(text: Optional[str]) -> str:
+    """Chuỗi đã bỏ dấu, các token cách nhau một khoảng trắng"""
+    return ' '.join(tokenize(text))
+
+
+def trigrams(text: str) -> set:
+    """Trigram của chuỗi đã normalize (có đệm khoảng trắng hai đầu như pg_trgm)"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchService:
+    """
+    Inverted index in-process cho tìm kiếm novel (title, author, description)
+
+    Văn bản được bỏ dấu trước khi tách token nên query không dấu vẫn khớp.
+    Kết quả xếp theo BM25 với trọng số field. Gợi ý (autocomplete) dùng prefix
+    index (trie dạng phẳng: prefix → novels) trên title/author và từng từ của
+    chúng, cộng trigram index để chấp nhận gõ sai. Index được build lazily từ
+    database ở lần search đầu, sau đó cập nhật từng novel khi create/update/
+    delete; định kỳ (SEARCH_INDEX_REFRESH_SECONDS) được build lại ở background
+    để lấy các thay đổi không đi qua NovelService (lượt xem, sync chapters...).
+    """
+
+    def __init__(self):
+        self._supabase_service = None
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._rebuilding = False
+        # upsert/remove trong lúc load lại từ database, áp lại lên index mới trước khi thay
+        self._pending_changes: Optional[List[tuple]] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        # term → {novel_id: tf theo trọng số}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # novel_id → (Counter term, độ dài theo trọng số)
+        self._documents: Dict[int, tuple] = {}
+        self._novels: Dict[int, Dict] = {}
+        self._total_length = 0.0
+        # Gợi ý: key = novel_id * 2 + vị trí field trong SUGGEST_FIELDS
+        # prefix → {key: rank}, trigram → {key}
+        self._prefixes: Dict[str, Dict[int, float]] = {}
+        self._trigrams: Dict[str, set] = {}
+        # key → (chuỗi normalize, số trigram)
+        self._phrases: Dict[int, tuple] = {}
+        # prefix → top gợi ý đã xếp hạng, bỏ khi novel có prefix đó thay đổi
+        self._prefix_top: Dict[str, List[tuple]] = {}
+
+    def _get_supabase_service(self):
+        if self._supabase_service is None:
+            from app.services.supabase_service import SupabaseService
+            self._supabase_service = SupabaseService()
+        return self._supabase_service
+
+    def _analyze(self, novel: Dict) -> tuple:
+        terms: Counter = Counter()
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            tokens = tokenize(novel.get(field))
+            length += weight * len(tokens)
+            for token in tokens:
+                terms[token] += weight
+        return terms, length
+
+    def _add(self, novel: Dict) -> None:
+        novel_id = novel['id']
+        terms, length = self._analyze(novel)
+        for term, weight in terms.items():
+            self._postings.setdefault(term, {})[novel_id] = weight
+        self._documents[novel_id] = (terms, length)
+        self._novels[novel_id] = novel
+        self._total_length += length
+        self._add_suggestions(novel)
+
+    @staticmethod
+    def _phrase_prefixes(phrase: str):
+        """(prefix, khớp từ đầu chuỗi) của chuỗi và của phần chuỗi bắt đầu từ mỗi từ"""
+        words = phrase.split(' ')
+        for start in range(len(words)):
+            suffix = ' '.join(words[start:])[:MAX_PREFIX_LENGTH]
+            for end in range(1, len(suffix) + 1):
+                yield suffix[:end], start == 0
+
+    def _add_suggestions(self, novel: Dict) -> None:
+        for field_index, field in enumerate(SUGGEST_FIELDS):
+            phrase = normalize_phrase(novel.get(field))
+            if not phrase:
+                continue
+            key = novel['id'] * 2 + field_index
+            phrase_trigrams = trigrams(phrase)
+            self._phrases[key] = (phrase, len(phrase_trigrams))
+
+            # Khớp từ đầu chuỗi xếp trước khớp giữa chuỗi; title trước author
+            field_bonus = 0.25 if field == 'title' else 0.0
+            for prefix, at_start in self._phrase_prefixes(phrase):
+                ranks = self._prefixes.setdefault(prefix, {})
+                ranks[key] = max(ranks.get(key, 0.0), 2.0 + (0.5 if at_start else 0.0) + field_bonus)
+                self._prefix_top.pop(prefix, None)
+            for trigram in phrase_trigrams:
+                self._trigrams.setdefault(trigram, set()).add(key)
+
+    def _remove_suggestions(self, novel_id: int) -> None:
+        for field_index in range(len(SUGGEST_FIELDS)):
+            key = novel_id * 2 + field_index
+            entry = self._phrases.pop(key, None)
+            if entry is None:
+                continue
+            phrase = entry[0]
+            for prefix, _ in self._phrase_prefixes(phrase):
+                ranks = self._prefixes.get(prefix)
+                if ranks is not None:
+                    ranks.pop(key, None)
+                    if not ranks:
+                        del self._prefixes[prefix]
+                self._prefix_top.pop(prefix, None)
+            for trigram in trigrams(phrase):
+                keys = self._trigrams.get(trigram)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._trigrams[trigram]
+
+    def _remove(self, novel_id: int) -> None:
+        document = self._documents.pop(novel_id, None)
+        self._novels.pop(novel_id, None)
+        self._remove_suggestions(novel_id)
+        if document is None:
+            return
+        terms, length = document
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(novel_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= length
+
+    def build(self, novels: List[Dict]) -> None:
+        """Build lại toàn bộ index (build riêng rồi thay, search không bị chặn trong lúc build)"""
+        fresh = SearchService()
+        for novel in novels:
+            fresh._add(novel)
+        with self._lock:
+            # Dữ liệu lấy từ database có thể đã cũ hơn các thay đổi đến trong lúc build
+            for action, value in self._pending_changes or ():
+                if action == 'upsert':
+                    fresh._remove(value['id'])
+                    fresh._add(value)
+                else:
+                    fresh._remove(value)
+            self._pending_changes = None
+            for name in STATE_FIELDS:
+                setattr(self, name, getattr(fresh, name))
+            self._loaded = True
+            self._loaded_at = time.monotonic()
+
+    def _load(self) -> bool:
+        with self._lock:
+            self._pending_changes = []
+        try:
+            novels = self._get_supabase_service().get_all_novels()
+        except Exception as e:
+            print(f"❌ Error loading search index: {e}")
+            with self._lock:
+                self._pending_changes = None
+            return False
+        self.build(novels)
+        print(f"🔎 Search index built: {len(novels)} novels, {len(self._postings)} terms")
+        return True
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def refresh():
+            try:
+                self._load()
+            finally:
+                self._rebuilding = False
+
+        threading.Thread(target=refresh, name="search-index-refresh", daemon=True).start()
+
+    def ensure_loaded(self) -> bool:
+        """Load index nếu chưa có, build lại ở background nếu đã cũ"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded and not self._load():
+                    return False
+        elif time.monotonic() - self._loaded_at > settings.search_index_refresh_seconds:
+            self._refresh_in_background()
+        return True
+
+    def upsert(self, novel: Dict) -> None:
+        """Cập nhật một novel trong index (gọi sau create/update)"""
+        with self._lock:
+            if self._pending_changes is not None:
+                self._pending_changes.append(('upsert', novel))
+            if not self._loaded:
+                return
+            self._remove(novel['id'])
+            self._add(novel)
+
+    def remove(self, novel_id: int) -> None:
+        with self._lock:
+            if self._pending_changes is not None:
+                self._pending_changes.append(('remove', novel_id))
+            if self._loaded:
+                self._remove(novel_id)
+
+    def invalidate(self) -> None:
+        """Bỏ index, build lại ở lần search tiếp theo"""
+        with self._lock:
+            self._loaded = False
+            self._reset()
+
+    def _score(self, terms: List[str]) -> Dict[int, float]:
+        total_documents = len(self._documents)
+        average_length = self._total_length / total_documents if total_documents else 0.0
+        scores: Dict[int, float] = {}
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total_documents - len(postings) + 0.5) / (len(postings) + 0.5))
+            for novel_id, tf in postings.items():
+                length = self._documents[novel_id][1]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length) if average_length else BM25_K1
+                scores[novel_id] = scores.get(novel_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, page: int = 1, limit: int = 20,
+               status: Optional[str] = None, author: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Tìm novels theo BM25, trả về cùng cấu trúc pagination với danh sách novels
+
+        Returns:
+            None nếu không load được index (caller fallback về query database)
+        """
+        if not self.ensure_loaded():
+            return None
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            scores = self._score(terms)
+            results = [
+                (score, novel_id) for novel_id, score in scores.items()
+                if (not status or self._novels[novel_id].get('status') == status)
+                and (not author or self._novels[novel_id].get('author') == author)
+            ]
+            results.sort(key=lambda result: (-result[0], result[1]))
+
+            total = len(results)
+            skip = (page - 1) * limit
+            items = [self._novels[novel_id] for _, novel_id in results[skip:skip + limit]]
+
+        total_pages = (total + limit - 1) // limit if total > 0 else 0
+        return {
+            "items": items,
+            "total": total,
+            "page": page,
+            "limit": limit,
+            "total_pages": total_pages,
+            "has_next": page < total_pages,
+            "has_prev": page > 1,
+            "next_page": page + 1 if page < total_pages else None,
+            "prev_page": page - 1 if page > 1 else None
+        }
+
+    def suggest(self, query: str, limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """
+        Gợi ý novels cho ô tìm kiếm: khớp prefix (title/author hoặc một từ trong đó)
+        trước, sau đó các novel gần giống theo trigram (gõ sai, thiếu chữ)
+
+        Returns:
+            None nếu không load được index
+        """
+        if not self.ensure_loaded():
+            return None
+
+        phrase = normalize_phrase(query)
+        if not phrase:
+            return []
+
+        with self._lock:
+            ranked = list(self._top_prefix_matches(phrase[:MAX_PREFIX_LENGTH])[:limit])
+            if len(ranked) < limit:
+                matched = {key // 2 for key, _ in ranked}
+                ranked.extend(
+                    match for match in self._trigram_matches(phrase, limit)
+                    if match[0] // 2 not in matched
+                )
+            return [self._suggestion(key, score) for key, score in ranked[:limit]]
+
+    def _sort_key(self, match: tuple) -> tuple:
+        key, score = match
+        return -score, -(self._novels[key // 2].get('views') or 0), key
+
+    def _top_prefix_matches(self, prefix: str) -> List[tuple]:
+        """Top gợi ý của prefix (xếp hạng một lần, lưu lại tới khi novel liên quan thay đổi)"""
+        top = self._prefix_top.get(prefix)
+        if top is None:
+            best: Dict[int, tuple] = {}
+            for key, rank in self._prefixes.get(prefix, {}).items():
+                # Mỗi novel một gợi ý (field khớp tốt nhất)
+                if key // 2 not in best or rank > best[key // 2][1]:
+                    best[key // 2] = (key, rank)
+            top = heapq.nsmallest(PREFIX_TOP_SIZE, best.values(), key=self._sort_key)
+            self._prefix_top[prefix] = top
+        return top
+
+    def _trigram_matches(self, phrase: str, limit: int) -> List[tuple]:
+        """Novels gần giống theo Jaccard similarity trên trigram (gõ sai, thiếu chữ)"""
+        query_trigrams = trigrams(phrase)
+        shared_counts: Counter = Counter()
+        for trigram in query_trigrams:
+            shared_counts.update(self._trigrams.get(trigram, ()))
+
+        # similarity >= ngưỡng cần số trigram chung tối thiểu, loại nhanh phần lớn ứng viên
+        min_shared = MIN_TRIGRAM_SIMILARITY * len(query_trigrams) / (1 + MIN_TRIGRAM_SIMILARITY)
+        best: Dict[int, tuple] = {}
+        for key, shared in shared_counts.items():
+            if shared < min_shared:
+                continue
+            similarity = shared / (len(query_trigrams) + self._phrases[key][1] - shared)
+            if similarity >= MIN_TRIGRAM_SIMILARITY and (key // 2 not in best or similarity > best[key // 2][1]):
+                best[key // 2] = (key, similarity)
+        return heapq.nsmallest(limit, best.values(), key=self._sort_key)
+
+    def _suggestion(self, key: int, score: float) -> Dict[str, Any]:
+        novel = self._novels[key // 2]
+        return {
+            'id': novel['id'],
+            'title': novel.get('title'),
+            'author': novel.get('author'),
+            'cover_image': novel.get('cover_image'),
+            'match': SUGGEST_FIELDS[key % 2],
+            'score': round(score, 3),
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'loaded': self._loaded,
+            'novels': len(self._documents),
+            'terms': len(self._postings),
+            'prefixes': len(self._prefixes),
+            'trigrams': len(self._trigrams),
+            'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._loaded else None
+        }
+
+
+# Global instance
+search_service = SearchService()
@@ -0,0 +1,99 @@
+import os
+from typing import Optional
+from app.core.config import settings
+from app.services.packed_store_service import packed_store_service
+from app.services.chapter_index_service import chapter_index_service
+
+
+# Storage key là `n{novel_id}`: không nhầm với thư mục đặt theo title toàn số (vd "1984")
+KEY_PREFIX = 'n'
+
+
+class StorageKeyService:
+    """
+    Storage key của novel: thư mục `{storage_path}/n{novel_id}`
+
+    Key không đổi theo title nên đổi tên novel chỉ là update metadata và đường
+    dẫn không phụ thuộc ký tự đặc biệt trong title. Thư mục đặt theo title
+    (dữ liệu cũ, hoặc thư mục staging lúc EPUB upload/sync) được đổi tên sang
+    key bằng `adopt_directory`. Thư mục key định dạng cũ (`{novel_id}`, chỉ có
+    số) được scripts/migrate_storage_keys.py hoặc lần sync tiếp theo chuyển sang
+    định dạng mới.
+    """
+
+    def __init__(self):
+        self.storage_path = settings.storage_path
+
+    def get_key(self, novel_id: int) -> str:
+        return f"{KEY_PREFIX}{novel_id}"
+
+    def parse_key(self, dir_name: str) -> Optional[int]:
+        """Novel ID của thư mục đặt theo storage key, None nếu không phải key"""
+        if dir_name.startswith(KEY_PREFIX) and dir_name[len(KEY_PREFIX):].isdigit():
+            return int(dir_name[len(KEY_PREFIX):])
+        return None
+
+    def is_key(self, dir_name: str) -> bool:
+        return self.parse_key(dir_name) is not None
+
+    def parse_legacy_key(self, dir_name: str, title: Optional[str]) -> Optional[int]:
+        """
+        Novel ID của thư mục key định dạng cũ (`{novel_id}`)
+
+        Thư mục chỉ có số là key cũ khi title trong book_info.json khác tên thư
+        mục; nếu trùng thì đó là thư mục đặt theo title (vd novel "1984").
+        """
+        if dir_name.isdigit() and title != dir_name:
+            return int(dir_name)
+        return None
+
+    def get_novel_dir(self, novel_id: int) -> str:
+        return os.path.join(self.storage_path, self.get_key(novel_id))
+
+    def existing_key(self, novel_id: int) -> Optional[str]:
+        """Key của novel nếu thư mục theo key đã tồn tại (None nếu novel chưa migrate)"""
+        key = self.get_key(novel_id)
+        return key if os.path.isdir(os.path.join(self.storage_path, key)) else None
+
+    def resolve_dir_name(self, novel_id: int, novel_title: Optional[str] = None) -> Optional[str]:
+        """Tên thư mục hiện có của novel: ưu tiên key, fallback thư mục theo title"""
+        key = self.existing_key(novel_id)
+        if key is not None:
+            return key
+        if novel_title and os.path.isdir(os.path.join(self.storage_path, novel_title)):
+            return novel_title
+        return None
+
+    def adopt_directory(self, dir_name: str, novel_id: int) -> str:
+        """
+        Đổi tên thư mục (đặt theo title) thành storage key của novel
+
+        Returns:
+            Tên thư mục sau khi đổi (giữ nguyên tên cũ nếu không đổi được)
+        """
+        key = self.get_key(novel_id)
+        if dir_name == key:
+            return key
+
+        old_dir = os.path.join(self.storage_path, dir_name)
+        new_dir = os.path.join(self.storage_path, key)
+        if not os.path.isdir(old_dir):
+            return key if os.path.isdir(new_dir) else dir_name
+        if os.path.exists(new_dir):
+            print(f"⚠️ Storage key directory already exists, keeping {old_dir}: {new_dir}")
+            return dir_name
+
+        try:
+            # Packed store đang mở theo đường dẫn cũ
+            packed_store_service.forget(old_dir)
+            os.rename(old_dir, new_dir)
+            chapter_index_service.rename_novel_dir(novel_id, key)
+            print(f"📁 Moved novel storage to key: {old_dir} -> {new_dir}")
+            return key
+        except Exception as e:
+            print(f"❌ Error moving novel storage to key {new_dir}: {e}")
+            return dir_name
+
+
+# Global instance
+storage_key_service = StorageKeyService()
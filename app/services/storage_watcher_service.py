@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+from app.core.config import settings
+from app.services.packed_store_service import INDEX_FILENAME, LOCK_FILENAME, PACK_FILENAME
+from app.services.sync_manifest_service import BOOK_INFO_FILENAME, sync_manifest_service
+
+try:
+    import watchfiles
+except ImportError:  # watchfiles là optional (đi kèm uvicorn[standard]), fallback về polling
+    watchfiles = None
+
+
+# File do chính server ghi trong thư mục novel, không kích hoạt sync
+IGNORED_FILENAMES = {PACK_FILENAME, INDEX_FILENAME, LOCK_FILENAME}
+
+
+class StorageWatcherService:
+    """
+    Theo dõi storage và sync từng novel ngay khi book_info.json hoặc file chapter thay đổi
+
+    - Backend "watchfiles" (inotify/FSEvents) nếu có, ngược lại polling: stat
+      book_info.json của mọi thư mục mỗi SYNC_WATCH_POLL_SECONDS (polling không
+      thấy file chapter sửa tại chỗ)
+    - Thay đổi được gom theo thư mục novel; novel chỉ được sync khi đã yên
+      SYNC_WATCH_DEBOUNCE_SECONDS (đang copy nhiều chapter thì chờ copy xong)
+    - Một worker sync lần lượt từng novel; full sync hàng giờ của scheduler vẫn
+      chạy để đối soát những gì watcher bỏ lỡ
+    """
+
+    def __init__(self):
+        self.storage_path = settings.storage_path
+        self.backend: Optional[str] = None
+        self._stop_event = threading.Event()
+        self._watch_thread: Optional[threading.Thread] = None
+        self._worker_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # dir_name → [thời điểm thay đổi cuối, các file chapter đã ghi]
+        self._pending: Dict[str, list] = {}
+        self._stats = {'events': 0, 'synced': 0, 'failed': 0, 'skipped': 0}
+        self._last_sync: Optional[Dict] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._watch_thread is not None and self._watch_thread.is_alive()
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self.backend = 'watchfiles' if watchfiles is not None and settings.sync_watch_backend != 'polling' else 'polling'
+        self._watch_thread = threading.Thread(target=self._watch, name="storage-watcher", daemon=True)
+        self._worker_thread = threading.Thread(target=self._work, name="storage-watcher-sync", daemon=True)
+        self._watch_thread.start()
+        self._worker_thread.start()
+        print(f"👀 Storage watcher started ({self.backend}): {self.storage_path}")
+
+    def stop(self) -> None:
+        if not self.is_running:
+            return
+        self._stop_event.set()
+        for thread in (self._watch_thread, self._worker_thread):
+            if thread is not None:
+                thread.join(timeout=5)
+        self._watch_thread = None
+        self._worker_thread = None
+        print("🛑 Storage watcher stopped")
+
+    def notify(self, dir_name: str, changed_file: Optional[str] = None) -> None:
+        """Ghi nhận thay đổi trong thư mục novel (changed_file: file chapter, None nếu là book_info.json)"""
+        with self._lock:
+            entry = self._pending.setdefault(dir_name, [0.0, set()])
+            entry[0] = time.monotonic()
+            if changed_file:
+                entry[1].add(changed_file)
+            self._stats['events'] += 1
+
+    def _classify(self, path: str, deleted: bool) -> Optional[tuple]:
+        """(dir_name, file chapter hoặc None) cho path trong storage, None nếu không cần sync"""
+        relative = os.path.relpath(path, self.storage_path)
+        parts = relative.replace(os.sep, '/').split('/')
+        # Bỏ qua file ở gốc storage, thư mục/file nội bộ (.objects, .rendered, .search, ...)
+        if len(parts) < 2 or any(part.startswith('.') for part in parts):
+            return None
+        if parts[-1] in IGNORED_FILENAMES:
+            return None
+        if len(parts) == 2 and parts[1] == BOOK_INFO_FILENAME:
+            return parts[0], None
+        # File chapter bị xóa không cần render lại; chapter bị bỏ khỏi book_info.json mới cần sync
+        if deleted:
+            return None
+        return parts[0], '/'.join(parts[1:])
+
+    def _watch(self) -> None:
+        if self.backend == 'watchfiles':
+            try:
+                self._watch_events()
+                return
+            except Exception as e:
+                if self._stop_event.is_set():
+                    return
+                # Vd: vượt giới hạn inotify watches, filesystem mạng
+                print(f"⚠️ Storage watcher falling back to polling: {e}")
+                self.backend = 'polling'
+        self._watch_polling()
+
+    def _watch_events(self) -> None:
+        os.makedirs(self.storage_path, exist_ok=True)
+        for changes in watchfiles.watch(self.storage_path, stop_event=self._stop_event,
+                                        watch_filter=None, raise_interrupt=False):
+            for change, path in changes:
+                target = self._classify(path, change == watchfiles.Change.deleted)
+                if target is not None:
+                    self.notify(*target)
+
+    def _watch_polling(self) -> None:
+        seen: Dict[str, tuple] = {}
+        first_scan = True
+        while not self._stop_event.is_set():
+            try:
+                current = {}
+                with os.scandir(self.storage_path) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.') or not entry.is_dir():
+                            continue
+                        try:
+                            stat = os.stat(os.path.join(entry.path, BOOK_INFO_FILENAME))
+                        except OSError:
+                            continue
+                        current[entry.name] = (stat.st_mtime_ns, stat.st_size)
+                        if first_scan:
+                            # Lần quét đầu: so với lần sync thành công trước
+                            changed = not sync_manifest_service.is_unchanged(entry.name, stat)
+                        else:
+                            changed = seen.get(entry.name) != current[entry.name]
+                        if changed:
+                            self.notify(entry.name)
+                seen = current
+                first_scan = False
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"❌ Error polling storage: {e}")
+            self._stop_event.wait(settings.sync_watch_poll_seconds)
+
+    def _take_ready(self) -> Optional[tuple]:
+        """Lấy một novel đã yên đủ lâu để sync"""
+        deadline = time.monotonic() - settings.sync_watch_debounce_seconds
+        with self._lock:
+            for dir_name, (changed_at, changed_files) in self._pending.items():
+                if changed_at <= deadline:
+                    del self._pending[dir_name]
+                    return dir_name, changed_files
+        return None
+
+    def _work(self) -> None:
+        # Import muộn: sync_service import nhiều service khác
+        from app.services.sync_coordinator_service import sync_coordinator_service
+        from app.services.sync_service import sync_service
+
+        while not self._stop_event.is_set():
+            ready = self._take_ready()
+            if ready is None:
+                self._stop_event.wait(1)
+                continue
+
+            dir_name, changed_files = ready
+            start_time = time.monotonic()
+            try:
+                # Chờ nếu đang có full sync (process này hoặc process khác)
+                result = sync_coordinator_service.run_exclusive(
+                    sync_service.sync_novel_directory, dir_name, changed_files
+                )
+            except Exception as e:
+                print(f"❌ Error syncing {dir_name} from storage watcher: {e}")
+                result = False
+
+            if result is None:
+                self._stats['skipped'] += 1
+                continue
+            self._stats['synced' if result else 'failed'] += 1
+            self._last_sync = {
+                'dir_name': dir_name,
+                'success': result,
+                'changed_files': len(changed_files),
+                'duration': round(time.monotonic() - start_time, 3),
+                'finished_at': time.time(),
+            }
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'is_running': self.is_running,
+            'backend': self.backend,
+            'pending': pending,
+            'last_sync': self._last_sync,
+            **self._stats,
+        }
+
+
+# Global instance
+storage_watcher_service = StorageWatcherService()
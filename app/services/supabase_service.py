@@ -38,7 +38,7 @@ class SupabaseService:
         
         return response.data
     
-    def get_novels_with_pagination(self, page: int = 1, limit: int = 20, search: Optional[str] = None, status: Optional[str] = None, author: Optional[str] = None) -> Dict[str, Any]:
+    def get_novels_with_pagination(self, page: int = 1, limit: int = 20, search: Optional[str] = None, status: Optional[str] = None, author: Optional[str] = None, order_by: str = 'created_at') -> Dict[str, Any]:
         """
         Lấy danh sách novels với pagination metadata
         
@@ -48,6 +48,7 @@ class SupabaseService:
             search: Từ khóa tìm kiếm trong title và author
             status: Lọc theo trạng thái (ongoing, completed)
             author: Lọc theo tác giả
+            order_by: Cột sắp xếp (giảm dần)
         """
         # Tính toán skip
         skip = (page - 1) * limit
@@ -77,7 +78,7 @@ class SupabaseService:
         if author:
             data_query = data_query.eq('author', author)
         
-        data_query = data_query.range(skip, skip + limit - 1).order('created_at', desc=True)
+        data_query = data_query.range(skip, skip + limit - 1).order(order_by, desc=True).order('id', desc=True)
         data_response = data_query.execute()
         
         # Tính toán pagination metadata
@@ -99,6 +100,15 @@ class SupabaseService:
             "prev_page": prev_page
         }
     
+    def get_all_novels(self, batch_size: int = 1000) -> List[Dict]:
+        """Lấy tất cả novels (theo từng batch)"""
+        rows = []
+        while True:
+            response = self.supabase.table('novels').select('*').order('id').range(len(rows), len(rows) + batch_size - 1).execute()
+            rows.extend(response.data)
+            if len(response.data) < batch_size:
+                return rows
+    
     def get_novel(self, novel_id: int) -> Optional[Dict]:
         """Lấy novel theo ID"""
         response = self.supabase.table('novels').select('*').eq('id', novel_id).execute()
@@ -159,6 +169,20 @@ class SupabaseService:
         response = self.supabase.table('chapters').select('*').eq('id', chapter_id).execute()
         return response.data[0] if response.data else None
     
+    def get_chapters_by_ids(self, chapter_ids: List[int]) -> List[Dict]:
+        """Lấy nhiều chapters theo ID trong một query"""
+        response = self.supabase.table('chapters').select('*').in_('id', chapter_ids).execute()
+        return response.data
+    
+    def get_chapter_toc(self, novel_id: int, batch_size: int = 1000) -> List[Dict]:
+        """Lấy id, chapter_number, title của tất cả chapters của novel (theo từng batch)"""
+        rows = []
+        while True:
+            response = self.supabase.table('chapters').select('id, chapter_number, title').eq('novel_id', novel_id).order('chapter_number').order('id').range(len(rows), len(rows) + batch_size - 1).execute()
+            rows.extend(response.data)
+            if len(response.data) < batch_size:
+                return rows
+    
     def increment_chapter_views(self, chapter_id: int) -> bool:
         """Tăng lượt xem chapter"""
         response = self.supabase.rpc('increment_chapter_views', {'chapter_id': chapter_id}).execute()
@@ -0,0 +1,270 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from app.core.config import settings
+from app.services.chapter_index_service import chapter_index_service
+from app.services.sync_manifest_service import sync_manifest_service
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa trong process
+    fcntl = None
+
+
+# File lock ở gốc storage (dùng chung cho mọi worker process trên host)
+JOB_LOCK_FILENAME = '.sync.lock'
+LEADER_LOCK_FILENAME = '.sync_leader.lock'
+# Trạng thái job đang chạy, để process khác (worker uvicorn khác) đọc được
+STATUS_FILENAME = '.sync_status.json'
+# Khoảng thời gian tối thiểu giữa hai lần ghi tiến độ ra STATUS_FILENAME
+STATUS_WRITE_INTERVAL = 1.0
+
+
+class SyncJob:
+    """Một lần full sync; các request đến khi job còn trong hàng đợi được gộp vào"""
+
+    def __init__(self, job_id: str, force: bool, source: str):
+        self.id = job_id
+        self.force = force
+        self.sources = [source]
+        # queued → waiting_lock → running → completed/failed
+        self.state = 'queued'
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.progress = {'done': 0, 'total': 0, 'current': None}
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Chờ job xong, trả về kết quả của sync_all_novels"""
+        self._done.wait(timeout)
+        return self.result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'state': self.state,
+            'force': self.force,
+            'sources': list(self.sources),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': dict(self.progress),
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class SyncCoordinatorService:
+    """
+    Điều phối sync để không có hai lần sync chạy chồng nhau
+
+    - Job lock (`storage/.sync.lock`, flock): mọi lần sync (full sync, watcher,
+      sync chapters một novel) của mọi process trên host chạy tuần tự; sync
+      manifest và chapter index được đọc lại từ đĩa ngay khi giữ lock
+    - Hàng đợi một chỗ: request full sync đến khi đã có job đang chờ thì được
+      gộp vào job đó; đang có job chạy thì xếp một job chạy sau (storage có thể
+      đã đổi sau lần quét của job đang chạy)
+    - Leader lock (`storage/.sync_leader.lock`): chỉ process giữ lock chạy
+      scheduler hàng giờ và storage watcher; process leader dừng thì process
+      khác nhận thay ở lần kiểm tra tiếp theo
+    """
+
+    def __init__(self):
+        self.storage_path = settings.storage_path
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._queued: Optional[SyncJob] = None
+        self._running: Optional[SyncJob] = None
+        self._last: Optional[SyncJob] = None
+        self._worker: Optional[threading.Thread] = None
+        self._job_count = 0
+        self._leader_file = None
+        self._status_written_at = 0.0
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.storage_path, filename)
+
+    # ----- Leader -----
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_file is not None or fcntl is None
+
+    def try_become_leader(self) -> bool:
+        """Giữ leader lock nếu chưa process nào giữ (gọi lại định kỳ để nhận thay leader cũ)"""
+        if self.is_leader:
+            return True
+        try:
+            os.makedirs(self.storage_path, exist_ok=True)
+            leader_file = open(self._path(LEADER_LOCK_FILENAME), 'a+')
+        except OSError as e:
+            print(f"❌ Error opening sync leader lock: {e}")
+            return False
+        try:
+            fcntl.flock(leader_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            leader_file.close()
+            return False
+        leader_file.seek(0)
+        leader_file.truncate()
+        leader_file.write(str(os.getpid()))
+        leader_file.flush()
+        self._leader_file = leader_file
+        print(f"👑 Process {os.getpid()} is now the sync leader")
+        return True
+
+    def release_leadership(self) -> None:
+        if self._leader_file is not None:
+            try:
+                fcntl.flock(self._leader_file, fcntl.LOCK_UN)
+            finally:
+                self._leader_file.close()
+                self._leader_file = None
+
+    # ----- Job lock -----
+
+    @contextmanager
+    def exclusive(self, job: Optional[SyncJob] = None):
+        """Chạy một lần sync độc quyền trên host (chờ nếu process/thread khác đang sync)"""
+        with self._run_lock:
+            lock_file = None
+            if fcntl is not None:
+                os.makedirs(self.storage_path, exist_ok=True)
+                lock_file = open(self._path(JOB_LOCK_FILENAME), 'a+')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    print("⏳ Another process is syncing, waiting for sync lock...")
+                    if job is not None:
+                        job.state = 'waiting_lock'
+                        self._write_status(job, force=True)
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Lần sync trước có thể do process khác chạy: làm việc trên dữ liệu mới nhất
+                # trên đĩa để save() không ghi đè manifest/index của process đó
+                sync_manifest_service.reload()
+                chapter_index_service.reload()
+                yield
+            finally:
+                if lock_file is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+
+    def run_exclusive(self, func: Callable, *args, **kwargs):
+        """Gọi func trong job lock (sync một novel từ watcher, API sync chapters)"""
+        with self.exclusive():
+            return func(*args, **kwargs)
+
+    # ----- Full sync queue -----
+
+    def request_full_sync(self, force: bool = False, source: str = 'api') -> SyncJob:
+        """
+        Xếp một full sync vào hàng đợi (gộp vào job đang chờ nếu có)
+
+        Returns:
+            Job sẽ xử lý request này
+        """
+        with self._lock:
+            job = self._queued
+            if job is not None:
+                job.force = job.force or force
+                job.sources.append(source)
+                print(f"🔗 Sync request from {source} merged into queued job {job.id}")
+            else:
+                self._job_count += 1
+                job = SyncJob(f"{os.getpid()}-{self._job_count}", force, source)
+                self._queued = job
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._work, name="sync-coordinator", daemon=True)
+                self._worker.start()
+        return job
+
+    def run_full_sync(self, force: bool = False, source: str = 'api') -> Optional[Dict]:
+        """Xếp full sync vào hàng đợi và chờ kết quả"""
+        return self.request_full_sync(force, source).wait()
+
+    def _work(self) -> None:
+        # Import muộn: sync_service import nhiều service khác
+        from app.services.sync_service import sync_service
+
+        while True:
+            with self._lock:
+                job = self._queued
+                self._queued = None
+                if job is None:
+                    self._worker = None
+                    return
+                self._running = job
+
+            try:
+                with self.exclusive(job):
+                    job.state = 'running'
+                    job.started_at = time.time()
+                    self._write_status(job, force=True)
+                    job.result = sync_service.sync_all_novels(
+                        job.force, on_progress=lambda done, total, title: self._on_progress(job, done, total, title)
+                    )
+                job.state = 'completed'
+            except Exception as e:
+                print(f"❌ Sync job {job.id} failed: {e}")
+                job.state = 'failed'
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._running = None
+                    self._last = job
+                self._write_status(job, force=True)
+                job._done.set()
+
+    def _on_progress(self, job: SyncJob, done: int, total: int, title: str) -> None:
+        job.progress = {'done': done, 'total': total, 'current': title or None}
+        self._write_status(job)
+
+    def _write_status(self, job: SyncJob, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._status_written_at < STATUS_WRITE_INTERVAL:
+            return
+        self._status_written_at = now
+        path = self._path(STATUS_FILENAME)
+        try:
+            tmp_path = f"{path}.tmp.{os.getpid()}"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'pid': os.getpid(), 'job': job.to_dict()}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️ Error writing sync status: {e}")
+
+    def _read_status(self) -> Optional[Dict]:
+        try:
+            with open(self._path(STATUS_FILENAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Trạng thái job trong process này và job mới nhất trên host (có thể của process khác)"""
+        with self._lock:
+            running = self._running.to_dict() if self._running is not None else None
+            queued = self._queued.to_dict() if self._queued is not None else None
+            last = self._last.to_dict() if self._last is not None else None
+        host = self._read_status()
+        return {
+            'pid': os.getpid(),
+            'is_leader': self.is_leader,
+            'running': running,
+            'queued': queued,
+            'last': last,
+            # Job mới nhất trên host, kể cả do worker process khác chạy
+            'host': host,
+        }
+
+
+# Global instance
+sync_coordinator_service = SyncCoordinatorService()
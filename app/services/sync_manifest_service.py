@@ -0,0 +1,275 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from app.core.config import settings
+
+
+# Manifest nằm ở gốc storage, trạng thái chapters nằm trong thư mục từng novel
+# (đi theo thư mục khi đổi tên sang storage key)
+MANIFEST_FILENAME = '.sync_manifest.json'
+CHAPTERS_STATE_FILENAME = '.sync_chapters.json'
+MANIFEST_VERSION = 2
+# Khoảng thời gian tối thiểu giữa hai lần stat manifest để xem process khác đã ghi lại chưa
+MANIFEST_CHECK_INTERVAL = 1.0
+BOOK_INFO_FILENAME = 'book_info.json'
+
+
+class SyncManifestService:
+    """
+    Trạng thái lần sync thành công gần nhất của từng thư mục novel
+
+    - Manifest (`storage/.sync_manifest.json`): mtime, size và sha256 của
+      book_info.json theo thư mục. Sync chỉ cần stat file để bỏ qua novel không
+      đổi; mtime đổi nhưng hash giống thì cũng bỏ qua.
+    - Manifest cũng là inventory của storage cho API status: title, số chapters,
+      novel thất bại ở lần sync gần nhất và thông tin lần full sync gần nhất;
+      tra thư mục theo title qua index trong memory, không cần quét storage.
+      Manifest được đọc lại khi file đổi mtime (process khác vừa sync và ghi).
+    - Trạng thái chapters (`{novel}/.sync_chapters.json`): file chapter →
+      (number, title, word_count) đã sync, chỉ đọc khi novel thay đổi để tính ra
+      các chapter mới hoặc đã sửa.
+    """
+
+    def __init__(self):
+        self.storage_path = settings.storage_path
+        self.manifest_path = os.path.join(self.storage_path, MANIFEST_FILENAME)
+        self._novels: Dict[str, Dict] = {}
+        # dir_name → {title, failed_at} của novel sync lỗi (chưa sync thành công lại)
+        self._failed: Dict[str, Dict] = {}
+        self._last_run: Optional[Dict] = None
+        # title → dir_name
+        self._titles: Dict[str, str] = {}
+        self._loaded = False
+        self._dirty = False
+        # mtime_ns của file manifest lúc đọc/ghi gần nhất (None nếu chưa có file)
+        self._mtime_ns: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _file_mtime_ns(self) -> Optional[int]:
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _ensure_loaded(self) -> None:
+        """Đọc manifest lần đầu, đọc lại nếu process khác đã ghi file mới hơn"""
+        now = time.monotonic()
+        if self._loaded and now - self._checked_at < MANIFEST_CHECK_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            # Thay đổi chưa ghi trong memory được giữ lại (save() của lần sync này sẽ ghi)
+            if self._loaded and (self._dirty or self._file_mtime_ns() == self._mtime_ns):
+                return
+            self._load()
+
+    def _load(self) -> None:
+        """Đọc manifest từ file, bỏ trạng thái trong memory (gọi khi đang giữ lock)"""
+        self._novels = {}
+        self._failed = {}
+        self._last_run = None
+        self._mtime_ns = None
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self._mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self._novels = data.get('novels', {})
+                self._failed = data.get('failed', {})
+                self._last_run = data.get('last_run')
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Error loading sync manifest, running full sync: {e}")
+        self._rebuild_titles()
+        self._dirty = False
+        self._loaded = True
+
+    def reload(self) -> None:
+        """
+        Đọc lại manifest từ file (gọi khi vừa giữ sync lock): process khác có thể
+        đã sync và ghi manifest mới hơn, save() từ bản cũ trong memory sẽ ghi đè mất
+        """
+        with self._lock:
+            self._load()
+
+    def save(self) -> None:
+        """Ghi manifest ra file nếu có thay đổi (file tạm + rename)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(self.storage_path, exist_ok=True)
+                tmp_path = f"{self.manifest_path}.tmp.{os.getpid()}"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'version': MANIFEST_VERSION, 'novels': self._novels,
+                               'failed': self._failed, 'last_run': self._last_run}, f,
+                              ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, self.manifest_path)
+                self._mtime_ns = self._file_mtime_ns()
+                self._dirty = False
+            except Exception as e:
+                print(f"❌ Error saving sync manifest: {e}")
+
+    def is_unchanged(self, dir_name: str, stat: os.stat_result) -> bool:
+        """book_info.json giống lần sync trước (chỉ so mtime + size, không đọc file)"""
+        self._ensure_loaded()
+        entry = self._novels.get(dir_name)
+        return entry is not None and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size
+
+    def matches_hash(self, dir_name: str, stat: os.stat_result, content_hash: str) -> bool:
+        """
+        book_info.json có mtime mới nhưng nội dung không đổi (copy lại, touch...):
+        cập nhật mtime trong manifest để lần sau bỏ qua bằng stat
+        """
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._novels.get(dir_name)
+            if entry is None or entry['sha256'] != content_hash:
+                return False
+            entry['mtime_ns'] = stat.st_mtime_ns
+            entry['size'] = stat.st_size
+            self._dirty = True
+            return True
+
+    def _rebuild_titles(self) -> None:
+        self._titles = {entry['title']: dir_name for dir_name, entry in self._novels.items() if entry.get('title')}
+        for dir_name, failure in self._failed.items():
+            self._titles.setdefault(failure['title'], dir_name)
+
+    def record(self, dir_name: str, stat: os.stat_result, content_hash: str, novel_id: int,
+               title: str, chapter_count: int, previous_dir_name: Optional[str] = None) -> None:
+        """Ghi nhận novel đã sync thành công"""
+        self._ensure_loaded()
+        with self._lock:
+            if previous_dir_name and previous_dir_name != dir_name:
+                self._novels.pop(previous_dir_name, None)
+                self._failed.pop(previous_dir_name, None)
+            self._failed.pop(dir_name, None)
+            self._novels[dir_name] = {
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'sha256': content_hash,
+                'novel_id': novel_id,
+                'title': title,
+                'chapters': chapter_count,
+                'synced_at': time.time(),
+            }
+            self._titles[title] = dir_name
+            self._dirty = True
+
+    def record_failure(self, dir_name: str, title: str) -> None:
+        """Ghi nhận novel sync lỗi (vẫn giữ trạng thái lần sync thành công trước nếu có)"""
+        self._ensure_loaded()
+        with self._lock:
+            self._failed[dir_name] = {'title': title, 'failed_at': time.time()}
+            self._titles.setdefault(title, dir_name)
+            self._dirty = True
+
+    def record_run(self, result: Dict) -> None:
+        """Lưu kết quả lần full sync gần nhất"""
+        self._ensure_loaded()
+        with self._lock:
+            self._last_run = {
+                key: result.get(key) for key in (
+                    'success', 'novels_total', 'novels_processed', 'novels_success', 'novels_error',
+                    'novels_unchanged', 'chapters_synced', 'duration', 'start_time', 'end_time'
+                )
+            }
+            self._dirty = True
+
+    def find_dir(self, title: str) -> Optional[str]:
+        """Thư mục novel theo title (O(1), None nếu title chưa từng được sync)"""
+        self._ensure_loaded()
+        return self._titles.get(title)
+
+    def prune(self, existing_dir_names: Iterable[str]) -> int:
+        """Bỏ các thư mục không còn trong storage"""
+        self._ensure_loaded()
+        existing = set(existing_dir_names)
+        with self._lock:
+            missing = [dir_name for dir_name in self._novels if dir_name not in existing]
+            for dir_name in missing:
+                del self._novels[dir_name]
+            missing_failed = [dir_name for dir_name in self._failed if dir_name not in existing]
+            for dir_name in missing_failed:
+                del self._failed[dir_name]
+            if missing or missing_failed:
+                self._rebuild_titles()
+                self._dirty = True
+            return len(missing)
+
+    @staticmethod
+    def chapter_fingerprint(chapter: Dict) -> List:
+        return [chapter.get('number', 0), chapter.get('title', ''), chapter.get('word_count', 0)]
+
+    def _chapters_state_path(self, dir_name: str) -> str:
+        return os.path.join(self.storage_path, dir_name, CHAPTERS_STATE_FILENAME)
+
+    def load_chapters(self, dir_name: str) -> Optional[Dict[str, List]]:
+        """Trạng thái chapters đã sync của novel: file chapter → fingerprint (None nếu chưa có)"""
+        try:
+            with open(self._chapters_state_path(dir_name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Error reading chapter sync state of {dir_name}: {e}")
+            return None
+
+    def save_chapters(self, dir_name: str, state: Dict[str, List]) -> None:
+        """Lưu trạng thái chapters đã sync của novel (file chapter → fingerprint)"""
+        path = self._chapters_state_path(dir_name)
+        try:
+            tmp_path = f"{path}.tmp.{os.getpid()}"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"❌ Error saving chapter sync state of {dir_name}: {e}")
+
+    def get_inventory(self, details: bool = False) -> Dict:
+        """
+        Inventory storage theo lần sync gần nhất
+
+        Args:
+            details: Kèm trạng thái từng novel ('synced' hoặc 'failed')
+        """
+        self._ensure_loaded()
+        with self._lock:
+            dir_names = self._novels.keys() | self._failed.keys()
+            inventory = {
+                'novels_in_storage': len(dir_names),
+                'novels_synced': len(self._novels),
+                'novels_failed': len(self._failed),
+                'last_sync': self._last_run,
+            }
+            if details:
+                inventory['novels'] = [
+                    self._novel_state(dir_name) for dir_name in sorted(dir_names)
+                ]
+        return inventory
+
+    def _novel_state(self, dir_name: str) -> Dict:
+        entry = self._novels.get(dir_name, {})
+        failure = self._failed.get(dir_name)
+        return {
+            'dir_name': dir_name,
+            'title': failure['title'] if failure else entry.get('title'),
+            'novel_id': entry.get('novel_id'),
+            'chapters': entry.get('chapters'),
+            'state': 'failed' if failure else 'synced',
+            'synced_at': entry.get('synced_at'),
+            'failed_at': failure['failed_at'] if failure else None,
+        }
+
+    def get_stats(self) -> Dict:
+        self._ensure_loaded()
+        return {'novels': len(self._novels), 'failed': len(self._failed), 'manifest_path': self.manifest_path}
+
+
+# Global instance
+sync_manifest_service = SyncManifestService()
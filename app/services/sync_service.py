@@ -1,11 +1,26 @@
 import os
-import json
-import asyncio
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 from supabase import create_client
 from app.core.config import settings
+from app.services.markdown_service import CONTENT_FORMATS, ContentService
+from app.services.book_info_service import book_info_service
+from app.services.cache_service import cache_service
+from app.services.catalog_service import catalog_service
+from app.services.chapter_index_service import chapter_index_service
+from app.services.content_search_service import content_search_service
+from app.services.navigation_service import navigation_service
+from app.services.search_service import search_service
+from app.services.storage_key_service import storage_key_service
+from app.services.sync_manifest_service import BOOK_INFO_FILENAME, sync_manifest_service
+
+
+# Số chapters mỗi request khi đọc / ghi theo batch
+SYNC_FETCH_BATCH_SIZE = 1000
+SYNC_WRITE_BATCH_SIZE = 500
 
 
 class SyncService:
@@ -15,32 +30,99 @@ class SyncService:
             settings.supabase_service_role_key
         )
         self.storage_path = Path(settings.storage_path)
+        self.content_service = ContentService()
     
-    def scan_novels_directory(self) -> List[Dict]:
-        """Quét thư mục storage/novels/ để tìm các novel"""
-        novels = []
-        
+    def list_novel_dirs(self) -> List[str]:
+        """Tên các thư mục novel trong storage (chưa đọc book_info.json)"""
         if not self.storage_path.exists():
             print(f"❌ Storage path not found: {self.storage_path}")
-            return novels
+            return []
         
-        for novel_dir in self.storage_path.iterdir():
-            if novel_dir.is_dir():
-                book_info_path = novel_dir / "book_info.json"
-                
-                if book_info_path.exists():
-                    try:
-                        with open(book_info_path, 'r', encoding='utf-8') as f:
-                            book_info = json.load(f)
-                            book_info['_storage_path'] = str(novel_dir)
-                            novels.append(book_info)
-                            print(f"✅ Found novel: {book_info.get('title', 'Unknown')}")
-                    except Exception as e:
-                        print(f"❌ Error reading {book_info_path}: {e}")
-                else:
-                    print(f"⚠️ No book_info.json found in {novel_dir}")
+        with os.scandir(self.storage_path) as entries:
+            # Bỏ qua thư mục nội bộ (.objects, ...)
+            return [entry.name for entry in entries if entry.is_dir() and not entry.name.startswith('.')]
+    
+    def read_novel_dir(self, dir_name: str, force: bool = False,
+                       include_files: Optional[Iterable[str]] = None) -> Tuple[str, Optional[Dict]]:
+        """
+        Đọc book_info.json của một thư mục novel nếu đã thay đổi từ lần sync trước
+        
+        File được đọc streaming: chỉ giữ các chapter cần sync, không giữ toàn bộ
+        danh sách chapters.
+        
+        Args:
+            force: Bỏ qua sync manifest, lấy toàn bộ chapters
+            include_files: Lấy cả các chapter có file này (file chapter vừa được ghi lại),
+                kể cả khi book_info.json không đổi
+        
+        Returns:
+            (trạng thái, book_info): trạng thái là 'changed', 'unchanged', 'missing' hoặc 'error';
+            book_info (chỉ khi 'changed') có `chapters` là các chapter cần sync và
+            `_chapter_state` là file chapter → fingerprint của toàn bộ chapters
+        """
+        include_files = set(include_files or ())
+        novel_path = os.path.join(self.storage_path, dir_name)
+        book_info_path = os.path.join(novel_path, BOOK_INFO_FILENAME)
+        try:
+            stat = os.stat(book_info_path)
+        except OSError:
+            return 'missing', None
+        
+        # Fast path: mtime + size giống lần sync trước
+        if not force and not include_files and sync_manifest_service.is_unchanged(dir_name, stat):
+            return 'unchanged', None
+        
+        try:
+            content_hash = book_info_service.hash_file(book_info_path)
+            book_info_changed = force or not sync_manifest_service.matches_hash(dir_name, stat, content_hash)
+            if not book_info_changed and not include_files:
+                return 'unchanged', None
+            
+            synced_state = None if force else sync_manifest_service.load_chapters(dir_name)
+            chapters = []
+            chapter_state = {}
+            
+            def collect(chapter: Dict) -> None:
+                fingerprint = sync_manifest_service.chapter_fingerprint(chapter)
+                filename = chapter.get('filename', '')
+                chapter_state[filename] = fingerprint
+                if (synced_state is None or synced_state.get(filename) != fingerprint or
+                        chapter.get('filename') in include_files):
+                    chapters.append(chapter)
+            
+            book_info = book_info_service.read(book_info_path, collect)
+        except Exception as e:
+            print(f"❌ Error reading {book_info_path}: {e}")
+            return 'error', None
+        
+        if not book_info_changed and not chapters:
+            return 'unchanged', None
+        
+        book_info['chapters'] = chapters
+        book_info['_storage_path'] = novel_path
+        book_info['_stat'] = stat
+        book_info['_hash'] = content_hash
+        book_info['_chapter_state'] = chapter_state
+        return 'changed', book_info
+    
+    def iter_changed_novels(self, dir_names: List[str], force: bool, counts: Dict[str, int]) -> Iterator[Dict]:
+        """
+        Đọc lần lượt book_info.json của các thư mục, chỉ yield novel đã thay đổi
         
-        return novels
+        Novel được đọc khi được lấy ra (không đọc trước toàn bộ storage);
+        counts['unchanged'] / counts['missing'] được cập nhật trong lúc duyệt.
+        """
+        for dir_name in dir_names:
+            status, book_info = self.read_novel_dir(dir_name, force)
+            if status == 'changed':
+                print(f"✅ Changed novel: {book_info.get('title', 'Unknown')} "
+                      f"({len(book_info['chapters'])}/{len(book_info['_chapter_state'])} chapters to sync)")
+                yield book_info
+            elif status == 'missing':
+                print(f"⚠️ No book_info.json found in {os.path.join(self.storage_path, dir_name)}")
+                counts['missing'] += 1
+            elif status == 'unchanged':
+                counts['unchanged'] += 1
     
     def novel_exists(self, title: str) -> Optional[Dict]:
         """Kiểm tra xem novel có tồn tại không"""
@@ -51,6 +133,48 @@ class SyncService:
             print(f"❌ Error checking novel existence: {e}")
             return None
     
+    def find_novel_dir(self, title: str) -> Optional[str]:
+        """
+        Thư mục novel theo title: tra sync manifest, nếu không có (novel chưa sync
+        lần nào, manifest vừa đổi version...) thì thử thư mục đặt theo title và thư
+        mục storage key của novel cùng title trong database
+        """
+        dir_name = sync_manifest_service.find_dir(title)
+        if dir_name:
+            return dir_name
+        
+        candidates = []
+        # Title dùng làm tên thư mục phải là một thành phần đường dẫn hợp lệ
+        if title and not title.startswith('.') and os.sep not in title and '/' not in title:
+            candidates.append(title)
+        novel = self.novel_exists(title)
+        if novel:
+            candidates.append(storage_key_service.get_key(novel['id']))
+        for dir_name in candidates:
+            if os.path.isfile(os.path.join(self.storage_path, dir_name, BOOK_INFO_FILENAME)):
+                return dir_name
+        return None
+    
+    def find_novel(self, title: str, dir_name: Optional[str] = None) -> Optional[Dict]:
+        """
+        Tìm novel của một thư mục storage: theo novel ID nếu thư mục đã đặt theo
+        storage key (title trong book_info.json có thể đã cũ sau khi đổi tên),
+        ngược lại theo title
+        """
+        novel_id = None
+        if dir_name:
+            novel_id = storage_key_service.parse_key(dir_name)
+            if novel_id is None:
+                novel_id = storage_key_service.parse_legacy_key(dir_name, title)
+        if novel_id is not None:
+            try:
+                novel = self.supabase_admin.table('novels').select('*').eq('id', novel_id).execute()
+                if novel.data:
+                    return novel.data[0]
+            except Exception as e:
+                print(f"❌ Error checking novel by storage key {dir_name}: {e}")
+        return self.novel_exists(title)
+    
     def update_novel_chapter_count(self, novel_id: str) -> None:
         """Cập nhật total_chapters count cho novel"""
         try:
@@ -80,14 +204,17 @@ class SyncService:
             
             print(f"🔄 Syncing novel: {title}")
             
+            novel_storage_path = book_info.get('_storage_path')
+            dir_name = Path(novel_storage_path).name if novel_storage_path else None
+            
             # Kiểm tra novel đã tồn tại chưa
-            existing_novel = self.novel_exists(title)
+            existing_novel = self.find_novel(title, dir_name)
             
             if existing_novel:
                 # Novel đã tồn tại, chỉ sync chapters
                 novel_id = existing_novel['id']
                 print(f"📚 Novel already exists: {title} (ID: {novel_id})")
-                print(f"🔄 Skipping novel update, only syncing chapters...")
+                print("🔄 Skipping novel update, only syncing chapters...")
                 
             else:
                 # Tạo novel mới
@@ -105,12 +232,34 @@ class SyncService:
                 
                 novel_response = self.supabase_admin.table('novels').insert(novel_data).execute()
                 novel_id = novel_response.data[0]['id']
+                search_service.upsert(novel_response.data[0])
             
-            # Sync chapters
-            self.sync_chapters(novel_id, chapters)
+            # Chuyển thư mục đặt theo title sang storage key (novel ID)
+            if dir_name:
+                dir_name = storage_key_service.adopt_directory(dir_name, novel_id)
+                novel_storage_path = str(self.storage_path / dir_name)
+                book_info['_storage_path'] = novel_storage_path
+            book_info['_novel_id'] = novel_id
             
-            # Cập nhật total_chapters count
+            # Chapter trùng nội dung (EPUB upload lại, bản mirror...) dùng chung bản render và cache
+            content_hashes = self.hash_chapters(novel_storage_path, chapters)
+            
+            # Sync chapters (thư mục novel được ghi vào chapter index)
+            all_files = list(book_info['_chapter_state']) if '_chapter_state' in book_info else [
+                chapter.get('filename', '') for chapter in chapters
+            ]
+            index_entries = self.sync_chapters(novel_id, chapters, dir_name or title, content_hashes, all_files)
+            
+            # Render sẵn variants cho các chapter mới hoặc đã thay đổi
+            self.prerender_chapters(novel_storage_path, chapters)
+            self.invalidate_chapter_content(index_entries)
+            
+            # Index nội dung các chapter mới hoặc đã thay đổi cho full-text search
+            self.index_chapter_content(index_entries)
+            
+            # Cập nhật total_chapters count (catalog snapshot build lại ở request tiếp theo)
             self.update_novel_chapter_count(novel_id)
+            catalog_service.invalidate()
             
             print(f"✅ Successfully synced novel: {title}")
             return True
@@ -119,75 +268,213 @@ class SyncService:
             print(f"❌ Error syncing novel {book_info.get('title', 'Unknown')}: {e}")
             return False
     
-    def sync_chapters(self, novel_id: str, chapters: List[Dict]) -> None:
-        """Sync chapters cho một novel"""
+    def fetch_existing_chapters(self, novel_id: str) -> List[Dict]:
+        """Lấy toàn bộ chapters của novel trong database (theo từng batch)"""
+        rows = []
+        while True:
+            response = self.supabase_admin.table('chapters').select(
+                'id, title, chapter_number, content_file, word_count'
+            ).eq('novel_id', novel_id).order('id').range(len(rows), len(rows) + SYNC_FETCH_BATCH_SIZE - 1).execute()
+            rows.extend(response.data)
+            if len(response.data) < SYNC_FETCH_BATCH_SIZE:
+                return rows
+    
+    def sync_chapters(self, novel_id: str, chapters: List[Dict], novel_dir: Optional[str] = None,
+                      content_hashes: Optional[Dict[str, str]] = None,
+                      all_files: Optional[List[str]] = None) -> List[tuple]:
+        """
+        Sync chapters cho một novel, ghi vị trí file (và hash nội dung) của từng chapter vào chapter index
+        
+        Chapters hiện có được lấy một lần rồi so sánh trong memory theo file chapter
+        (content_file), nên các chapter trùng title ("Chương 1", "Phần kết"...) vẫn là
+        các chapter riêng; chapter mới và chapter thay đổi (title, số, word_count) được
+        upsert theo batch trên UNIQUE (novel_id, content_file), nên hai lần sync chồng
+        nhau không tạo row trùng.
+        
+        Args:
+            all_files: Toàn bộ file chapter trong book_info.json; chỉ chapter trong database
+                có content_file không còn trong danh sách này mới bị xóa (xóa chapter kéo
+                theo reading progress và bookmark của nó)
+        
+        Returns:
+            Các entries đã ghi vào chapter index (chapter_id, novel_id, novel_dir, content_file, content_hash)
+        """
+        content_hashes = content_hashes or {}
+        index_entries = []
         try:
             print(f"📚 Syncing {len(chapters)} chapters for novel {novel_id}")
             
+            # Nhiều row cùng content_file (database chưa chạy add_chapters_content_file_unique.sql):
+            # chapter tạo trước được sync, các row còn lại giữ nguyên
+            existing_rows = self.fetch_existing_chapters(novel_id)
+            existing = {}
+            for row in existing_rows:
+                existing.setdefault(row['content_file'], row)
+            
+            # File trùng trong book_info.json: chapter sau ghi đè chapter trước
+            desired = {}
             for chapter_info in chapters:
-                chapter_title = chapter_info.get('title', '')
-                chapter_number = chapter_info.get('number', 0)
-                chapter_filename = chapter_info.get('filename', '')
-                chapter_word_count = chapter_info.get('word_count', 0)
-                
-                # Kiểm tra chapter đã tồn tại chưa
-                existing_chapter = self.supabase_admin.table('chapters').select('*').eq('novel_id', novel_id).eq('title', chapter_title).execute()
+                desired[chapter_info.get('filename', '')] = chapter_info
+            
+            now = datetime.now(timezone.utc).isoformat()
+            chapter_ids = {}
+            # Row mới và row thay đổi cùng một bộ cột (created_at lấy default của database
+            # cho row mới) để upsert chung một request
+            rows = []
+            created = 0
+            updated = 0
+            for chapter_filename, chapter_info in desired.items():
+                chapter_data = {
+                    'novel_id': novel_id,
+                    'title': chapter_info.get('title', ''),
+                    'chapter_number': chapter_info.get('number', 0),
+                    'content_file': chapter_filename,  # Map filename to content_file
+                    'word_count': chapter_info.get('word_count', 0),
+                    'updated_at': now
+                }
+                existing_chapter_data = existing.get(chapter_filename)
+                if existing_chapter_data is None:
+                    created += 1
+                    rows.append(chapter_data)
+                    continue
                 
-                if existing_chapter.data:
-                    # Chapter đã tồn tại, kiểm tra xem có cần update không
-                    existing_chapter_data = existing_chapter.data[0]
-                    chapter_id = existing_chapter_data['id']
-                    
-                    # Chỉ update nếu có thay đổi
-                    needs_update = (
-                        existing_chapter_data['title'] != chapter_title or
-                        existing_chapter_data['chapter_number'] != chapter_number or
-                        existing_chapter_data['content_file'] != chapter_filename or
-                        existing_chapter_data['word_count'] != chapter_word_count
-                    )
-                    
-                    if needs_update:
-                        print(f"📝 Updating chapter: {chapter_title}")
-                        update_data = {
-                            'title': chapter_title,
-                            'chapter_number': chapter_number,
-                            'content_file': chapter_filename,  # Map filename to content_file
-                            'word_count': chapter_word_count,
-                            'updated_at': datetime.now(timezone.utc).isoformat()
-                        }
-                        self.supabase_admin.table('chapters').update(update_data).eq('id', chapter_id).execute()
-                    else:
-                        print(f"✅ Chapter already up-to-date: {chapter_title}")
-                    
-                else:
-                    # Tạo chapter mới
-                    print(f"🆕 Creating chapter: {chapter_title}")
-                    
-                    chapter_data = {
-                        'novel_id': novel_id,
-                        'title': chapter_title,
-                        'chapter_number': chapter_number,
-                        'content_file': chapter_filename,  # Map filename to content_file
-                        'word_count': chapter_word_count,
-                        'created_at': datetime.now(timezone.utc).isoformat(),
-                        'updated_at': datetime.now(timezone.utc).isoformat()
-                    }
-                    
-                    self.supabase_admin.table('chapters').insert(chapter_data).execute()
-            
-            print(f"✅ Successfully synced {len(chapters)} chapters")
+                chapter_ids[chapter_filename] = existing_chapter_data['id']
+                # Chỉ update nếu có thay đổi
+                if (existing_chapter_data['chapter_number'] != chapter_data['chapter_number'] or
+                        existing_chapter_data['title'] != chapter_data['title'] or
+                        existing_chapter_data['word_count'] != chapter_data['word_count']):
+                    updated += 1
+                    rows.append(chapter_data)
+            
+            for batch in self._batches(rows):
+                chapter_response = self.supabase_admin.table('chapters').upsert(
+                    batch, on_conflict='novel_id,content_file'
+                ).execute()
+                # Row do lần sync chồng nhau tạo trước cũng trả về id thật
+                for row in chapter_response.data or []:
+                    chapter_ids[row['content_file']] = row['id']
+            
+            removed_ids = []
+            # book_info.json rỗng thường là file đang ghi dở, không xóa toàn bộ chapters
+            if all_files:
+                keep_files = set(all_files)
+                removed_ids = [row['id'] for row in existing_rows if row['content_file'] not in keep_files]
+            for batch in self._batches(removed_ids):
+                self.supabase_admin.table('chapters').delete().in_('id', batch).execute()
+            if removed_ids:
+                self.forget_chapters(novel_dir, removed_ids)
+            
+            for chapter_filename in desired:
+                chapter_id = chapter_ids.get(chapter_filename)
+                if novel_dir and chapter_id is not None and chapter_filename:
+                    index_entries.append((chapter_id, novel_id, novel_dir, chapter_filename,
+                                          content_hashes.get(chapter_filename)))
+            
+            print(f"✅ Successfully synced {len(chapters)} chapters: {created} created, "
+                  f"{updated} updated, {len(removed_ids)} removed")
             
         except Exception as e:
             print(f"❌ Error syncing chapters for novel {novel_id}: {e}")
+            # Novel không được ghi vào sync manifest, lần sync sau thử lại
+            raise
+        finally:
+            # Ghi cả khi sync lỗi giữa chừng: các chapter đã sync vẫn có vị trí đúng
+            if index_entries:
+                chapter_index_service.set_many(index_entries)
+            navigation_service.invalidate(novel_id)
+        return index_entries
+    
+    @staticmethod
+    def _batches(rows: List, size: int = SYNC_WRITE_BATCH_SIZE):
+        for start in range(0, len(rows), size):
+            yield rows[start:start + size]
+    
+    def forget_chapters(self, novel_dir: Optional[str], chapter_ids: List[int]) -> None:
+        """Bỏ chapters đã xóa khỏi chapter index, full-text index và cache"""
+        chapter_index_service.remove_many(chapter_ids)
+        if novel_dir:
+            content_search_service.remove_chapters(novel_dir, chapter_ids)
+        for chapter_id in chapter_ids:
+            cache_service.delete(f"chapter:{chapter_id}")
+    
+    def hash_chapters(self, novel_storage_path: Optional[str], chapters: List[Dict]) -> Dict[str, str]:
+        """
+        Hash nội dung các file chapter, trả về {filename: hash}
+
+        File do crawler ghi không được link vào object store (có thể bị sửa tại
+        chỗ), hash chỉ dùng để các chapter trùng nội dung dùng chung bản render
+        và cache.
+        """
+        content_hashes = {}
+        if not novel_storage_path:
+            return content_hashes
+        
+        novel_dir_name = Path(novel_storage_path).name
+        for chapter_info in chapters:
+            filename = chapter_info.get('filename')
+            if not filename:
+                continue
+            content_hash = self.content_service.get_content_hash(novel_dir_name, filename)
+            if content_hash:
+                content_hashes[filename] = content_hash
+        
+        unique = len(set(content_hashes.values()))
+        if content_hashes:
+            print(f"🔗 Content hashes: {len(content_hashes)} chapters, {unique} unique contents")
+        return content_hashes
+    
+    def invalidate_chapter_content(self, index_entries: List[tuple]) -> None:
+        """
+        Xóa cache content theo chapter ID của các chapter vừa sync (file có thể
+        đã được sửa tại chỗ); cache theo hash nội dung tự đổi key theo hash mới
+        """
+        for chapter_id, *_ in index_entries:
+            for format in CONTENT_FORMATS:
+                cache_service.delete(f"chapter_content:{chapter_id}:{format}")
     
-    def sync_all_novels(self) -> Dict:
-        """Sync tất cả novels từ storage vào database"""
+    def index_chapter_content(self, index_entries: List[tuple]) -> None:
+        """Cập nhật index nội dung (full-text search) cho các chapter vừa sync"""
+        if not settings.content_search_enabled or not index_entries:
+            return
+        
+        novel_dir = index_entries[0][2]
+        content_search_service.index_chapters(
+            novel_dir,
+            [(chapter_id, content_file, content_hash) for chapter_id, _, _, content_file, content_hash in index_entries]
+        )
+    
+    def prerender_chapters(self, novel_storage_path: Optional[str], chapters: List[Dict]) -> None:
+        """Render variants (markdown/html/gzip) cho các chapter chưa có hoặc đã cũ"""
+        if not novel_storage_path:
+            return
+        
+        novel_dir_name = Path(novel_storage_path).name
+        ready = 0
+        for chapter_info in chapters:
+            filename = chapter_info.get('filename')
+            if filename and self.content_service.ensure_variants(novel_dir_name, filename):
+                ready += 1
+        
+        print(f"🎨 Pre-rendered variants ready for {ready}/{len(chapters)} chapters")
+    
+    def sync_all_novels(self, force: bool = False,
+                        on_progress: Optional[Callable[[int, int, str], None]] = None) -> Dict:
+        """
+        Sync các novels đã thay đổi trong storage vào database
+        
+        Không gọi trực tiếp từ API/scheduler: đi qua sync_coordinator_service để
+        các lần sync không chạy chồng nhau.
+        
+        Args:
+            force: Bỏ qua sync manifest, sync lại toàn bộ novels và chapters
+            on_progress: Gọi sau mỗi novel sync xong với (số thư mục đã xử lý, tổng số thư mục, title)
+        """
         print("🚀 Starting novel sync job...")
         
         start_time = datetime.now()
-        novels = self.scan_novels_directory()
+        dir_names = self.list_novel_dirs()
         
-        if not novels:
+        if not dir_names:
             print("❌ No novels found in storage")
             return {
                 'success': False,
@@ -196,45 +483,138 @@ class SyncService:
                 'duration': 0
             }
         
-        print(f"📚 Found {len(novels)} novels to sync")
+        print(f"📚 Found {len(dir_names)} novel directories")
+        if on_progress is not None:
+            on_progress(0, len(dir_names), '')
         
+        counts = {'unchanged': 0, 'missing': 0}
         success_count = 0
         error_count = 0
+        chapters_synced = 0
+        failed_novels = []
+        present_dirs = set(dir_names)
+        concurrency = max(1, settings.sync_concurrency)
+        # Các thư mục cùng title sync tuần tự để không tạo trùng novel
+        title_locks: Dict[str, threading.Lock] = {}
         
-        for book_info in novels:
-            if self.sync_novel_to_db(book_info):
-                success_count += 1
-            else:
-                error_count += 1
+        def collect(futures) -> None:
+            nonlocal success_count, error_count, chapters_synced
+            for future in futures:
+                book_info, previous_dir_name, synced = future.result()
+                if synced:
+                    success_count += 1
+                    chapters_synced += len(book_info['chapters'])
+                    present_dirs.discard(previous_dir_name)
+                    present_dirs.add(self.record_synced_novel(book_info, previous_dir_name))
+                else:
+                    error_count += 1
+                    failed_novels.append(book_info.get('title', previous_dir_name))
+                    sync_manifest_service.record_failure(previous_dir_name, book_info.get('title', previous_dir_name))
+                if on_progress is not None:
+                    processed = success_count + error_count
+                    on_progress(processed + counts['unchanged'] + counts['missing'], len(dir_names),
+                                book_info.get('title', ''))
+        
+        # Chỉ giữ tối đa `concurrency` novel đã parse trong memory: đọc novel tiếp theo
+        # khi có novel sync xong, không đọc trước cả thư viện
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="novel-sync") as executor:
+            for book_info in self.iter_changed_novels(dir_names, force, counts):
+                if len(in_flight) >= concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                title_lock = title_locks.setdefault(book_info.get('title', ''), threading.Lock())
+                in_flight.add(executor.submit(self._sync_novel, book_info, title_lock))
+            collect(wait(in_flight).done)
+        
+        sync_manifest_service.prune(present_dirs)
+        novels_processed = success_count + error_count
         
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         
         result = {
             'success': error_count == 0,
-            'novels_processed': len(novels),
+            'novels_processed': novels_processed,
             'novels_success': success_count,
             'novels_error': error_count,
+            'novels_unchanged': counts['unchanged'],
+            'novels_total': len(dir_names) - counts['missing'],
+            'failed_novels': failed_novels,
+            'concurrency': concurrency,
+            'chapters_synced': chapters_synced,
             'duration': duration,
             'start_time': start_time.isoformat(),
             'end_time': end_time.isoformat()
         }
+        sync_manifest_service.record_run(result)
+        sync_manifest_service.save()
         
-        print(f"✅ Sync job completed:")
-        print(f"   📚 Novels processed: {len(novels)}")
+        print("✅ Sync job completed:")
+        print(f"   📚 Novels processed: {novels_processed}")
         print(f"   ✅ Success: {success_count}")
         print(f"   ❌ Errors: {error_count}")
+        print(f"   💤 Unchanged: {counts['unchanged']}")
         print(f"   ⏱️ Duration: {duration:.2f}s")
         
         return result
     
-    def sync_chapters_only(self, novel_title: str, chapters: List[Dict]) -> bool:
+    def record_synced_novel(self, book_info: Dict, previous_dir_name: str) -> str:
+        """Ghi novel vừa sync thành công vào sync manifest, trả về tên thư mục hiện tại"""
+        # Thư mục có thể vừa được đổi tên sang storage key
+        dir_name = Path(book_info['_storage_path']).name
+        sync_manifest_service.record(dir_name, book_info['_stat'], book_info['_hash'], book_info['_novel_id'],
+                                     book_info.get('title', ''), len(book_info['_chapter_state']),
+                                     previous_dir_name)
+        sync_manifest_service.save_chapters(dir_name, book_info['_chapter_state'])
+        return dir_name
+    
+    def sync_novel_directory(self, dir_name: str, changed_files: Optional[Iterable[str]] = None) -> Optional[bool]:
+        """
+        Sync một thư mục novel (storage watcher gọi khi book_info.json hoặc file chapter thay đổi)
+        
+        Args:
+            changed_files: File chapter (đường dẫn trong thư mục novel) vừa được ghi; được
+                render/index lại kể cả khi book_info.json không đổi
+        
+        Returns:
+            True/False theo kết quả sync, None nếu không có gì cần sync
+        """
+        status, book_info = self.read_novel_dir(dir_name, include_files=changed_files)
+        if status == 'unchanged':
+            return None
+        if status != 'changed':
+            return False
+        
+        if not self.sync_novel_to_db(book_info):
+            sync_manifest_service.record_failure(dir_name, book_info.get('title', dir_name))
+            sync_manifest_service.save()
+            return False
+        self.record_synced_novel(book_info, dir_name)
+        sync_manifest_service.save()
+        return True
+    
+    def _sync_novel(self, book_info: Dict, title_lock: threading.Lock) -> tuple:
+        """Sync một novel (chạy trong worker), trả về (book_info, thư mục ban đầu, thành công)"""
+        previous_dir_name = Path(book_info['_storage_path']).name
+        try:
+            with title_lock:
+                synced = self.sync_novel_to_db(book_info)
+        except Exception as e:
+            # Lỗi của một novel không dừng các novel khác
+            print(f"❌ Error syncing novel {book_info.get('title', 'Unknown')}: {e}")
+            synced = False
+        return book_info, previous_dir_name, synced
+    
+    def sync_chapters_only(self, novel_title: str, chapters: List[Dict], novel_storage_path: Optional[str] = None) -> bool:
         """Sync chỉ chapters cho novel đã tồn tại"""
         try:
             print(f"🔄 Syncing chapters only for novel: {novel_title}")
             
+            dir_name = Path(novel_storage_path).name if novel_storage_path else None
+            
             # Kiểm tra novel có tồn tại không
-            existing_novel = self.novel_exists(novel_title)
+            existing_novel = self.find_novel(novel_title, dir_name)
             if not existing_novel:
                 print(f"❌ Novel not found: {novel_title}")
                 return False
@@ -242,11 +622,28 @@ class SyncService:
             novel_id = existing_novel['id']
             print(f"📚 Found existing novel: {novel_title} (ID: {novel_id})")
             
+            # Chuyển thư mục đặt theo title sang storage key (novel ID)
+            if dir_name:
+                dir_name = storage_key_service.adopt_directory(dir_name, novel_id)
+                novel_storage_path = str(self.storage_path / dir_name)
+            
+            # Chapter trùng nội dung (EPUB upload lại, bản mirror...) dùng chung bản render và cache
+            content_hashes = self.hash_chapters(novel_storage_path, chapters)
+            
             # Sync chapters
-            self.sync_chapters(novel_id, chapters)
+            all_files = [chapter.get('filename', '') for chapter in chapters]
+            index_entries = self.sync_chapters(novel_id, chapters, dir_name or novel_title, content_hashes, all_files)
+            
+            # Render sẵn variants cho các chapter mới hoặc đã thay đổi
+            self.prerender_chapters(novel_storage_path, chapters)
+            self.invalidate_chapter_content(index_entries)
+            
+            # Index nội dung các chapter mới hoặc đã thay đổi cho full-text search
+            self.index_chapter_content(index_entries)
             
-            # Cập nhật total_chapters count
+            # Cập nhật total_chapters count (catalog snapshot build lại ở request tiếp theo)
             self.update_novel_chapter_count(novel_id)
+            catalog_service.invalidate()
             
             print(f"✅ Successfully synced chapters for novel: {novel_title}")
             return True
@@ -2,11 +2,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1 import api_router
 from app.core.config import settings
+from app.core.compression import CompressionMiddleware
+from app.core.responses import FastJSONResponse
 
 app = FastAPI(
     title="Reader Backend API",
     description="Backend API cho webapp đọc truyện với Supabase",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware
@@ -16,8 +19,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Metadata của endpoint /chapters/{id}/raw nằm trong headers
+    expose_headers=["ETag", "Last-Modified", "X-Chapter-Id", "X-Chapter-Title",
+                    "X-Chapter-Number", "X-Chapter-Prev-Id", "X-Chapter-Next-Id",
+                    "X-Novel-Id", "X-Content-Format", "X-Bundle-Count"],
 )
 
+# Nén response (thêm sau CORS nên bọc bên ngoài CORSMiddleware: nén response đã có header CORS)
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware)
+
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
 
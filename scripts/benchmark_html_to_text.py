@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark chuyển đổi HTML → text cho EPUB content:
+so sánh implementation regex cũ với HtmlTextService (regex đã compile, decode toàn bộ entities)
+
+Usage:
+    python scripts/benchmark_html_to_text.py [file.epub ...]
+
+Nếu không truyền EPUB, script tạo hai corpus tổng hợp (~30-40MB HTML mỗi corpus).
+"""
+
+import re
+import sys
+import os
+import time
+import zipfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.html_text_service import html_text_service
+
+
+def legacy_extract_text_from_html(html_content: str) -> str:
+    """Implementation cũ của EpubService._extract_text_from_html (7 lần re.sub)"""
+    html_content = re.sub(r'<script[^>]*>.*?</script>', '', html_content, flags=re.DOTALL)
+    html_content = re.sub(r'<style[^>]*>.*?</style>', '', html_content, flags=re.DOTALL)
+
+    html_content = re.sub(r'<br\s*/?>', '\n', html_content)
+    html_content = re.sub(r'<p[^>]*>', '\n', html_content)
+    html_content = re.sub(r'</p>', '\n', html_content)
+    html_content = re.sub(r'<div[^>]*>', '\n', html_content)
+    html_content = re.sub(r'</div>', '\n', html_content)
+
+    html_content = re.sub(r'<[^>]+>', '', html_content)
+
+    html_content = html_content.replace('&nbsp;', ' ')
+    html_content = html_content.replace('&amp;', '&')
+    html_content = html_content.replace('&lt;', '<')
+    html_content = html_content.replace('&gt;', '>')
+    html_content = html_content.replace('&quot;', '"')
+
+    lines = html_content.split('\n')
+    cleaned_lines = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            cleaned_lines.append(line)
+
+    return '\n\n'.join(cleaned_lines)
+
+
+# Đoạn văn dùng nhiều entities và inline tags (trường hợp xấu nhất)
+ENTITY_HEAVY_PARAGRAPH = (
+    '<p class="text">Hắn nhìn về phía xa &mdash; nơi &ldquo;<i>Thiên Đạo</i>&rdquo; '
+    'đang chờ đợi, trong lòng dâng lên một cảm giác khó tả&hellip; '
+    '<span style="color:red">Ba năm</span> trôi qua &amp; mọi thứ đã thay đổi.</p>\n'
+)
+
+# Đoạn văn UTF-8 thuần như phần lớn EPUB convert từ web novel
+PLAIN_PARAGRAPH = (
+    '<p>Hắn nhìn về phía xa — nơi “Thiên Đạo” đang chờ đợi, trong lòng dâng lên '
+    'một cảm giác khó tả… Ba năm trôi qua, mọi thứ đã thay đổi.</p>\n'
+)
+
+
+def build_synthetic_corpus(chapters: int = 1000, paragraphs: int = 150,
+                           paragraph: str = ENTITY_HEAVY_PARAGRAPH) -> list:
+    """Tạo corpus HTML giống chapter EPUB thật (tiếng Việt, entities, inline tags)"""
+    chapter = (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Chương</title>'
+        '<style>p { text-indent: 2em; }</style></head><body>\n'
+        '<h2>Chương {n}</h2>\n' + paragraph * paragraphs + '</body></html>'
+    )
+    return [chapter.replace('{n}', str(i)) for i in range(chapters)]
+
+
+def load_epub_corpus(paths: list) -> list:
+    """Đọc tất cả file (x)html trong các EPUB"""
+    corpus = []
+    for path in paths:
+        with zipfile.ZipFile(path) as epub:
+            for name in epub.namelist():
+                if name.lower().endswith(('.xhtml', '.html', '.htm')):
+                    corpus.append(epub.read(name).decode('utf-8', errors='replace'))
+    return corpus
+
+
+def run(name: str, func, corpus: list, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for document in corpus:
+            func(document)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"   {name:<28} {best:8.3f}s")
+    return best
+
+
+def benchmark(name: str, corpus: list) -> None:
+    total_bytes = sum(len(document.encode('utf-8')) for document in corpus)
+    print(f"\n📚 {name}: {len(corpus)} documents, {total_bytes / 1024 / 1024:.1f}MB")
+
+    legacy = run("legacy regex (7 passes)", legacy_extract_text_from_html, corpus)
+    current = run("HtmlTextService.to_text", html_text_service.to_text, corpus)
+    run("HtmlTextService.to_html", html_text_service.to_html, corpus)
+
+    print(f"⚡ to_text speedup vs legacy: {legacy / current:.2f}x")
+
+    # Kiểm tra entity decoding mà implementation cũ bỏ sót
+    sample = corpus[0]
+    legacy_leftover = len(re.findall(r'&[a-zA-Z]+;', legacy_extract_text_from_html(sample)))
+    current_leftover = len(re.findall(r'&[a-zA-Z]+;', html_text_service.to_text(sample)))
+    print(f"🔤 Undecoded entities in first document: legacy={legacy_leftover}, current={current_leftover}")
+
+
+def main():
+    if len(sys.argv) > 1:
+        benchmark("EPUB corpus", load_epub_corpus(sys.argv[1:]))
+        return
+
+    benchmark("Synthetic corpus (plain UTF-8)", build_synthetic_corpus(paragraph=PLAIN_PARAGRAPH))
+    benchmark("Synthetic corpus (entity-heavy)", build_synthetic_corpus())
+
+
+if __name__ == "__main__":
+    main()
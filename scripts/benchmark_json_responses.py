@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark serialize JSON cho các endpoint đọc:
+so sánh đường cũ của FastAPI (jsonable_encoder + JSONResponse, validate NovelResponse)
+với FastJSONResponse (orjson nếu đã cài) và JSON bytes lưu trong cache entry
+
+Usage:
+    python scripts/benchmark_json_responses.py [--iterations N]
+"""
+
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.core import responses
+from app.core.responses import FastJSONResponse, cached_json
+from app.schemas.novel import NovelResponse
+from app.services.cache_service import cache_service
+
+
+def build_novel(novel_id: int) -> dict:
+    """Novel giống dữ liệu trả về từ Supabase"""
+    return {
+        'id': novel_id,
+        'title': f'Ai Bảo Hắn Tu Tiên {novel_id}',
+        'author': 'Tác giả A',
+        'description': 'Mô tả chi tiết về truyện, nhân vật chính và thế giới tu tiên... ' * 5,
+        'cover_image': f'https://example.com/covers/{novel_id}.jpg',
+        'status': 'ongoing',
+        'total_chapters': 867,
+        'views': 150123,
+        'rating': 4,
+        'created_at': '2024-01-01T12:00:00+00:00',
+        'updated_at': '2024-06-01T13:00:00+00:00',
+    }
+
+
+def build_chapters_page(limit: int = 200) -> dict:
+    items = [{
+        'id': i,
+        'novel_id': 1,
+        'chapter_number': i,
+        'title': f'Chương {i}: Thiên Đạo',
+        'content_file': f'{i}.html',
+        'word_count': 3200,
+        'views': 1234,
+        'created_at': '2024-01-01T12:00:00+00:00',
+        'updated_at': None,
+    } for i in range(1, limit + 1)]
+    return {'items': items, 'total': 867, 'page': 1, 'limit': limit, 'total_pages': 5,
+            'has_next': True, 'has_prev': False, 'next_page': 2, 'prev_page': None}
+
+
+def run(name: str, func, iterations: int) -> float:
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    per_request = best / iterations * 1_000_000
+    print(f"   {name:<40} {per_request:10.1f}µs/request")
+    return per_request
+
+
+def benchmark(name: str, payload, iterations: int, model=None) -> None:
+    size = len(JSONResponse(jsonable_encoder(payload)).body)
+    print(f"\n📦 {name}: {size / 1024:.1f}KB JSON")
+
+    # Payload nằm trong cache như khi service trả kết quả từ cache_service
+    cache_service.set(f"benchmark:{name}", payload, ttl=600)
+
+    if model is not None:
+        legacy = run("response_model + jsonable_encoder", lambda: JSONResponse(
+            jsonable_encoder(model.model_validate(payload))), iterations)
+    else:
+        legacy = run("jsonable_encoder + JSONResponse", lambda: JSONResponse(jsonable_encoder(payload)), iterations)
+    run("jsonable_encoder + FastJSONResponse", lambda: FastJSONResponse(jsonable_encoder(payload)), iterations)
+    cached = run("cached JSON bytes (cache hit)", lambda: cached_json(payload, model), iterations)
+
+    print(f"⚡ cache hit speedup vs legacy: {legacy / cached:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serialize JSON cho các endpoint đọc")
+    parser.add_argument("--iterations", type=int, default=2000, help="Số request mỗi lần đo")
+    args = parser.parse_args()
+
+    print(f"JSON backend: {'orjson' if responses.orjson is not None else 'json (stdlib)'}")
+    benchmark("GET /novels/{id}", build_novel(1), args.iterations, NovelResponse)
+    benchmark("GET /novels (20 items)", {'items': [build_novel(i) for i in range(20)], 'total': 500},
+              args.iterations // 4)
+    benchmark("GET /chapters (200 items)", build_chapters_page(), args.iterations // 10)
+
+
+if __name__ == "__main__":
+    main()
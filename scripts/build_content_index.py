@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Script build index nội dung chapters (full-text search GET /novels/{id}/search)
+cho các novel đã có trong storage
+
+Danh sách chapters lấy từ chapter index (storage/.chapter_index.log, được ghi
+lúc sync/ingest) nên không cần kết nối database. Mặc định chỉ index các chapter
+mới hoặc đã thay đổi; sau đó sync/EPUB upload tự cập nhật index.
+
+Usage:
+    python scripts/build_content_index.py [--novel DIR] [--rebuild]
+"""
+
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.chapter_index_service import chapter_index_service
+from app.services.content_search_service import content_search_service
+
+
+def build_content_index(novel: str = None, rebuild: bool = False):
+    """Index nội dung chapters của tất cả novels (hoặc một novel) theo chapter index"""
+    by_novel_dir = {}
+    for chapter_id, location in sorted(chapter_index_service.entries().items()):
+        if novel and location.novel_dir != novel:
+            continue
+        by_novel_dir.setdefault(location.novel_dir, []).append(
+            (chapter_id, location.content_file, location.content_hash))
+
+    if not by_novel_dir:
+        print("Không có chapter nào trong chapter index (chạy sync trước)")
+        return
+
+    print(f"Bắt đầu index {len(by_novel_dir)} novels...")
+    total = 0
+    for novel_dir, chapters in sorted(by_novel_dir.items()):
+        print(f"Đang xử lý novel: {novel_dir} ({len(chapters)} chapters)")
+        start = time.perf_counter()
+        indexed = content_search_service.index_chapters(novel_dir, chapters, rebuild=rebuild)
+        total += indexed
+
+        stats = content_search_service.get_stats(novel_dir)
+        if stats:
+            print(f"  Index {indexed} chapters trong {time.perf_counter() - start:.1f}s: "
+                  f"{stats['chapters']} chapters, {stats['terms']} terms, "
+                  f"{stats['segments']} segments, {stats['bytes'] / 1024:.0f}KB")
+        else:
+            print("  Không index được chapter nào")
+
+    print(f"Index hoàn thành! Đã index {total} chapters")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build index nội dung chapters cho full-text search")
+    parser.add_argument("--novel", help="Chỉ index một novel (tên thư mục)")
+    parser.add_argument("--rebuild", action="store_true", help="Index lại toàn bộ thay vì chỉ chapter đã thay đổi")
+    args = parser.parse_args()
+
+    print("=== Script Build Content Index ===")
+    build_content_index(args.novel, args.rebuild)
+    print("=== Hoàn thành build index ===")
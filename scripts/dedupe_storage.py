@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Script để dedupe bản render sẵn của chapter trong storage (backend files)
+Bản render sẵn được link lại theo hash nội dung trong storage/novels/.objects/.
+File chapter (do sync/crawler ghi, có thể bị sửa tại chỗ) không được link;
+file chapter đã bị link bởi phiên bản cũ được tách thành bản copy riêng.
+Sau đó xóa các object không còn chapter nào tham chiếu.
+
+Usage:
+    python scripts/dedupe_storage.py [--gc-only]
+"""
+
+import argparse
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.content_store_service import content_store_service
+from app.services.markdown_service import ContentService
+
+
+CONTENT_EXTENSIONS = ('.html', '.md')
+
+
+def dedupe_storage():
+    """Tách file chapter khỏi object store, link bản render theo hash"""
+    novels_path = settings.storage_path
+    content_service = ContentService()
+
+    if not os.path.exists(novels_path):
+        print(f"Novels path không tồn tại: {novels_path}")
+        return
+
+    print("Bắt đầu dedupe storage...")
+
+    total = 0
+    detached = 0
+    hashes = set()
+    for novel_dir in sorted(os.listdir(novels_path)):
+        novel_path = os.path.join(novels_path, novel_dir)
+        if novel_dir.startswith('.') or not os.path.isdir(novel_path):
+            continue
+
+        files = [
+            file for file in sorted(os.listdir(novel_path))
+            if file.endswith(CONTENT_EXTENSIONS) and os.path.isfile(os.path.join(novel_path, file))
+        ]
+        for file in files:
+            if content_store_service.detach_file(os.path.join(novel_path, file)):
+                detached += 1
+            content_hash = content_service.get_content_hash(novel_dir, file)
+            if not content_hash:
+                continue
+            total += 1
+            hashes.add(content_hash)
+            # Link lại bản render theo hash (render nếu nội dung chưa từng được render)
+            content_service.render_variants(novel_dir, file)
+
+        print(f"  {novel_dir}: {len(files)} chapters")
+
+    print(f"Dedupe hoàn thành! {total} chapters, {len(hashes)} nội dung khác nhau, "
+          f"tách {detached} file chapter khỏi object store")
+
+
+def gc_storage():
+    """Xóa object không còn được tham chiếu"""
+    result = content_store_service.gc()
+    print(f"GC: xóa {result['removed']} objects, {result['rendered_removed']} bản render, "
+          f"thu hồi {result['reclaimed_bytes'] / 1024:.0f}KB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dedupe nội dung chapter theo hash")
+    parser.add_argument("--gc-only", action="store_true", help="Chỉ xóa object không còn được tham chiếu")
+    args = parser.parse_args()
+
+    if settings.storage_backend == "packed" or not settings.content_dedup:
+        print("Dedupe chỉ dùng cho STORAGE_BACKEND=files với CONTENT_DEDUP=True")
+        sys.exit(1)
+
+    print("=== Script Dedupe Storage ===")
+    if not args.gc_only:
+        dedupe_storage()
+    gc_storage()
+    print("=== Hoàn thành dedupe ===")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Script để migrate thư mục storage sang storage key (novel ID)
+Từ: storage/novels/{novel_title}/ hoặc storage/novels/{novel_id}/ (key cũ)
+Sang: storage/novels/n{novel_id}/
+
+Thư mục được ghép với các cặp (id, title) trong database: thư mục key cũ theo
+novel ID, thư mục đặt theo title theo title trong book_info.json (hoặc tên thư
+mục). Chapter index được ghi lại cho các novel đã migrate.
+
+Usage:
+    python scripts/migrate_storage_keys.py [--dry-run]
+"""
+
+import argparse
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from supabase import create_client
+from app.core.config import settings
+from app.services.chapter_index_service import chapter_index_service
+from app.services.storage_key_service import storage_key_service
+
+
+# Supabase trả tối đa 1000 rows mỗi request
+PAGE_SIZE = 1000
+
+
+def read_title(novel_path: str, dir_name: str) -> str:
+    """Title trong book_info.json, fallback về tên thư mục"""
+    try:
+        with open(os.path.join(novel_path, 'book_info.json'), 'r', encoding='utf-8') as f:
+            return json.load(f).get('title') or dir_name
+    except Exception:
+        return dir_name
+
+
+def index_chapters(supabase, novel_id: int, dir_name: str) -> int:
+    """Ghi vị trí file của tất cả chapters của novel vào chapter index"""
+    entries = []
+    while True:
+        response = (supabase.table('chapters').select('id, content_file').eq('novel_id', novel_id)
+                    .order('id').range(len(entries), len(entries) + PAGE_SIZE - 1).execute())
+        entries.extend(
+            (chapter['id'], novel_id, dir_name, chapter['content_file'])
+            for chapter in response.data
+            if chapter.get('content_file')
+        )
+        if len(response.data) < PAGE_SIZE:
+            break
+    chapter_index_service.set_many(entries)
+    return len(entries)
+
+
+def fetch_novels(supabase) -> list:
+    """Tất cả cặp (id, title) trong database"""
+    novels = []
+    while True:
+        response = (supabase.table('novels').select('id, title')
+                    .order('id').range(len(novels), len(novels) + PAGE_SIZE - 1).execute())
+        novels.extend(response.data)
+        if len(response.data) < PAGE_SIZE:
+            return novels
+
+
+def plan_moves(novels_path: str, novels: list) -> list:
+    """
+    Ghép thư mục chưa theo storage key với novel ID
+
+    - Thư mục key cũ (`{novel_id}`, title trong book_info.json khác tên thư mục)
+      thuộc đúng novel ID đó
+    - Thư mục đặt theo title thuộc novel có title đó và chưa có thư mục; title
+      trùng nhau (nhiều novel cùng title) thì bỏ qua, cần xử lý tay
+
+    Returns:
+        Danh sách (dir_name, novel_id)
+    """
+    titles_by_id = {novel['id']: novel['title'] for novel in novels}
+    ids_by_title = {}
+    for novel in novels:
+        ids_by_title.setdefault(novel['title'], []).append(novel['id'])
+
+    dir_names = sorted(
+        dir_name for dir_name in os.listdir(novels_path)
+        if not dir_name.startswith('.') and os.path.isdir(os.path.join(novels_path, dir_name))
+    )
+    # Novel đã có thư mục (key mới hoặc đã được ghép)
+    claimed = {storage_key_service.parse_key(dir_name) for dir_name in dir_names} - {None}
+    moves = []
+    title_dirs = []
+
+    for dir_name in dir_names:
+        if storage_key_service.is_key(dir_name):
+            continue
+        title = read_title(os.path.join(novels_path, dir_name), dir_name)
+        legacy_id = storage_key_service.parse_legacy_key(dir_name, title)
+        if legacy_id in titles_by_id and legacy_id not in claimed:
+            moves.append((dir_name, legacy_id))
+            claimed.add(legacy_id)
+        else:
+            title_dirs.append((dir_name, title))
+
+    for dir_name, title in title_dirs:
+        novel_ids = ids_by_title.get(title) or ids_by_title.get(dir_name) or []
+        candidates = [novel_id for novel_id in novel_ids if novel_id not in claimed]
+        if not candidates:
+            print(f"  ⚠️ Không tìm thấy novel trong database: {dir_name}")
+        elif len(candidates) > 1:
+            print(f"  ⚠️ Nhiều novel cùng title {title!r} ({', '.join(map(str, candidates))}), bỏ qua: {dir_name}")
+        else:
+            moves.append((dir_name, candidates[0]))
+            claimed.add(candidates[0])
+    return moves
+
+
+def migrate_storage_keys(dry_run: bool = False):
+    """Đổi tên các thư mục novel đặt theo title (hoặc key cũ) thành storage key"""
+    novels_path = settings.storage_path
+
+    if not os.path.exists(novels_path):
+        print(f"Novels path không tồn tại: {novels_path}")
+        return
+
+    supabase = create_client(
+        settings.supabase_url,
+        settings.supabase_service_role_key
+    )
+    novels = fetch_novels(supabase)
+
+    print("Bắt đầu migrate storage keys...")
+
+    migrated = 0
+    for dir_name, novel_id in plan_moves(novels_path, novels):
+        print(f"Đang xử lý novel: {dir_name} -> {storage_key_service.get_key(novel_id)}")
+        if dry_run:
+            continue
+
+        new_dir_name = storage_key_service.adopt_directory(dir_name, novel_id)
+        if new_dir_name == dir_name:
+            continue
+
+        indexed = index_chapters(supabase, novel_id, new_dir_name)
+        print(f"  Đã ghi {indexed} chapters vào chapter index")
+        migrated += 1
+
+    print(f"Migrate hoàn thành! {migrated} novels đã chuyển sang storage key")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate thư mục storage sang storage key (novel ID)")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ in ra các thư mục sẽ được đổi tên")
+    args = parser.parse_args()
+
+    print("=== Script Migration Storage Keys ===")
+    migrate_storage_keys(args.dry_run)
+    print("=== Hoàn thành migration ===")
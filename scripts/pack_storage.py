@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Script để migrate storage sang backend packed
+Từ: storage/novels/{novel_title}/{n}.html (mỗi chapter một file)
+Sang: storage/novels/{novel_title}/chapters.pack + chapters.idx
+
+Sau khi chạy, đặt STORAGE_BACKEND=packed để ContentService đọc từ pack.
+
+Usage:
+    python scripts/pack_storage.py [--novel TITLE] [--remove-files] [--compact] [--no-compress]
+"""
+
+import argparse
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.markdown_service import RENDERED_DIR
+from app.services.packed_store_service import PackedChapterStore, PACK_FILENAME, INDEX_FILENAME, LOCK_FILENAME
+
+
+# File trong thư mục novel không phải là nội dung chapter
+SKIP_FILES = {'book_info.json', PACK_FILENAME, INDEX_FILENAME, LOCK_FILENAME}
+CONTENT_EXTENSIONS = ('.html', '.md')
+
+
+def collect_files(novel_path: str) -> list:
+    """Liệt kê các file chapter và bản render sẵn (relative với thư mục novel)"""
+    names = []
+    for file in sorted(os.listdir(novel_path)):
+        if file in SKIP_FILES or not file.endswith(CONTENT_EXTENSIONS):
+            continue
+        if os.path.isfile(os.path.join(novel_path, file)):
+            names.append(file)
+
+    rendered_path = os.path.join(novel_path, RENDERED_DIR)
+    if os.path.isdir(rendered_path):
+        for file in sorted(os.listdir(rendered_path)):
+            if os.path.isfile(os.path.join(rendered_path, file)):
+                names.append(f"{RENDERED_DIR}/{file}")
+    return names
+
+
+def pack_novel(novel_path: str, remove_files: bool, compact: bool, compress: bool) -> None:
+    """Pack toàn bộ file chapter của một novel"""
+    store = PackedChapterStore(novel_path, compress=compress)
+    names = collect_files(novel_path)
+    packed = 0
+    skipped = 0
+    raw_bytes = 0
+
+    for name in names:
+        file_path = os.path.join(novel_path, name)
+        mtime = os.stat(file_path).st_mtime
+        entry = store.get_entry(name)
+        if entry is not None and entry.mtime >= mtime:
+            skipped += 1
+            continue
+
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        # File .gz đã nén sẵn, không nén lại
+        store.write(name, data, mtime=mtime, compress=False if name.endswith('.gz') else None)
+        raw_bytes += len(data)
+        packed += 1
+
+    print(f"  Packed {packed} file ({raw_bytes / 1024:.0f}KB), bỏ qua {skipped} file không đổi")
+
+    if compact:
+        reclaimed = store.compact()
+        print(f"  Compact: thu hồi {reclaimed / 1024:.0f}KB")
+
+    if remove_files:
+        removed = 0
+        for name in names:
+            file_path = os.path.join(novel_path, name)
+            with open(file_path, 'rb') as f:
+                if store.read(name) != f.read():
+                    print(f"    ⚠️ Nội dung trong pack khác file, giữ lại: {name}")
+                    continue
+            os.remove(file_path)
+            removed += 1
+        print(f"  Đã xóa {removed} file đã được pack")
+
+    pack_size = os.path.getsize(store.pack_path) if os.path.exists(store.pack_path) else 0
+    index_size = os.path.getsize(store.index_path) if os.path.exists(store.index_path) else 0
+    print(f"  {len(store.entries)} entries, pack {pack_size / 1024:.0f}KB, index {index_size / 1024:.0f}KB")
+    store.close()
+
+
+def pack_storage(novel: str = None, remove_files: bool = False, compact: bool = False, compress: bool = True):
+    """Pack tất cả novels (hoặc một novel) trong storage"""
+    novels_path = settings.storage_path
+
+    if not os.path.exists(novels_path):
+        print(f"Novels path không tồn tại: {novels_path}")
+        return
+
+    print("Bắt đầu pack storage...")
+
+    novel_dirs = [novel] if novel else sorted(os.listdir(novels_path))
+    for novel_dir in novel_dirs:
+        novel_path = os.path.join(novels_path, novel_dir)
+        if novel_dir.startswith('.') or not os.path.isdir(novel_path):
+            continue
+
+        print(f"Đang xử lý novel: {novel_dir}")
+        try:
+            pack_novel(novel_path, remove_files, compact, compress)
+        except Exception as e:
+            print(f"  Lỗi khi pack {novel_dir}: {e}")
+
+    print("Pack hoàn thành!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate storage sang backend packed")
+    parser.add_argument("--novel", help="Chỉ pack một novel (tên thư mục)")
+    parser.add_argument("--remove-files", action="store_true", help="Xóa file lẻ sau khi đã pack và kiểm tra")
+    parser.add_argument("--compact", action="store_true", help="Loại bỏ data bị ghi đè/xóa trong pack")
+    parser.add_argument("--no-compress", action="store_true", help="Không nén entries bằng zlib")
+    args = parser.parse_args()
+
+    print("=== Script Pack Storage ===")
+    pack_storage(args.novel, args.remove_files, args.compact, not args.no_compress)
+    print("=== Hoàn thành pack ===")
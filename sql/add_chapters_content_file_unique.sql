@@ -0,0 +1,39 @@
+-- Script để thêm UNIQUE (novel_id, content_file) vào bảng chapters
+-- Sync chapters upsert theo file chapter (on_conflict='novel_id,content_file'),
+-- chạy script này trên database tạo từ setup_supabase.sql cũ (chạy lại nhiều lần không sao)
+
+-- Gộp các chapter trùng file (do các lần sync chồng nhau trước đây): giữ row tạo trước
+-- (id nhỏ nhất), chuyển reading progress của các row trùng sang row đó
+WITH ranked AS (
+    SELECT id, MIN(id) OVER (PARTITION BY novel_id, content_file) AS keep_id
+    FROM chapters
+    WHERE novel_id IS NOT NULL
+)
+UPDATE reading_progress
+SET chapter_id = ranked.keep_id
+FROM ranked
+WHERE reading_progress.chapter_id = ranked.id
+  AND ranked.id <> ranked.keep_id;
+
+-- Xóa các row trùng (total_chapters của novel được trigger cập nhật lại)
+DELETE FROM chapters duplicate
+USING chapters kept
+WHERE duplicate.novel_id = kept.novel_id
+  AND duplicate.content_file = kept.content_file
+  AND duplicate.id > kept.id;
+
+-- Thêm constraint nếu chưa tồn tại
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'chapters_novel_id_content_file_key'
+    ) THEN
+        ALTER TABLE chapters
+            ADD CONSTRAINT chapters_novel_id_content_file_key UNIQUE (novel_id, content_file);
+
+        RAISE NOTICE 'Added UNIQUE (novel_id, content_file) to chapters table';
+    ELSE
+        RAISE NOTICE 'UNIQUE (novel_id, content_file) already exists on chapters table';
+    END IF;
+END $$;
@@ -39,7 +39,9 @@ CREATE TABLE IF NOT EXISTS chapters (
     word_count INTEGER DEFAULT 0,
     views INTEGER DEFAULT 0,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    -- Sync chapters upsert theo file chapter (on_conflict='novel_id,content_file')
+    CONSTRAINT chapters_novel_id_content_file_key UNIQUE(novel_id, content_file)
 );
 
 -- Tạo bảng reading progress (tiến độ đọc)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Unit test cho parser streaming book_info.json: kết quả giống json.load với mọi
+kích thước chunk (giá trị, số, ký tự UTF-8 bị cắt giữa hai chunk) (không cần server)
+
+    uv run pytest tests/test_book_info_service.py
+"""
+
+import hashlib
+import json
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import book_info_service as book_info_module
+from app.services.book_info_service import book_info_service
+
+BOOK_INFO = {
+    'title': 'Kiếm Lai — 剑来',
+    'author': 'Phong Hỏa Hí Chư Hầu',
+    'rating': 4.75,
+    'views': 1234567,
+    'score': -1.5e3,
+    'completed': True,
+    'cover': None,
+    'tags': ['tiên hiệp', 'kiếm', {'nested': [1, 2, {'deep': 'é😀'}]}],
+    'chapters': [
+        {'title': f'Chương {number}: "Trích dẫn" \\ ký tự', 'number': number,
+         'filename': f'chapter_{number:04d}.md', 'word_count': number * 1000 + 7}
+        for number in range(1, 40)
+    ],
+    'description': 'Sau chapters vẫn còn field 😀',
+}
+
+
+def _write(tmp_path, data, **dump_kwargs):
+    path = tmp_path / 'book_info.json'
+    if isinstance(data, (bytes, str)):
+        path.write_bytes(data if isinstance(data, bytes) else data.encode('utf-8'))
+    else:
+        path.write_text(json.dumps(data, **dump_kwargs), encoding='utf-8')
+    return str(path)
+
+
+def _read(path):
+    chapters = []
+    book_info = book_info_service.read(path, chapters.append)
+    return book_info, chapters
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 16, 64 * 1024])
+@pytest.mark.parametrize('dump_kwargs', [
+    {'ensure_ascii': False},
+    {'ensure_ascii': True},
+    {'ensure_ascii': False, 'indent': 2},
+], ids=['utf8', 'ascii', 'indent'])
+def test_matches_json_load_for_any_chunk_size(tmp_path, chunk_size, dump_kwargs):
+    path = _write(tmp_path, BOOK_INFO, **dump_kwargs)
+
+    with mock.patch.object(book_info_module, 'CHUNK_SIZE', chunk_size):
+        book_info, chapters = _read(path)
+
+    expected = dict(BOOK_INFO)
+    assert chapters == expected.pop('chapters')
+    assert book_info == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 64 * 1024])
+def test_numbers_split_across_chunks(tmp_path, chunk_size):
+    path = _write(tmp_path, '{"a": 1234567890, "b": 1.25e-3, "chapters": [], "c": -42}')
+
+    with mock.patch.object(book_info_module, 'CHUNK_SIZE', chunk_size):
+        book_info, chapters = _read(path)
+
+    assert book_info == {'a': 1234567890, 'b': 1.25e-3, 'c': -42}
+    assert chapters == []
+
+
+def test_utf8_bom_and_empty_object(tmp_path):
+    path = _write(tmp_path, b'\xef\xbb\xbf{"title": "T", "chapters": [{"number": 1}]}')
+    assert _read(path) == ({'title': 'T'}, [{'number': 1}])
+
+    path = _write(tmp_path, ' { } ')
+    assert _read(path) == ({}, [])
+
+
+def test_non_array_chapters_is_kept_as_field(tmp_path):
+    path = _write(tmp_path, {'title': 'T', 'chapters': None})
+
+    assert _read(path) == ({'title': 'T', 'chapters': None}, [])
+
+
+@pytest.mark.parametrize('content', [
+    '{"title": "T", "chapters": [{"number": 1}',
+    '{"title": "T" "author": "A"}',
+    '["not", "an", "object"]',
+    '',
+])
+def test_malformed_file_raises(tmp_path, content):
+    path = _write(tmp_path, content)
+
+    with pytest.raises(ValueError):
+        _read(path)
+
+
+def test_hash_file(tmp_path):
+    path = _write(tmp_path, BOOK_INFO)
+
+    with mock.patch.object(book_info_module, 'CHUNK_SIZE', 10):
+        digest = book_info_service.hash_file(path)
+
+    with open(path, 'rb') as f:
+        assert digest == hashlib.sha256(f.read()).hexdigest()
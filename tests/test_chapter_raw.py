@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Unit test cho GET /chapters/{id}/raw: ETag/304 và Range với backend files và
+packed (không cần server, ChapterService/Supabase được mock)
+
+    uv run pytest tests/test_chapter_raw.py
+"""
+
+import os
+import sys
+from unittest import mock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.v1 import chapters
+from app.core.auth import get_optional_user
+from app.services.chapter_service import ChapterService
+
+CHAPTER = {'id': 5, 'novel_id': 1, 'chapter_number': 5, 'title': 'Chương 5'}
+BODY = ('Nội dung chương năm. ' * 20).encode('utf-8')
+
+
+@pytest.fixture(params=['files', 'packed'])
+def client(tmp_path, request):
+    if request.param == 'files':
+        path = tmp_path / '5.md.markdown'
+        path.write_bytes(BODY)
+        variant = {'path': str(path)}
+    else:
+        variant = {'data': BODY, 'mtime': 1700000000.0}
+
+    app = FastAPI()
+    app.include_router(chapters.router, prefix='/chapters')
+    app.dependency_overrides[get_optional_user] = lambda: None
+    with mock.patch('app.services.chapter_service.create_client'), \
+            mock.patch.object(ChapterService, 'get_chapter', return_value=CHAPTER), \
+            mock.patch.object(ChapterService, 'get_chapter_variant',
+                              side_effect=lambda chapter_id, format, compressed=False: None if compressed else variant), \
+            mock.patch.object(ChapterService, 'increment_views') as increment_views, \
+            mock.patch.object(chapters.navigation_service, 'get_neighbors', return_value=(4, 6)), \
+            mock.patch.object(chapters.prefetch_service, 'on_chapter_served'):
+        test_client = TestClient(app)
+        test_client.increment_views = increment_views
+        yield test_client
+
+
+def test_full_response_and_etag(client):
+    response = client.get('/chapters/5/raw')
+    assert response.status_code == 200
+    assert response.content == BODY
+    assert response.headers['x-chapter-prev-id'] == '4'
+    assert response.headers['x-chapter-next-id'] == '6'
+    assert response.headers['accept-ranges'] == 'bytes'
+    assert client.increment_views.call_count == 1
+
+    etag = response.headers['etag']
+    not_modified = client.get('/chapters/5/raw', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b''
+
+
+@pytest.mark.parametrize('range_header, expected', [
+    ('bytes=0-9', BODY[0:10]),
+    ('bytes=10-', BODY[10:]),
+    ('bytes=-5', BODY[-5:]),
+    ('bytes=20-100000', BODY[20:]),
+])
+def test_range(client, range_header, expected):
+    response = client.get('/chapters/5/raw', headers={'Range': range_header})
+    assert response.status_code == 206
+    assert response.content == expected
+    start = BODY.index(expected) if range_header != 'bytes=-5' else len(BODY) - 5
+    assert response.headers['content-range'] == f'bytes {start}-{start + len(expected) - 1}/{len(BODY)}'
+    # Request Range tiếp theo không tính thêm lượt xem
+    assert client.increment_views.call_count == 0
+
+
+def test_unsatisfiable_range(client):
+    response = client.get('/chapters/5/raw', headers={'Range': f'bytes={len(BODY)}-'})
+    assert response.status_code == 416
+    assert response.headers['content-range'] == f'bytes */{len(BODY)}'
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Unit test cho ContentSearchService (không cần server)
+
+    uv run pytest tests/test_content_search.py
+"""
+
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.services.content_search_service as content_search
+from app.services.content_search_service import (
+    ContentSearchService, _Segment, decode_varints, encode_varints,
+)
+
+NOVEL_DIR = 'n1'
+
+
+def _make_service(storage_path) -> ContentSearchService:
+    service = ContentSearchService()
+    service.storage_path = str(storage_path)
+    service.content_service.storage_path = str(storage_path)
+    return service
+
+
+def _write_chapter(storage_path, chapter_id: int, text: str) -> str:
+    content_file = f'chapter_{chapter_id:04d}.md'
+    novel_path = os.path.join(str(storage_path), NOVEL_DIR)
+    os.makedirs(novel_path, exist_ok=True)
+    with open(os.path.join(novel_path, content_file), 'w', encoding='utf-8') as f:
+        f.write(text)
+    return content_file
+
+
+def test_varint_round_trip():
+    values = [0, 1, 127, 128, 255, 300, 16383, 16384, 2 ** 31, 2 ** 40 + 7]
+    out = bytearray()
+    encode_varints(values, out)
+    # Số < 128 chiếm một byte
+    assert out[:2] == bytes([0, 1])
+    assert decode_varints(bytes(out)) == values
+
+
+def test_segment_postings_delta(tmp_path):
+    path = str(tmp_path / 'seg-1.idx')
+    _Segment.write(path, [
+        (10, 'kiếm khách rút kiếm'),
+        (11, 'không có gì'),
+        (12, 'Kiếm pháp'),
+    ])
+    segment = _Segment(path)
+    assert segment.doc_ids == [10, 11, 12]
+    # doc mã hóa delta được cộng dồn lại; tf và vị trí ký tự đầu tiên giữ nguyên
+    assert segment.postings('kiem') == [(0, 2, 0), (2, 1, 0)]
+    assert segment.postings('khach') == [(0, 1, 5)]
+    assert segment.postings('missing') == []
+    assert segment.text(1) == 'không có gì'
+
+
+def test_index_merge_and_remove(tmp_path, monkeypatch):
+    monkeypatch.setattr(content_search, 'MAX_SEGMENTS', 2)
+    service = _make_service(tmp_path)
+    for chapter_id in range(1, 5):
+        content_file = _write_chapter(tmp_path, chapter_id, f'Chương {chapter_id}: rồng và kiếm số{chapter_id}')
+        assert service.index_chapters(NOVEL_DIR, [(chapter_id, content_file, f'hash-{chapter_id}')]) == 1
+
+    # Segment thứ 3 vượt MAX_SEGMENTS: gộp lại, segment cũ bị xóa khỏi đĩa
+    stats = service.get_stats(NOVEL_DIR)
+    assert stats['chapters'] == 4
+    assert stats['segments'] <= 2
+    index_dir = os.path.join(str(tmp_path), NOVEL_DIR, content_search.INDEX_DIR)
+    manifest = service._read_manifest(NOVEL_DIR)
+    assert sorted(name for name in os.listdir(index_dir) if name.endswith('.idx')) == sorted(manifest['segments'])
+
+    result = service.search(NOVEL_DIR, 'rong kiem')
+    assert sorted(item['chapter_id'] for item in result['items']) == [1, 2, 3, 4]
+    assert service.search(NOVEL_DIR, 'số3')['items'][0]['chapter_id'] == 3
+
+    # Chapter đổi nội dung: bản mới thay bản cũ
+    content_file = _write_chapter(tmp_path, 2, 'Chương 2: phượng hoàng')
+    service.index_chapters(NOVEL_DIR, [(2, content_file, 'hash-2b')])
+    assert [item['chapter_id'] for item in service.search(NOVEL_DIR, 'phuong hoang')['items']] == [2]
+    assert sorted(item['chapter_id'] for item in service.search(NOVEL_DIR, 'rong')['items']) == [1, 3, 4]
+
+    service.remove_chapters(NOVEL_DIR, [1, 3])
+    assert [item['chapter_id'] for item in service.search(NOVEL_DIR, 'rong')['items']] == [4]
+    assert service.get_stats(NOVEL_DIR)['chapters'] == 2
+
+
+def _index_range(storage_path: str, start: int, count: int) -> None:
+    content_search.MAX_SEGMENTS = 3
+    service = _make_service(storage_path)
+    for chapter_id in range(start, start + count):
+        content_file = f'chapter_{chapter_id:04d}.md'
+        service.index_chapters(NOVEL_DIR, [(chapter_id, content_file, f'hash-{chapter_id}')])
+
+
+def test_concurrent_index_from_processes(tmp_path):
+    for chapter_id in range(1, 41):
+        _write_chapter(tmp_path, chapter_id, f'Chương {chapter_id} chung')
+    processes = [
+        multiprocessing.Process(target=_index_range, args=(str(tmp_path), 1 + n * 10, 10))
+        for n in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    # Không process nào mất chapter hay segment của process khác
+    service = _make_service(tmp_path)
+    result = service.search(NOVEL_DIR, 'chung', limit=100)
+    assert sorted(item['chapter_id'] for item in result['items']) == list(range(1, 41))
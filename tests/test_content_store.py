@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Unit test cho content store (object theo hash, hard link) và gc (không cần server)
+
+    uv run pytest tests/test_content_store.py
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.content_store_service import ContentStoreService, GC_MIN_AGE_SECONDS
+
+
+@pytest.fixture
+def store(tmp_path):
+    service = ContentStoreService()
+    service.storage_path = str(tmp_path)
+    service.objects_path = str(tmp_path / '.objects')
+    return service
+
+
+def _age(path):
+    old = time.time() - GC_MIN_AGE_SECONDS - 60
+    os.utime(path, (old, old))
+
+
+def test_store_file_links_same_content_once(store, tmp_path):
+    digest = store.store_file(str(tmp_path / 'a' / 'chapter_0001.md'), b'# Chapter 1')
+    same = store.store_file(str(tmp_path / 'b' / 'chapter_0001.md'), b'# Chapter 1')
+
+    assert same == digest
+    assert store.refcount(digest) == 2
+
+
+def test_gc_removes_unreferenced_object_and_keeps_linked(store, tmp_path):
+    kept = store.store_file(str(tmp_path / 'a' / 'chapter_0001.md'), b'kept')
+    dropped_path = tmp_path / 'a' / 'chapter_0002.md'
+    dropped = store.store_file(str(dropped_path), b'dropped')
+    os.remove(dropped_path)
+    _age(store.object_path(kept))
+    _age(store.object_path(dropped))
+
+    result = store.gc()
+
+    assert result['removed'] == 1
+    assert os.path.exists(store.object_path(kept))
+    assert not os.path.exists(store.object_path(dropped))
+
+
+def test_gc_collects_rendered_object_without_source_object(store, tmp_path):
+    # Bản render của file sync: không có object nguồn trong store
+    digest = store.hash_bytes(b'sync content')
+    rendered = store.store_rendered(digest, 'html', False, b'<p>sync content</p>')
+    linked_dest = str(tmp_path / 'novel' / '.rendered' / 'chapter_0001.md.html')
+    store.link_rendered(digest, 'html', False, linked_dest)
+    _age(rendered)
+
+    # Còn link trong .rendered/ của novel -> giữ lại
+    assert store.gc()['rendered_removed'] == 0
+    assert os.path.exists(rendered)
+
+    # File bị sửa tại chỗ, bản render cũ bị thay -> object render bị thu hồi
+    os.remove(linked_dest)
+    result = store.gc()
+
+    assert result['rendered_removed'] == 1
+    assert result['reclaimed_bytes'] == len(b'<p>sync content</p>')
+    assert not os.path.exists(rendered)
+
+
+def test_gc_skips_recent_and_temporary_files(store):
+    digest = store.hash_bytes(b'fresh')
+    rendered = store.store_rendered(digest, 'txt', False, b'fresh')
+    tmp_file = rendered + '.tmp.1.1'
+    with open(tmp_file, 'wb') as f:
+        f.write(b'partial')
+    _age(tmp_file)
+
+    result = store.gc()
+
+    assert result['rendered_removed'] == 0
+    assert os.path.exists(rendered)
+    assert os.path.exists(tmp_file)
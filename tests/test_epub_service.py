@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Unit test cho EpubService: TOC (NCX, nav), #fragment và spine (không cần server)
+
+    uv run pytest tests/test_epub_service.py
+"""
+
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.epub_service import EpubService
+
+CONTAINER = '''<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>'''
+
+OPF = '''<?xml version="1.0"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:title>Truyện thử</dc:title><dc:creator>Tác giả</dc:creator>
+  </metadata>
+  <manifest>
+    {toc_items}
+    <item id="c1" href="text/ch%201.xhtml" media-type="application/xhtml+xml"/>
+    <item id="c2" href="text/ch2.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+  <spine>
+    <itemref idref="c1"/><itemref idref="c2"/>
+  </spine>
+</package>'''
+
+NCX_ITEM = '<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>'
+NCX = '''<?xml version="1.0"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/">
+  <navMap>
+    <navPoint id="p1"><navLabel><text>Chương 1</text></navLabel><content src="text/ch%201.xhtml"/>
+      <navPoint id="p2"><navLabel><text>Chương 2</text></navLabel><content src="text/ch%201.xhtml#s2"/></navPoint>
+      <navPoint id="p2b"><navLabel><text>Chương 2 (lặp)</text></navLabel><content src="text/ch%201.xhtml#s2"/></navPoint>
+    </navPoint>
+    <navPoint id="p3"><navLabel><text>Chương 3</text></navLabel><content src="text/ch2.xhtml"/></navPoint>
+  </navMap>
+</ncx>'''
+
+NAV_ITEM = '<item id="nav" href="nav/nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>'
+NAV = '''<?xml version="1.0"?>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
+  <body><nav epub:type="toc"><ol>
+    <li><a href="../text/ch%201.xhtml">Một</a></li>
+    <li><a href="../text/ch%201.xhtml#s2">Hai</a></li>
+    <li><a href="../text/ch2.xhtml"><span>Ba</span></a></li>
+  </ol></nav></body>
+</html>'''
+
+CH1 = '''<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Sách</title></head><body>
+<h1>Mở đầu</h1><p>Đoạn một.</p>
+<h2 id="s2">Phần hai</h2><p>Đoạn&nbsp;hai.</p>
+</body></html>'''
+CH2 = '''<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Tiêu đề ch2</title></head><body>
+<p>Đoạn ba.</p></body></html>'''
+
+
+def _make_epub(path, toc_items='', extra=None):
+    with zipfile.ZipFile(path, 'w') as epub:
+        epub.writestr('mimetype', 'application/epub+zip')
+        epub.writestr('META-INF/container.xml', CONTAINER)
+        epub.writestr('OEBPS/content.opf', OPF.format(toc_items=toc_items))
+        epub.writestr('OEBPS/text/ch 1.xhtml', CH1)
+        epub.writestr('OEBPS/text/ch2.xhtml', CH2)
+        for name, content in (extra or {}).items():
+            epub.writestr(name, content)
+    return str(path)
+
+
+def _contents(service, path, info):
+    return [service.extract_chapter_content(path, chapter) for chapter in info['chapters']]
+
+
+def test_ncx_fragments_split_document(tmp_path):
+    service = EpubService()
+    path = _make_epub(tmp_path / 'a.epub', NCX_ITEM, {'OEBPS/toc.ncx': NCX})
+    info = service.extract_epub_info(path)
+
+    # Entry trùng (path, fragment) bị bỏ, entry khác fragment là chapter riêng
+    assert [chapter['title'] for chapter in info['chapters']] == ['Chương 1', 'Chương 2', 'Chương 3']
+    assert info['chapters'][0]['path'] == 'OEBPS/text/ch 1.xhtml'
+    assert info['chapters'][0]['end_fragment'] == 's2'
+    assert info['chapters'][1]['fragment'] == 's2'
+
+    first, second, third = _contents(service, path, info)
+    assert 'Đoạn một.' in first and 'Đoạn' in first and 'hai' not in first
+    assert second.startswith('Phần hai') and 'Đoạn một' not in second
+    assert third == 'Đoạn ba.'
+
+
+def test_nav_document(tmp_path):
+    service = EpubService()
+    path = _make_epub(tmp_path / 'b.epub', NAV_ITEM, {'OEBPS/nav/nav.xhtml': NAV})
+    info = service.extract_epub_info(path)
+
+    assert [chapter['title'] for chapter in info['chapters']] == ['Một', 'Hai', 'Ba']
+    assert [chapter['path'] for chapter in info['chapters']] == [
+        'OEBPS/text/ch 1.xhtml', 'OEBPS/text/ch 1.xhtml', 'OEBPS/text/ch2.xhtml'
+    ]
+    html = service.extract_chapter_content(path, info['chapters'][1], as_html=True)
+    assert html.startswith('<p>Phần hai</p>')
+
+
+def test_spine_fallback_titles(tmp_path):
+    service = EpubService()
+    path = _make_epub(tmp_path / 'c.epub')
+    info = service.extract_epub_info(path)
+
+    # Heading đầu tiên, không có heading thì <title>
+    assert [chapter['title'] for chapter in info['chapters']] == ['Mở đầu', 'Tiêu đề ch2']
+    assert info['title'] == 'Truyện thử'
+    assert 'Phần hai' in service.extract_chapter_content(path, info['chapters'][0])
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Unit test cho HtmlTextService (không cần server)
+
+    uv run pytest tests/test_html_text_service.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.html_text_service import decode_entities, html_text_service, normalize_whitespace
+
+DOCUMENT = '''<?xml version="1.0"?><!DOCTYPE html>
+<html><head><title>Bỏ qua</title><style>p { color: red }</style></head>
+<BODY>
+<h1>Chương&nbsp;1</h1>
+<!-- ghi chú -->
+<p class="x">Xin   chào,<br/>thế&nbsp;giới &amp; <b>bạn</b> &hellip;</p>
+<script>var a = "<p>không</p>";</script>
+<div><span>Đoạn   &#8220;cuối&#8221;</span></div>
+</BODY></html>'''
+
+
+def test_to_text_paragraphs():
+    assert html_text_service.to_text(DOCUMENT).split('\n\n') == [
+        'Chương 1',
+        'Xin chào,',
+        'thế giới & bạn …',
+        'Đoạn “cuối”',
+    ]
+
+
+def test_to_text_has_no_nbsp():
+    text = html_text_service.to_text('<p>a&nbsp;&nbsp;b\xa0c</p>')
+    assert text == 'a b c'
+
+
+def test_to_html_keeps_safe_inline_tags():
+    html = html_text_service.to_html(
+        '<p onclick="x()">Một <b class="y">đậm <i>nghiêng</b> &lt;script&gt;</p><p><a href="#">liên kết</a></p>'
+    )
+    assert html.split('\n') == [
+        '<p>Một <b>đậm <i>nghiêng</i></b> &lt;script&gt;</p>',
+        '<p>liên kết</p>',
+    ]
+
+
+def test_decode_entities_and_whitespace():
+    assert decode_entities('a &amp;amp; b') == 'a &amp; b'
+    assert decode_entities('&eacute;&#x41;&quot;') == 'éA"'
+    assert decode_entities('không có') == 'không có'
+    assert normalize_whitespace('a\n\t b   c') == 'a b c'
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Unit test cho PackedChapterStore (không cần server)
+
+    uv run pytest tests/test_packed_store.py
+"""
+
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.packed_store_service import PackedChapterStore, FLAG_COMPRESSED
+
+
+def test_write_read_round_trip(tmp_path):
+    store = PackedChapterStore(str(tmp_path))
+    text = ("Chương 1: Khởi đầu\n" * 200).encode('utf-8')
+    store.write('chapter_0001.md', text, mtime=123.5)
+    store.write('chapter_0002.md', b'short')
+
+    assert store.read('chapter_0001.md') == text
+    assert store.read('chapter_0002.md') == b'short'
+    assert store.read('missing.md') is None
+    # Nội dung lặp lại được nén, nội dung ngắn giữ nguyên
+    assert store.get_entry('chapter_0001.md').flags & FLAG_COMPRESSED
+    assert not store.get_entry('chapter_0002.md').flags & FLAG_COMPRESSED
+    assert store.get_entry('chapter_0001.md').mtime == 123.5
+
+    # Mở lại từ đĩa
+    store.close()
+    reopened = PackedChapterStore(str(tmp_path))
+    assert reopened.read('chapter_0001.md') == text
+    assert sorted(reopened.names()) == ['chapter_0001.md', 'chapter_0002.md']
+    reopened.close()
+
+
+def test_overwrite_and_delete(tmp_path):
+    store = PackedChapterStore(str(tmp_path))
+    store.write('a.md', b'v1')
+    store.write('a.md', b'v2')
+    store.write('b.md', b'b')
+    assert store.read('a.md') == b'v2'
+    assert store.delete('b.md') is True
+    assert store.delete('b.md') is False
+    store.close()
+
+    reopened = PackedChapterStore(str(tmp_path))
+    assert reopened.read('a.md') == b'v2'
+    assert reopened.read('b.md') is None
+    reopened.close()
+
+
+def test_compact_keeps_live_entries(tmp_path):
+    store = PackedChapterStore(str(tmp_path), compress=False)
+    for i in range(10):
+        store.write(f'{i}.md', f'old {i}'.encode() * 50)
+    for i in range(5):
+        store.write(f'{i}.md', f'new {i}'.encode())
+    store.delete('9.md')
+
+    reclaimed = store.compact()
+    assert reclaimed > 0
+    for i in range(5):
+        assert store.read(f'{i}.md') == f'new {i}'.encode()
+    for i in range(5, 9):
+        assert store.read(f'{i}.md') == f'old {i}'.encode() * 50
+    assert store.read('9.md') is None
+
+    # Ghi tiếp sau compact vẫn đúng offset
+    store.write('10.md', b'after compact')
+    store.close()
+    reopened = PackedChapterStore(str(tmp_path))
+    assert reopened.read('10.md') == b'after compact'
+    assert reopened.read('0.md') == b'new 0'
+    reopened.close()
+
+
+def test_other_store_sees_compact_and_appends(tmp_path):
+    """Hai store trên cùng thư mục mô phỏng hai process"""
+    writer = PackedChapterStore(str(tmp_path), compress=False)
+    reader = PackedChapterStore(str(tmp_path), compress=False)
+    writer.write('a.md', b'a' * 100)
+    writer.write('a.md', b'A')
+    writer.write('b.md', b'b' * 100)
+    assert reader.read('b.md') == b'b' * 100
+
+    writer.compact()
+    # reader còn giữ index cũ: vẫn đọc đúng qua fd của pack cũ
+    assert reader.read('a.md') == b'A'
+    # Entry mới sau compact: reader thấy index mới, mở lại pack
+    writer.write('c.md', b'c')
+    assert reader.read('c.md') == b'c'
+    assert reader.read('a.md') == b'A'
+    assert reader.read('b.md') == b'b' * 100
+
+    # reader ghi sau khi writer compact: offset lấy từ pack mới
+    reader.write('d.md', b'd' * 10)
+    assert writer.read('d.md') == b'd' * 10
+    assert writer.read('c.md') == b'c'
+    writer.close()
+    reader.close()
+
+
+def _append_many(novel_dir: str, prefix: str, count: int) -> None:
+    store = PackedChapterStore(novel_dir, compress=False)
+    for i in range(count):
+        store.write(f'{prefix}-{i}.md', f'{prefix}:{i}:'.encode() * (i % 7 + 1))
+    store.close()
+
+
+def test_concurrent_appends_from_processes(tmp_path):
+    novel_dir = str(tmp_path)
+    processes = [
+        multiprocessing.Process(target=_append_many, args=(novel_dir, f'p{n}', 100))
+        for n in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    store = PackedChapterStore(novel_dir, compress=False)
+    assert len(store.entries) == 400
+    for n in range(4):
+        for i in range(100):
+            assert store.read(f'p{n}-{i}.md') == f'p{n}:{i}:'.encode() * (i % 7 + 1)
+    store.close()
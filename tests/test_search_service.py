@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Unit test cho search index novel: build lại ở background không làm mất
+upsert/remove đến trong lúc build (không cần server, Supabase được mock)
+
+    uv run pytest tests/test_search_service.py
+"""
+
+import os
+import sys
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.search_service import SearchService
+
+
+def _novel(novel_id, title, author='Tác giả'):
+    return {'id': novel_id, 'title': title, 'author': author, 'description': ''}
+
+
+def _service_with_db(get_all_novels):
+    service = SearchService()
+    supabase = mock.Mock()
+    supabase.get_all_novels.side_effect = get_all_novels
+    service._supabase_service = supabase
+    return service
+
+
+def _ids(service, query):
+    return [item['id'] for item in service.search(query)['items']]
+
+
+def test_changes_during_rebuild_are_replayed():
+    service = _service_with_db(lambda: [_novel(1, 'Kiếm Lai'), _novel(2, 'Phàm Nhân Tu Tiên')])
+    assert service.ensure_loaded()
+
+    def stale_snapshot():
+        # Các thay đổi đến sau khi database trả về dữ liệu nhưng trước khi thay index
+        service.upsert(_novel(1, 'Tuyết Trung Hãn Đao Hành'))
+        service.upsert(_novel(3, 'Đấu Phá Thương Khung'))
+        service.remove(2)
+        return [_novel(1, 'Kiếm Lai'), _novel(2, 'Phàm Nhân Tu Tiên')]
+
+    service._supabase_service.get_all_novels.side_effect = stale_snapshot
+    assert service._load()
+
+    assert _ids(service, 'tuyet trung') == [1]
+    assert _ids(service, 'kiem lai') == []
+    assert _ids(service, 'dau pha') == [3]
+    assert _ids(service, 'pham nhan') == []
+    assert service._pending_changes is None
+
+
+def test_failed_rebuild_stops_recording():
+    service = _service_with_db(lambda: [_novel(1, 'Kiếm Lai')])
+    assert service.ensure_loaded()
+
+    service._supabase_service.get_all_novels.side_effect = RuntimeError('db down')
+    assert not service._load()
+    assert service._pending_changes is None
+
+    # Index cũ vẫn dùng được và vẫn nhận cập nhật
+    service.upsert(_novel(2, 'Đấu Phá Thương Khung'))
+    assert _ids(service, 'dau pha') == [2]
+    assert _ids(service, 'kiem lai') == [1]
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Unit test cho sync chapters: so sánh theo file chapter, upsert chung chapter
+mới/thay đổi theo (novel_id, content_file), batch và xóa chapter không còn
+trong book_info.json (không cần server, Supabase được mock)
+
+    uv run pytest tests/test_sync_chapters.py
+"""
+
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import sync_service as sync_module
+from app.services.sync_service import sync_service
+
+NOVEL_ID = 7
+NOVEL_DIR = f'n{NOVEL_ID}'
+
+
+class FakeChaptersTable:
+    """Bảng chapters trong memory, ghi lại các request upsert/delete"""
+
+    def __init__(self, existing):
+        self.rows = {row['content_file']: dict(row) for row in existing}
+        self.next_id = 1000
+        self.upserts = []
+        self.deleted = []
+
+    def upsert(self, batch, on_conflict=''):
+        self.upserts.append((list(batch), on_conflict))
+        returned = []
+        for row in batch:
+            # UNIQUE (novel_id, content_file): row đã có (kể cả do lần sync khác tạo) được update
+            stored = self.rows.get(row['content_file'])
+            if stored is None:
+                self.next_id += 1
+                stored = self.rows[row['content_file']] = {'id': self.next_id}
+            stored.update(row)
+            returned.append(dict(stored))
+        return mock.Mock(execute=mock.Mock(return_value=mock.Mock(data=returned)))
+
+    def delete(self):
+        table = self
+
+        class Delete:
+            def in_(self, column, ids):
+                table.deleted.append(list(ids))
+                return mock.Mock(execute=mock.Mock(return_value=mock.Mock(data=[])))
+        return Delete()
+
+
+def _chapter(number, filename=None, title=None, word_count=100):
+    return {'number': number, 'title': title or f'Chương {number}',
+            'filename': filename or f'chapter_{number:04d}.md', 'word_count': word_count}
+
+
+def _row(chapter_id, number, filename=None, title=None, word_count=100):
+    return {'id': chapter_id, 'chapter_number': number, 'title': title or f'Chương {number}',
+            'content_file': filename or f'chapter_{number:04d}.md', 'word_count': word_count}
+
+
+@pytest.fixture
+def db():
+    def run(existing, chapters, all_files=None, table=None):
+        table = table or FakeChaptersTable(existing)
+        supabase_admin = mock.Mock()
+        supabase_admin.table.return_value = table
+        with mock.patch.object(sync_service, 'supabase_admin', supabase_admin), \
+                mock.patch.object(sync_service, 'fetch_existing_chapters', return_value=existing), \
+                mock.patch.object(sync_service, 'forget_chapters') as forget, \
+                mock.patch.object(sync_module.chapter_index_service, 'set_many') as set_many, \
+                mock.patch.object(sync_module.navigation_service, 'invalidate'):
+            entries = sync_service.sync_chapters(NOVEL_ID, chapters, NOVEL_DIR, {}, all_files)
+        return table, entries, forget, set_many
+    return run
+
+
+def test_unchanged_chapters_send_no_writes(db):
+    existing = [_row(1, 1), _row(2, 2)]
+    table, entries, forget, set_many = db(existing, [_chapter(1), _chapter(2)], ['chapter_0001.md', 'chapter_0002.md'])
+
+    assert table.upserts == []
+    assert table.deleted == []
+    assert [entry[0] for entry in entries] == [1, 2]
+    set_many.assert_called_once_with(entries)
+    forget.assert_not_called()
+
+
+def test_new_and_changed_rows_share_one_upsert(db):
+    existing = [_row(1, 1), _row(2, 2, title='Cũ')]
+    chapters = [_chapter(1), _chapter(2, title='Mới'), _chapter(3)]
+    table, entries, _, _ = db(existing, chapters)
+
+    assert len(table.upserts) == 1
+    batch, on_conflict = table.upserts[0]
+    assert on_conflict == 'novel_id,content_file'
+    assert [row['content_file'] for row in batch] == ['chapter_0002.md', 'chapter_0003.md']
+    # Cùng bộ cột cho row mới và row thay đổi, không gửi id
+    assert len({tuple(sorted(row)) for row in batch}) == 1
+    assert 'id' not in batch[0]
+    assert table.rows['chapter_0002.md']['title'] == 'Mới'
+    assert {entry[3]: entry[0] for entry in entries} == {
+        'chapter_0001.md': 1, 'chapter_0002.md': 2, 'chapter_0003.md': 1001}
+
+
+def test_same_titles_are_separate_chapters(db):
+    chapters = [_chapter(1, 'vol1_0001.md', 'Chương 1'), _chapter(2, 'vol2_0001.md', 'Chương 1')]
+    table, entries, _, _ = db([], chapters)
+
+    assert len(table.rows) == 2
+    assert len({entry[0] for entry in entries}) == 2
+
+
+def test_overlapping_sync_updates_instead_of_duplicating(db):
+    # Lần sync khác đã tạo row sau khi lần này đọc chapters hiện có
+    table = FakeChaptersTable([])
+    table.rows['chapter_0001.md'] = _row(555, 1)
+    table, entries, _, _ = db([], [_chapter(1)], table=table)
+
+    assert len(table.rows) == 1
+    assert entries[0][0] == 555
+
+
+def test_writes_are_batched(db):
+    chapters = [_chapter(number) for number in range(1, sync_module.SYNC_WRITE_BATCH_SIZE + 3)]
+    table, entries, _, _ = db([], chapters)
+
+    assert [len(batch) for batch, _ in table.upserts] == [sync_module.SYNC_WRITE_BATCH_SIZE, 2]
+    assert len(entries) == len(chapters)
+
+
+def test_removes_only_files_missing_from_book_info(db):
+    existing = [_row(1, 1), _row(2, 2), _row(3, 3)]
+    table, entries, forget, _ = db(existing, [_chapter(1), _chapter(3)], ['chapter_0001.md', 'chapter_0003.md'])
+
+    assert table.deleted == [[2]]
+    forget.assert_called_once_with(NOVEL_DIR, [2])
+    assert [entry[0] for entry in entries] == [1, 3]
+
+
+def test_empty_book_info_deletes_nothing(db):
+    table, entries, forget, _ = db([_row(1, 1)], [], [])
+
+    assert table.deleted == []
+    assert entries == []
+    forget.assert_not_called()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Unit test cho sync coordinator: gộp request full sync, job lock, đọc lại
+manifest/index khi giữ lock (không cần server, sync_all_novels được mock)
+
+    uv run pytest tests/test_sync_coordinator.py
+"""
+
+import os
+import sys
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import sync_coordinator_service as coordinator_module
+from app.services.chapter_index_service import chapter_index_service
+from app.services.sync_coordinator_service import JOB_LOCK_FILENAME, SyncCoordinatorService
+from app.services.sync_manifest_service import sync_manifest_service
+from app.services.sync_service import sync_service
+
+
+@pytest.fixture
+def coordinator(tmp_path):
+    service = SyncCoordinatorService()
+    service.storage_path = str(tmp_path)
+    with mock.patch.object(sync_manifest_service, 'reload'), \
+            mock.patch.object(chapter_index_service, 'reload'):
+        yield service
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_requests_merge_into_queued_job(coordinator):
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fake_sync(force, on_progress=None):
+        calls.append(force)
+        started.set()
+        release.wait(5)
+        return {'success': True, 'novels_processed': 0}
+
+    with mock.patch.object(sync_service, 'sync_all_novels', side_effect=fake_sync):
+        running = coordinator.request_full_sync(source='api')
+        assert started.wait(5)
+
+        # Job đầu đang chạy: hai request sau được gộp vào một job chờ
+        queued = coordinator.request_full_sync(source='watcher')
+        merged = coordinator.request_full_sync(force=True, source='scheduler')
+        assert merged is queued
+        assert queued is not running
+        assert queued.sources == ['watcher', 'scheduler']
+        assert queued.force is True
+        assert coordinator.get_status()['queued']['id'] == queued.id
+
+        release.set()
+        assert running.wait(5) == {'success': True, 'novels_processed': 0}
+        assert queued.wait(5) is not None
+
+    assert calls == [False, True]
+    assert running.state == 'completed'
+    assert queued.state == 'completed'
+    assert coordinator.get_status()['last']['id'] == queued.id
+
+
+def test_failed_job_records_error(coordinator):
+    with mock.patch.object(sync_service, 'sync_all_novels', side_effect=RuntimeError('boom')):
+        job = coordinator.request_full_sync()
+        assert job.wait(5) is None
+
+    assert job.state == 'failed'
+    assert job.error == 'boom'
+    # Trạng thái ghi ra file để worker process khác đọc được
+    assert coordinator.get_status()['host']['job']['state'] == 'failed'
+
+
+def test_exclusive_reloads_manifest_and_index(coordinator):
+    assert coordinator.run_exclusive(lambda value: value * 2, 21) == 42
+
+    sync_manifest_service.reload.assert_called_once()
+    chapter_index_service.reload.assert_called_once()
+
+
+@pytest.mark.skipif(coordinator_module.fcntl is None, reason="cần fcntl (flock)")
+def test_job_waits_for_lock_held_by_another_process(coordinator, tmp_path):
+    fcntl = coordinator_module.fcntl
+    # File mở riêng = open file description riêng, flock chặn như process khác
+    other = open(tmp_path / JOB_LOCK_FILENAME, 'a+')
+    fcntl.flock(other, fcntl.LOCK_EX)
+    try:
+        with mock.patch.object(sync_service, 'sync_all_novels', return_value={'success': True}) as sync_all:
+            job = coordinator.request_full_sync()
+            assert _wait_for(lambda: job.state == 'waiting_lock')
+            assert not sync_all.called
+
+            fcntl.flock(other, fcntl.LOCK_UN)
+            assert job.wait(5) == {'success': True}
+    finally:
+        other.close()
+
+    assert job.state == 'completed'
+    sync_manifest_service.reload.assert_called_once()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Unit test: file chapter bị sửa tại chỗ (crawler ghi đè) rồi sync lại thì nội
+dung mới được phục vụ (không cần server, không cần Supabase)
+
+    uv run pytest tests/test_sync_in_place_edit.py
+"""
+
+import hashlib
+import json
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.services.chapter_index_service import chapter_index_service
+from app.services.chapter_service import ChapterService
+from app.services.content_search_service import content_search_service
+from app.services.content_store_service import content_store_service
+from app.services.markdown_service import ContentService
+from app.services.navigation_service import navigation_service
+from app.services.storage_key_service import storage_key_service
+from app.services.sync_manifest_service import sync_manifest_service
+from app.services.sync_service import sync_service
+
+NOVEL_ID = 7
+CHAPTER_ID = 70
+NOVEL_DIR = f'n{NOVEL_ID}'
+CONTENT_FILE = 'chapter_0001.md'
+# Service dùng storage_path của settings lúc khởi tạo
+SERVICES = [content_store_service, chapter_index_service, content_search_service,
+            sync_manifest_service, storage_key_service, navigation_service]
+
+
+def _reset_services() -> None:
+    for service in SERVICES:
+        service.__init__()
+    sync_service.storage_path = type(sync_service.storage_path)(settings.storage_path)
+    sync_service.content_service = ContentService()
+    cache_service.clear()
+
+
+@pytest.fixture
+def storage(tmp_path, request):
+    with mock.patch.object(settings, 'storage_path', str(tmp_path)), \
+            mock.patch.object(settings, 'content_dedup', request.param):
+        _reset_services()
+        try:
+            yield tmp_path
+        finally:
+            cache_service.clear()
+    _reset_services()
+
+
+def _write_novel(storage_path, content: str) -> str:
+    novel_path = os.path.join(str(storage_path), NOVEL_DIR)
+    os.makedirs(novel_path, exist_ok=True)
+    book_info = {'title': 'Truyện thử', 'author': 'A', 'chapters': [
+        {'title': 'Chương 1', 'number': 1, 'filename': CONTENT_FILE, 'word_count': 3},
+    ]}
+    with open(os.path.join(novel_path, 'book_info.json'), 'w', encoding='utf-8') as f:
+        json.dump(book_info, f, ensure_ascii=False)
+    path = os.path.join(novel_path, CONTENT_FILE)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+
+def _sync(changed_files=None):
+    existing = [{'id': CHAPTER_ID, 'title': 'Chương 1', 'chapter_number': 1,
+                 'content_file': CONTENT_FILE, 'word_count': 3}]
+    with mock.patch.object(sync_service, 'supabase_admin'), \
+            mock.patch.object(sync_service, 'find_novel', return_value={'id': NOVEL_ID}), \
+            mock.patch.object(sync_service, 'fetch_existing_chapters', return_value=existing), \
+            mock.patch.object(sync_service, 'update_novel_chapter_count'):
+        return sync_service.sync_novel_directory(NOVEL_DIR, changed_files)
+
+
+@pytest.mark.parametrize('storage', [True, False], indirect=True, ids=['dedup', 'no-dedup'])
+def test_in_place_edit_serves_new_content(storage):
+    path = _write_novel(storage, '# Chương 1\n\nNội dung cũ')
+    assert _sync() is True
+
+    with mock.patch('app.services.chapter_service.create_client'):
+        chapter_service = ChapterService()
+    assert 'Nội dung cũ' in chapter_service.get_chapter_content(CHAPTER_ID, 'markdown')
+    assert 'Nội dung cũ' in chapter_service.get_chapter_content(CHAPTER_ID, 'html')
+
+    # Ghi đè tại chỗ (cùng inode), book_info.json không đổi
+    inode = os.stat(path).st_ino
+    new_content = '# Chương 1\n\nNội dung mới'
+    with open(path, 'r+b') as f:
+        f.write(new_content.encode('utf-8'))
+        f.truncate()
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert os.stat(path).st_ino == inode
+
+    assert _sync({CONTENT_FILE}) is True
+
+    # File sync không bị link vào object store, hash tính lại từ nội dung mới
+    assert os.stat(path).st_nlink == 1
+    location = chapter_index_service.get(CHAPTER_ID)
+    if settings.content_dedup:
+        assert location.content_hash == hashlib.sha256(new_content.encode('utf-8')).hexdigest()
+    assert sync_service.content_service.read_variant(NOVEL_DIR, CONTENT_FILE, 'markdown') == new_content
+    for format in ('markdown', 'html'):
+        content = chapter_service.get_chapter_content(CHAPTER_ID, format)
+        assert 'Nội dung mới' in content and 'Nội dung cũ' not in content
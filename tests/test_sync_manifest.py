@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Unit test cho sync manifest: bỏ qua novel không đổi (stat, hash), chỉ lấy
+chapter mới/đã sửa, force và include_files (không cần server, không cần Supabase)
+
+    uv run pytest tests/test_sync_manifest.py
+"""
+
+import json
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services import sync_manifest_service as manifest_module
+from app.services.book_info_service import book_info_service
+from app.services.sync_manifest_service import SyncManifestService, sync_manifest_service
+from app.services.sync_service import sync_service
+
+NOVEL_DIR = 'n7'
+
+
+def _reset_services() -> None:
+    sync_manifest_service.__init__()
+    sync_service.storage_path = type(sync_service.storage_path)(settings.storage_path)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    with mock.patch.object(settings, 'storage_path', str(tmp_path)):
+        _reset_services()
+        yield tmp_path
+    _reset_services()
+
+
+def _write_book_info(storage_path, titles):
+    novel_path = os.path.join(str(storage_path), NOVEL_DIR)
+    os.makedirs(novel_path, exist_ok=True)
+    book_info = {'title': 'Truyện thử', 'author': 'A', 'chapters': [
+        {'title': title, 'number': number, 'filename': f'chapter_{number:04d}.md', 'word_count': 10}
+        for number, title in enumerate(titles, 1)
+    ]}
+    path = os.path.join(novel_path, 'book_info.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(book_info, f, ensure_ascii=False)
+    return path
+
+
+def _bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def _record(book_info):
+    """Ghi nhận sync thành công như sync_novel_to_db"""
+    sync_manifest_service.record(NOVEL_DIR, book_info['_stat'], book_info['_hash'], 7,
+                                 book_info['title'], len(book_info['_chapter_state']))
+    sync_manifest_service.save_chapters(NOVEL_DIR, book_info['_chapter_state'])
+    sync_manifest_service.save()
+
+
+def _files(book_info):
+    return [chapter['filename'] for chapter in book_info['chapters']]
+
+
+def test_first_sync_takes_all_chapters_then_skips_by_stat(storage):
+    _write_book_info(storage, ['Chương 1', 'Chương 2'])
+
+    status, book_info = sync_service.read_novel_dir(NOVEL_DIR)
+    assert status == 'changed'
+    assert _files(book_info) == ['chapter_0001.md', 'chapter_0002.md']
+    _record(book_info)
+
+    # mtime + size giống lần trước: không đọc/hash file
+    with mock.patch.object(book_info_service, 'hash_file') as hash_file:
+        assert sync_service.read_novel_dir(NOVEL_DIR) == ('unchanged', None)
+    hash_file.assert_not_called()
+
+
+def test_touched_file_with_same_content_is_unchanged(storage):
+    path = _write_book_info(storage, ['Chương 1'])
+    _record(sync_service.read_novel_dir(NOVEL_DIR)[1])
+
+    _bump_mtime(path)
+    assert sync_service.read_novel_dir(NOVEL_DIR) == ('unchanged', None)
+
+    # mtime mới được ghi vào manifest: lần sau bỏ qua bằng stat
+    assert sync_manifest_service.is_unchanged(NOVEL_DIR, os.stat(path))
+
+
+def test_changed_book_info_returns_only_changed_chapters(storage):
+    _write_book_info(storage, ['Chương 1', 'Chương 2', 'Chương 3'])
+    _record(sync_service.read_novel_dir(NOVEL_DIR)[1])
+
+    path = _write_book_info(storage, ['Chương 1', 'Chương 2 (sửa)', 'Chương 3', 'Chương 4'])
+    _bump_mtime(path)
+    status, book_info = sync_service.read_novel_dir(NOVEL_DIR)
+
+    assert status == 'changed'
+    assert _files(book_info) == ['chapter_0002.md', 'chapter_0004.md']
+    # Trạng thái của toàn bộ chapters để lần sau so sánh
+    assert len(book_info['_chapter_state']) == 4
+
+
+def test_force_returns_all_chapters(storage):
+    _write_book_info(storage, ['Chương 1', 'Chương 2'])
+    _record(sync_service.read_novel_dir(NOVEL_DIR)[1])
+
+    status, book_info = sync_service.read_novel_dir(NOVEL_DIR, force=True)
+
+    assert status == 'changed'
+    assert _files(book_info) == ['chapter_0001.md', 'chapter_0002.md']
+
+
+def test_include_files_returns_rewritten_chapter(storage):
+    _write_book_info(storage, ['Chương 1', 'Chương 2'])
+    _record(sync_service.read_novel_dir(NOVEL_DIR)[1])
+
+    status, book_info = sync_service.read_novel_dir(NOVEL_DIR, include_files={'chapter_0002.md'})
+
+    assert status == 'changed'
+    assert _files(book_info) == ['chapter_0002.md']
+
+
+def test_missing_book_info(storage):
+    os.makedirs(os.path.join(str(storage), NOVEL_DIR))
+
+    assert sync_service.read_novel_dir(NOVEL_DIR) == ('missing', None)
+
+
+def test_manifest_written_by_another_process_is_reloaded(storage):
+    path = _write_book_info(storage, ['Chương 1'])
+    assert sync_manifest_service.find_dir('Truyện thử') is None
+
+    # Process khác sync novel và ghi manifest
+    other = SyncManifestService()
+    other.record(NOVEL_DIR, os.stat(path), 'hash', 7, 'Truyện thử', 1)
+    other.save()
+
+    with mock.patch.object(manifest_module, 'MANIFEST_CHECK_INTERVAL', 0):
+        assert sync_manifest_service.find_dir('Truyện thử') == NOVEL_DIR
+        assert sync_manifest_service.is_unchanged(NOVEL_DIR, os.stat(path))
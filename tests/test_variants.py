@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Unit test cho bản render sẵn (variants) của ContentService (không cần server)
+
+    uv run pytest tests/test_variants.py
+"""
+
+import gzip
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.markdown_service import ContentService
+from app.services.packed_store_service import packed_store_service
+
+NOVEL_DIR = 'n1'
+
+
+@pytest.fixture(params=['files', 'packed'])
+def content_service(tmp_path, request):
+    with mock.patch.object(settings, 'storage_backend', request.param), \
+            mock.patch.object(settings, 'content_dedup', False):
+        service = ContentService()
+        service.storage_path = str(tmp_path)
+        os.makedirs(os.path.join(str(tmp_path), NOVEL_DIR))
+        yield service
+        packed_store_service.forget(os.path.join(str(tmp_path), NOVEL_DIR))
+
+
+def test_variant_name_keeps_extension():
+    service = ContentService()
+    assert service.get_variant_name('1.md', 'html') == '.rendered/1.md.html'
+    assert service.get_variant_name('1.html', 'html', True) == '.rendered/1.html.html.gz'
+    assert service.get_variant_name('vol1/1.md', 'markdown') == '.rendered/vol1/1.md.markdown'
+
+
+def test_same_stem_files_keep_separate_variants(content_service):
+    assert content_service.save_chapter_file(NOVEL_DIR, '1.md', '# Markdown\n\nmột')
+    assert content_service.save_chapter_file(NOVEL_DIR, '1.html', '<p>HTML hai</p>')
+    assert content_service.ensure_variants(NOVEL_DIR, '1.md')
+    assert content_service.ensure_variants(NOVEL_DIR, '1.html')
+
+    assert content_service.read_variant(NOVEL_DIR, '1.md', 'markdown') == '# Markdown\n\nmột'
+    assert '<h1>Markdown</h1>' in content_service.read_variant(NOVEL_DIR, '1.md', 'html')
+    assert content_service.read_variant(NOVEL_DIR, '1.html', 'html') == '<p>HTML hai</p>'
+
+    located = content_service.locate_variant(NOVEL_DIR, '1.html', 'html', compressed=True)
+    if 'path' in located:
+        with open(located['path'], 'rb') as f:
+            data = f.read()
+    else:
+        data = located['data']
+    assert gzip.decompress(data) == b'<p>HTML hai</p>'
+
+    content_service.delete_variants(NOVEL_DIR, '1.md')
+    assert content_service.read_variant(NOVEL_DIR, '1.md', 'html') is None
+    assert content_service.read_variant(NOVEL_DIR, '1.html', 'html') == '<p>HTML hai</p>'